@@ -12,6 +12,7 @@ class AutoFocus:
     def __init__(self, focuser, camera=None, debug=False):
         self.focuser = focuser
         self.debug = debug
+        self.telemetry = None   # telemetry.Telemetry: scan steps become events, not prints
 
         self.stage = "idle"
         self.best_pos = 0
@@ -92,7 +93,10 @@ class AutoFocus:
             val = self.get_sharpness(frame)
 
             # Logs only if the score is reasonable (above 5) to avoid spamming
-            if self.debug:
+            if self.telemetry is not None:
+                self.telemetry.event("af_step", pos=self.current_pos, score=round(val, 2),
+                                     best=val > self.best_score)
+            elif self.debug:
                 marker = " <--- NEW BEST" if val > self.best_score else ""
                 print(f"[AF] Pos: {self.current_pos} | Score: {val:.2f}{marker}")
 
@@ -139,4 +143,30 @@ class AutoFocus:
         if self.stage == "done":
             return True, self.best_pos
 
-        return False, None
\ No newline at end of file
+        return False, None
+
+    # =================================================================
+    # Blocking driver (for servers that own a frame source)
+    # =================================================================
+    def progress(self):
+        """Rough scan progress in [0, 1]."""
+        if self.stage == "done":
+            return 1.0
+        if self.stage == "scanning" and self.scan_end > 0:
+            return min(0.95, self.current_pos / self.scan_end)
+        if self.stage == "backlash_dip":
+            return 0.95
+        return 0.0
+
+    def runFocus(self, get_frame, max_steps=5000):
+        """Run the stepped scan to completion, pulling frames from get_frame()."""
+        self.startFocus_hailo()
+        for _ in range(max_steps):
+            frame = get_frame()
+            if frame is None:
+                continue
+            finished, best_pos = self.stepFocus_hailo(frame)
+            if finished:
+                self.focuser.set(Focuser.OPT_FOCUS, best_pos)
+                return best_pos, self.best_score
+        return self.best_pos, self.best_score
@@ -72,9 +72,13 @@ class Focuser:
     debug = False
 
     def __init__(self, bus):
+        # An already-open bus object (e.g. SimulatedBus) is used as-is.
+        if not isinstance(bus, int):
+            self.bus = bus
+            return
         # try:
-            import smbus2 # sudo apt-get install python-smbus
-            self.bus = smbus2.SMBus(bus)
+        import smbus2 # sudo apt-get install python-smbus
+        self.bus = smbus2.SMBus(bus)
         # except:
         #     sys.exit(0)
         
@@ -0,0 +1,126 @@
+'''
+    In-memory stand-in for the SMBus that drives the PTZ controller chip.
+
+    Lets Focuser (and everything built on it) run on a laptop:
+
+        focuser = Focuser(SimulatedBus())
+
+    Register semantics follow the chip table in README.md. Motor writes
+    start a move whose duration depends on the distance; the bus-status
+    register (0x04) reads busy until the move finishes, so waitingForFree()
+    blocks for a realistic time.
+'''
+
+import threading
+import time
+
+
+def _swap(value):
+    return ((value & 0x00FF) << 8) | ((value & 0xFF00) >> 8)
+
+
+class SimulatedBus:
+    BUSY_REG_ADDR = 0x04
+    VERSION_REG_ADDR = 0x40
+
+    # reg -> units per second of travel
+    SPEEDS = {
+        0x00: 4000.0,   # focus steps/s
+        0x01: 4000.0,   # zoom steps/s
+        0x05: 400.0,    # pan deg/s
+        0x06: 400.0,    # tilt deg/s
+    }
+    SETTLE_S = 0.02         # fixed overhead per move
+    TRANSACTION_S = 0.0002  # cost of one I2C transfer
+
+    def __init__(self, speed_scale=1.0, transaction_s=None):
+        self.speed_scale = speed_scale
+        self.transaction_s = self.TRANSACTION_S if transaction_s is None else transaction_s
+        self.lock = threading.Lock()
+        self.regs = {0x00: 0, 0x01: 0, 0x05: 90, 0x06: 90, 0x0C: 0, 0x30: 1,
+                     self.VERSION_REG_ADDR: 0x0104}
+        self.map_data = [0] * 22
+        # reg -> (start value, start time, duration)
+        self._moves = {}
+        self.busy_until = 0.0
+        self.transactions = 0
+
+    # ============================================================
+    # Motion model
+    # ============================================================
+    def _start_move(self, reg, value):
+        now = time.monotonic()
+        old = self.position(reg, now)
+        speed = self.SPEEDS.get(reg)
+        duration = 0.0
+        if speed:
+            duration = self.SETTLE_S + abs(value - old) / (speed * self.speed_scale)
+            self._moves[reg] = (old, now, duration)
+        self.regs[reg] = value
+        self.busy_until = max(self.busy_until, now + duration)
+
+    def position(self, reg, now=None):
+        """Physical (interpolated) position of a motor register."""
+        target = self.regs.get(reg, 0)
+        move = self._moves.get(reg)
+        if move is None:
+            return target
+        start, t0, duration = move
+        now = time.monotonic() if now is None else now
+        if duration <= 0 or now >= t0 + duration:
+            return target
+        return start + (target - start) * (now - t0) / duration
+
+    def is_busy(self):
+        return time.monotonic() < self.busy_until
+
+    def _transfer(self):
+        self.transactions += 1
+        if self.transaction_s:
+            time.sleep(self.transaction_s)
+
+    # ============================================================
+    # smbus2.SMBus surface used by Focuser
+    # ============================================================
+    def read_word_data(self, chip_addr, reg_addr):
+        self._transfer()
+        with self.lock:
+            if reg_addr == self.BUSY_REG_ADDR:
+                value = 1 if self.is_busy() else 0
+            else:
+                value = self.regs.get(reg_addr, 0)
+        return _swap(value)
+
+    def write_word_data(self, chip_addr, reg_addr, value):
+        self._transfer()
+        value = _swap(value)
+        with self.lock:
+            if reg_addr in (0x0A, 0x0B):          # reset focus / zoom
+                self._start_move(0x00 if reg_addr == 0x0A else 0x01, 0)
+            elif reg_addr == 0x11:                # reset focus & zoom
+                self._start_move(0x00, 0)
+                self._start_move(0x01, 0)
+            else:
+                self._start_move(reg_addr, value)
+
+    def write_i2c_block_data(self, chip_addr, reg_addr, data):
+        self._transfer()
+        words = [(data[i] << 8) | data[i + 1] for i in range(0, len(data) - 1, 2)]
+        with self.lock:
+            if reg_addr == 0x0F and len(words) >= 2:  # zoom & focus (Focuser.move order)
+                self._start_move(0x01, words[0])
+                self._start_move(0x00, words[1])
+            elif reg_addr in (0x50, 0x5B):
+                offset = 0 if reg_addr == 0x50 else 11
+                self.map_data[offset:offset + len(words)] = words
+
+    def read_i2c_block_data(self, chip_addr, reg_addr, length):
+        self._transfer()
+        offset = 0 if reg_addr == 0x50 else 11
+        data = []
+        for word in self.map_data[offset:offset + 11]:
+            data += [(word >> 8) & 0xFF, word & 0xFF]
+        return data[:length]
+
+    def close(self):
+        pass
@@ -1,9 +1,8 @@
 import sys
 import time
-import cv2
+import argparse
 import threading
-from flask import Flask, Response
-from picamera2 import Picamera2
+from flask import Flask, Response, jsonify, request
 
 # ============================================================
 # Add PTZ library path
@@ -12,103 +11,246 @@ sys.path.append("/Users/taircarmon/Desktop/Mergui_CAM")
 
 from B016712MP.Focuser import Focuser
 from B016712MP.AutoFocus import AutoFocus
+from change_detect import ChangeDetector
+from orientation import Orientation
+from overlay_meta import VIEWER_HTML, build_meta
+from stream_broadcast import FrameBroadcaster, MJPEG_MIMETYPE, QUALITY_TIERS
 
 app = Flask(__name__)
 
+ORIENTATION = "rot90cw"   # was transpose + flip(1)
+
+# Frames go straight to the broadcaster: one encoder encodes each frame
+# once per quality tier in use and every /video client shares the bytes.
+# Each client adapts its own tier (quality / size / fps) to its link.
+# Frames that match the last encoded one are dropped before any pixel work.
+# Orientation: ISP flip where possible, the rest as one op on the encoder
+# thread into a reused buffer (only the encoder ever reads it).
+orientation = Orientation(ORIENTATION)
+broadcaster = FrameBroadcaster(QUALITY_TIERS, max_fps=30, change_detector=ChangeDetector(),
+                               transform=orientation)
+latest_frame = None
+frame_count = 0
+frame_cond = threading.Condition()
+ptz = None
+
+
 # ============================================================
 # Camera Setup
 # ============================================================
-cam = Picamera2()
-cam.configure(cam.create_video_configuration(
-    main={"size": (640, 360), "format": "RGB888"}
-))
-cam.start()
-time.sleep(2)
+def setup_camera():
+    from picamera2 import Picamera2
+
+    cam = Picamera2()
+    extra = {}
+    transform = orientation.camera_transform()
+    if transform is not None:
+        extra["transform"] = transform
+    cam.configure(cam.create_video_configuration(
+        main={"size": (640, 360), "format": "RGB888"}, **extra
+    ))
+    cam.start()
+    time.sleep(2)
+    return cam
+
 
 # ============================================================
 # PTZ / Focuser Setup
 # ============================================================
-focuser = Focuser(1)
-focuser.set(Focuser.OPT_MODE, 1)
-time.sleep(0.5)
+class PTZControl:
+    """Serialized access to the focuser for the control API."""
+
+    AXES = {
+        "pan": Focuser.OPT_MOTOR_X,
+        "tilt": Focuser.OPT_MOTOR_Y,
+        "zoom": Focuser.OPT_ZOOM,
+        "focus": Focuser.OPT_FOCUS,
+    }
+
+    def __init__(self, focuser, get_frame):
+        self.focuser = focuser
+        self.get_frame = get_frame
+        self.lock = threading.Lock()
+        self.position = {"pan": 300, "tilt": 25, "zoom": 0, "focus": 0}
+
+    def status(self):
+        # Cached; never touches the bus so it stays fast during AF or moves.
+        return dict(self.position)
+
+    def move(self, **axes):
+        with self.lock:
+            for name, value in axes.items():
+                self.focuser.set(self.AXES[name], value)
+                self.position[name] = value
+            return dict(self.position)
 
-focuser.set(Focuser.OPT_IRCUT, 0)
-time.sleep(0.5)
+    def autofocus(self):
+        with self.lock:
+            auto_focus = AutoFocus(self.focuser)
+            best_pos, best_score = auto_focus.runFocus(self.get_frame)
+            self.position["focus"] = best_pos
+            return {"focus": best_pos, "score": best_score}
 
-print("Initial PTZ movement...")
-focuser.set(Focuser.OPT_MOTOR_X, 300)
-time.sleep(1)
-focuser.set(Focuser.OPT_MOTOR_Y, 25)
-time.sleep(1)
 
-print("Starting AutoFocus...")
-auto_focus = AutoFocus(focuser, cam)
-auto_focus.debug = False
-auto_focus.startFocus2()
-time.sleep(0.5)
+def setup_ptz(get_frame, run_autofocus=True):
+    focuser = Focuser(1)
+    focuser.set(Focuser.OPT_MODE, 1)
+    time.sleep(0.5)
+
+    focuser.set(Focuser.OPT_IRCUT, 0)
+    time.sleep(0.5)
+
+    control = PTZControl(focuser, get_frame)
+
+    print("Initial PTZ movement...")
+    control.move(pan=300)
+    time.sleep(1)
+    control.move(tilt=25)
+    time.sleep(1)
+
+    if run_autofocus:
+        print("Starting AutoFocus...")
+        result = control.autofocus()
+        print(f"Autofocus completed: {result}")
+        time.sleep(0.5)
+    return control
+
 
 # ============================================================
 # Frame Capture Thread (FAST & SMOOTH)
 # ============================================================
-latest_frame = None
-lock = threading.Lock()
-
-def capture_thread():
-    global latest_frame
+def capture_thread(cam):
+    global latest_frame, frame_count
     while True:
         frame = cam.capture_array()
-        frame = cv2.transpose(frame)
-        frame = cv2.flip(frame, 1)
 
-        with lock:
+        # AF only looks at a centre crop, so it gets the raw frame.
+        with frame_cond:
             latest_frame = frame
+            frame_count += 1
+            frame_cond.notify_all()
+
+        # Unchanged frames stop here: no orientation, no JPEG encode.
+        # Overlays are not drawn here; PTZ state goes out as metadata and
+        # viewers draw it (see /meta).
+        broadcaster.submit(frame, capture_ts=time.time(),
+                           meta=build_meta(ptz=ptz.status() if ptz else None))
 
         time.sleep(0.01)  # limits to ~100 FPS input
 
-t = threading.Thread(target=capture_thread, daemon=True)
-t.start()
+
+def next_frame(timeout=1.0):
+    """Block until the capture thread delivers a frame newer than the current one."""
+    with frame_cond:
+        seen = frame_count
+        frame_cond.wait_for(lambda: frame_count > seen, timeout)
+        return latest_frame
+
+
+def start_capture(cam):
+    t = threading.Thread(target=capture_thread, args=(cam,), daemon=True)
+    t.start()
+    return t
+
 
 # ============================================================
-# Flask Streaming (optimized MJPEG)
+# Flask Streaming (encode-once MJPEG)
 # ============================================================
-def generate_stream():
-    global latest_frame
+def generate_stream(adaptive=True):
+    return broadcaster.mjpeg_stream(request.remote_addr, adaptive=adaptive)
 
-    while True:
-        with lock:
-            frame = latest_frame.copy() if latest_frame is not None else None
 
-        if frame is None:
-            continue
+@app.route("/")
+def viewer():
+    return Response(VIEWER_HTML, mimetype="text/html")
 
-        # JPEG encode — quality optimized
-        ok, jpeg = cv2.imencode(
-            ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 88]
-        )
-        if not ok:
-            continue
 
-        yield (b"--frame\r\n"
-               b"Content-Type: image/jpeg\r\n\r\n" +
-               jpeg.tobytes() + b"\r\n")
-
-        time.sleep(0.03)  # OUTPUT FPS ~ 30 FPS
+@app.route("/meta")
+def meta():
+    return Response(broadcaster.meta_stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
 
 
 @app.route("/video")
 def video():
-    return Response(generate_stream(),
-                    mimetype="multipart/x-mixed-replace; boundary=frame")
+    adaptive = request.args.get("adaptive", "1") != "0"
+    return Response(generate_stream(adaptive), mimetype=MJPEG_MIMETYPE)
+
+
+@app.route("/snapshot")
+def snapshot():
+    seq, jpeg = broadcaster.latest()
+    if jpeg is None:
+        return jsonify({"error": "no frame yet"}), 503
+    return Response(jpeg, mimetype="image/jpeg")
+
+
+@app.route("/stats")
+def stats():
+    return jsonify(broadcaster.stats())
+
+
+@app.route("/status")
+def status():
+    return jsonify(ptz.status())
+
+
+@app.route("/ptz", methods=["GET", "POST"])
+def move_ptz():
+    try:
+        axes = {k: int(v) for k, v in request.args.items() if k in PTZControl.AXES}
+    except ValueError:
+        return jsonify({"error": "axis values must be integers"}), 400
+    return jsonify(ptz.move(**axes))
 
 
 # ============================================================
-# Run Flask
+# Run
 # ============================================================
-if __name__ == "__main__":
+def main():
+    global ptz
+
+    parser = argparse.ArgumentParser(description="Mergui camera MJPEG stream")
+    parser.add_argument("--server", choices=("flask", "asyncio"), default="flask",
+                        help="flask: thread per client, adapts on send time only | "
+                             "asyncio: single event loop, also adapts on socket backlog")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--no-autofocus", action="store_true", help="skip the AF scan at startup")
+    parser.add_argument("--no-change-gate", action="store_true", help="encode every frame, even static ones")
+    parser.add_argument("--change-pixel-threshold", type=int, default=12,
+                        help="gray-level difference that counts a thumbnail pixel as changed")
+    parser.add_argument("--change-fraction", type=float, default=0.01,
+                        help="fraction of changed thumbnail pixels that counts as a new frame")
+    parser.add_argument("--keepalive", type=float, default=2.0,
+                        help="seconds between re-sent frames on a static scene")
+    args = parser.parse_args()
+
+    broadcaster.keepalive_s = args.keepalive
+    if args.no_change_gate:
+        broadcaster.change_detector = None
+    else:
+        broadcaster.change_detector.pixel_threshold = args.change_pixel_threshold
+        broadcaster.change_detector.changed_fraction = args.change_fraction
+
+    cam = setup_camera()
+    start_capture(cam)
+    ptz = setup_ptz(next_frame, run_autofocus=not args.no_autofocus)
+
     print("\n=====================================")
     print("Improved Mergui Camera Stream Running!")
+    print(f"Server: {args.server}")
     print("Open:")
-    print("    http://<IP>:8000/video")
+    print(f"    http://<IP>:{args.port}/        (viewer with overlays)")
+    print(f"    http://<IP>:{args.port}/video")
     print("=====================================")
 
-    app.run(host="0.0.0.0", port=8000, debug=False)
+    if args.server == "asyncio":
+        from async_stream_server import create_app
+        create_app(broadcaster, control=ptz).run(host="0.0.0.0", port=args.port)
+    else:
+        broadcaster.start()
+        app.run(host="0.0.0.0", port=args.port, debug=False, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,13 +11,22 @@ sys.path.append("/Users/taircarmon/Desktop/Mergui_CAM")
 from B016712MP.Focuser import Focuser
 
 from B016712MP.AutoFocus import AutoFocus
+from orientation import Orientation
 
 # ============================================================
 # Camera Setup
 # ============================================================
+# Orientation: ISP flip where possible, the rest as a single op into a
+# reused buffer (was cv2.transpose + cv2.flip, two copies per frame).
+orientation = Orientation("rot90cw")
+camera_extra = {}
+camera_transform = orientation.camera_transform()
+if camera_transform is not None:
+    camera_extra["transform"] = camera_transform
+
 cam = Picamera2()
 cam.configure(cam.create_video_configuration(
-    main={"size": (640, 360), "format": "RGB888"}
+    main={"size": (640, 360), "format": "RGB888"}, **camera_extra
 ))
 cam.start()
 time.sleep(2)
@@ -67,8 +76,7 @@ while True:
     frame = cam.capture_array()
 
     # Rotate for correct orientation
-    frame = cv2.transpose(frame)
-    frame = cv2.flip(frame, 1)
+    frame = orientation.apply(frame)
 
     cv2.imshow("Mergui Camera Preview", frame)
 
@@ -0,0 +1,301 @@
+# async_stream_server.py
+# ------------------------------------------------------------
+# Single event-loop HTTP server for the camera stream.
+# - /          : browser viewer (MJPEG + overlays drawn from /meta)
+# - /video     : MJPEG (multipart/x-mixed-replace), drop-to-latest per viewer
+# - /meta      : per-frame metadata as Server-Sent Events (overlay_meta.py)
+# - /snapshot  : latest JPEG
+# - /stats     : broadcaster + per-client counters (JSON)
+#   (/video?tier=N pins a start tier, /video?adaptive=0 disables adaptation)
+# - /status, /ptz, /autofocus : control API (JSON); /ptz answers 409 while
+#   an autofocus scan runs
+#
+# Every viewer is a coroutine, not a thread. Writes go through the
+# transport with drain()-based backpressure; a viewer whose socket is
+# still full simply skips to the newest frame. JPEG encoding and blocking
+# I2C calls run in small executors so the loop never stalls.
+#
+# Plain asyncio, no extra dependencies.
+# ------------------------------------------------------------
+
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from overlay_meta import VIEWER_HTML, meta_event
+from stream_broadcast import MJPEG_MIMETYPE, mjpeg_part
+
+_REASONS = {
+    200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class AsyncStreamServer:
+    def __init__(self, broadcaster, control=None, write_buffer_high=256 * 1024,
+                 drain_timeout=10.0, header_timeout=10.0):
+        self.broadcaster = broadcaster
+        self.control = control
+        self.write_buffer_high = write_buffer_high
+        self.drain_timeout = drain_timeout
+        self.header_timeout = header_timeout
+
+        # One encoder worker (encode order matters), one control worker
+        # (the I2C bus must be used serially anyway) and one for the long
+        # autofocus scan, so it never sits in front of queued moves.
+        self._encode_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+        self._control_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ptz")
+        self._autofocus_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="autofocus")
+        self._frame_cond = None
+        self._autofocus_job = None
+
+        self.routes = {
+            "/": self._viewer,
+            "/video": self._video,
+            "/meta": self._meta,
+            "/snapshot": self._snapshot,
+            "/stats": self._stats,
+            "/status": self._status,
+            "/ptz": self._ptz,
+            "/autofocus": self._autofocus,
+        }
+
+    # ============================================================
+    # Lifecycle
+    # ============================================================
+    async def serve(self, host="0.0.0.0", port=8000):
+        self._frame_cond = asyncio.Condition()
+        self.broadcaster.start(threaded=False)
+        encoder = asyncio.create_task(self._encode_loop())
+        server = await asyncio.start_server(self._handle, host, port, backlog=128)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            encoder.cancel()
+            self.broadcaster.stop()
+            self._encode_pool.shutdown(wait=False)
+            self._control_pool.shutdown(wait=False)
+            self._autofocus_pool.shutdown(wait=False)
+
+    def run(self, host="0.0.0.0", port=8000):
+        try:
+            asyncio.run(self.serve(host, port))
+        except KeyboardInterrupt:
+            pass
+
+    async def _encode_loop(self):
+        loop = asyncio.get_running_loop()
+        last_seq = 0
+        next_due = 0.0
+        while self.broadcaster.running:
+            last_seq, jpeg = await loop.run_in_executor(
+                self._encode_pool, self.broadcaster.encode_next, last_seq, 0.5)
+            if jpeg is None:
+                continue
+            async with self._frame_cond:
+                self._frame_cond.notify_all()
+
+            now = time.monotonic()
+            next_due = max(next_due + self.broadcaster.min_interval, now)
+            if next_due > now:
+                await asyncio.sleep(next_due - now)
+
+    async def _next_frame(self, after_seq, tier=0):
+        """Newest frame after `after_seq`; on a static scene, after
+        keepalive_s the current frame is returned again as a keep-alive."""
+        try:
+            async with self._frame_cond:
+                await asyncio.wait_for(
+                    self._frame_cond.wait_for(lambda: self.broadcaster.seq > after_seq),
+                    self.broadcaster.keepalive_s)
+        except asyncio.TimeoutError:
+            self.broadcaster.keepalives += 1
+        return self.broadcaster.latest(tier)
+
+    # ============================================================
+    # HTTP plumbing
+    # ============================================================
+    async def _handle(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.header_timeout)
+            request_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+            method, target, _ = request_line.split(" ", 2)
+            url = urlsplit(target)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+            handler = self.routes.get(url.path)
+            if handler is None:
+                await self._send_json(writer, 404, {"error": f"no route {url.path}"})
+            else:
+                await handler(writer, method, params, peer)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                ValueError, ConnectionError):
+            pass
+        except Exception as e:
+            print(f"[ERROR] {peer}: {e}")
+            try:
+                await self._send_json(writer, 500, {"error": str(e)})
+            except Exception:
+                pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _send(self, writer, status, body, content_type):
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Cache-Control: no-cache\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, obj):
+        await self._send(writer, status, json.dumps(obj).encode(), "application/json")
+
+    # ============================================================
+    # Routes
+    # ============================================================
+    async def _video(self, writer, method, params, peer):
+        # Validate before the 200 header goes out and the client is registered.
+        try:
+            tier = int(params["tier"]) if "tier" in params else None
+        except ValueError:
+            await self._send_json(writer, 400, {"error": "tier must be an integer"})
+            return
+        writer.transport.set_write_buffer_limits(high=self.write_buffer_high)
+        writer.write(
+            "HTTP/1.1 200 OK\r\n"
+            f"Content-Type: {MJPEG_MIMETYPE}\r\n"
+            "Cache-Control: no-cache\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1"))
+
+        adaptive = params.get("adaptive", "1") != "0"
+        client = self.broadcaster.register(f"{peer[0]}:{peer[1]}" if peer else None, adaptive)
+        if tier is not None:
+            client.tier = max(0, min(len(client.tiers) - 1, tier))
+        loop = asyncio.get_running_loop()
+        try:
+            while self.broadcaster.running:
+                delay = client.next_due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                seq, jpeg = await self._next_frame(client.last_seq, client.tier)
+                if jpeg is None:
+                    continue
+                client.advance(seq, len(jpeg))
+                started = loop.time()
+                writer.write(mjpeg_part(jpeg))
+                # Backpressure: while this viewer drains, newer frames are
+                # skipped for it instead of queuing up in memory.
+                await asyncio.wait_for(writer.drain(), self.drain_timeout)
+                client.record_send(started, loop.time() - started,
+                                   writer.transport.get_write_buffer_size())
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.broadcaster.unregister(client)
+
+    async def _viewer(self, writer, method, params, peer):
+        await self._send(writer, 200, VIEWER_HTML, "text/html; charset=utf-8")
+
+    async def _meta(self, writer, method, params, peer):
+        writer.write(
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: text/event-stream\r\n"
+            "Cache-Control: no-cache\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1"))
+        last_seq = 0
+        try:
+            while self.broadcaster.running:
+                try:
+                    async with self._frame_cond:
+                        await asyncio.wait_for(
+                            self._frame_cond.wait_for(lambda: self.broadcaster.seq > last_seq),
+                            self.broadcaster.keepalive_s)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                else:
+                    last_seq, info = self.broadcaster.latest_info()
+                    writer.write(meta_event(last_seq, info))
+                await asyncio.wait_for(writer.drain(), self.drain_timeout)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+
+    async def _snapshot(self, writer, method, params, peer):
+        seq, jpeg = self.broadcaster.latest()
+        if jpeg is None:
+            await self._send_json(writer, 503, {"error": "no frame yet"})
+            return
+        await self._send(writer, 200, jpeg, "image/jpeg")
+
+    async def _stats(self, writer, method, params, peer):
+        await self._send_json(writer, 200, self.broadcaster.stats())
+
+    def _autofocus_running(self):
+        return self._autofocus_job is not None and not self._autofocus_job.done()
+
+    async def _run_control(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._control_pool, lambda: fn(*args, **kwargs))
+
+    async def _status(self, writer, method, params, peer):
+        if self.control is None:
+            await self._send_json(writer, 503, {"error": "no PTZ control"})
+            return
+        # status() is expected to serve cached state, so no executor hop.
+        await self._send_json(writer, 200, self.control.status())
+
+    async def _ptz(self, writer, method, params, peer):
+        if self.control is None:
+            await self._send_json(writer, 503, {"error": "no PTZ control"})
+            return
+        if method not in ("GET", "POST"):
+            await self._send_json(writer, 405, {"error": "use GET or POST"})
+            return
+        try:
+            axes = {k: int(v) for k, v in params.items() if k in ("pan", "tilt", "zoom", "focus")}
+        except ValueError:
+            await self._send_json(writer, 400, {"error": "axis values must be integers"})
+            return
+        if self._autofocus_running():
+            # The scan holds the bus for seconds; refuse instead of queuing.
+            await self._send_json(writer, 409, {"error": "autofocus running"})
+            return
+        await self._send_json(writer, 200, await self._run_control(self.control.move, **axes))
+
+    async def _autofocus(self, writer, method, params, peer):
+        if self.control is None:
+            await self._send_json(writer, 503, {"error": "no PTZ control"})
+            return
+        job = self._autofocus_job
+        if method == "POST":
+            if self._autofocus_running():
+                await self._send_json(writer, 409, {"state": "running"})
+                return
+            loop = asyncio.get_running_loop()
+            self._autofocus_job = loop.run_in_executor(self._autofocus_pool, self.control.autofocus)
+            await self._send_json(writer, 202, {"state": "started"})
+            return
+        if job is None:
+            state = {"state": "idle"}
+        elif not job.done():
+            state = {"state": "running"}
+        elif job.exception() is not None:
+            state = {"state": "failed", "error": str(job.exception())}
+        else:
+            state = {"state": "done", "result": job.result()}
+        await self._send_json(writer, 200, state)
+
+
+def create_app(broadcaster, control=None, **options):
+    """App factory: build an AsyncStreamServer around a broadcaster."""
+    return AsyncStreamServer(broadcaster, control=control, **options)
@@ -0,0 +1,312 @@
+# batch_track.py
+# ------------------------------------------------------------
+# Headless batch tracking over many videos (no window).
+#
+#   python batch_track.py videos/ --workers 4 --out results/
+#
+# - Every video is cut into chunks of --chunk-seconds; chunks from all
+#   videos go through one process pool (one YOLO model per worker).
+# - Each chunk starts --overlap frames early. Tracks in the overlap are
+#   matched by IoU to the previous chunk's tracks, so track IDs continue
+#   across chunk boundaries; the overlap rows themselves are dropped.
+# - Output per video: <out>/<name>.npz (or .parquet) with one row per
+#   detection: frame, track_id, cls, conf, x1, y1, x2, y2.
+# - Prints frames/s per chunk, per worker and overall.
+#
+# Model settings (weights, conf, imgsz, tracker...) come from
+# testing_on_video.py's USER CONFIG unless given on the command line.
+# ------------------------------------------------------------
+
+import os
+import sys
+import glob
+import time
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv", ".m4v")
+COLUMNS = ("frame", "track_id", "cls", "conf", "x1", "y1", "x2", "y2")
+DTYPES = {"frame": np.int32, "track_id": np.int32, "cls": np.int16, "conf": np.float32,
+          "x1": np.float32, "y1": np.float32, "x2": np.float32, "y2": np.float32}
+MATCH_IOU = 0.5
+
+
+# ============================================================
+# Work planning
+# ============================================================
+def find_videos(inputs):
+    videos = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for name in sorted(os.listdir(item)):
+                if name.lower().endswith(VIDEO_EXTS):
+                    videos.append(os.path.join(item, name))
+        else:
+            videos.extend(sorted(glob.glob(item)) or [item])
+    return videos
+
+
+def video_info(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return None
+        return {
+            "frames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+            "fps": cap.get(cv2.CAP_PROP_FPS) or 30.0,
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        }
+    finally:
+        cap.release()
+
+
+def plan_chunks(path, info, chunk_seconds, overlap):
+    """[(path, index, start, end, read_from)]; read_from includes the overlap."""
+    total = info["frames"]
+    size = int(chunk_seconds * info["fps"]) if chunk_seconds > 0 else total
+    size = max(size, overlap + 1, 1)
+    chunks = []
+    for index, start in enumerate(range(0, total, size)):
+        end = min(start + size, total)
+        chunks.append((path, index, start, end, max(0, start - overlap)))
+    return chunks
+
+
+# ============================================================
+# Worker
+# ============================================================
+_model = None
+_settings = None
+
+
+def _init_worker(settings):
+    global _model, _settings
+    from ultralytics import YOLO
+    _settings = settings
+    _model = YOLO(settings["weights"])
+    try:
+        _model.fuse()
+    except Exception:
+        pass
+
+
+def track_chunk(chunk):
+    """Track one chunk; returns (chunk, columns dict, frames, seconds, pid)."""
+    from testing_on_video import extract_tracks
+
+    path, index, start, end, read_from = chunk
+    s = _settings
+    # Fresh ByteTrack state for this chunk. Resetting the existing tracker
+    # (not dropping the predictor) matters: every new predictor makes
+    # model.track() register another set of tracker callbacks, and the
+    # tracker would then update several times per frame.
+    predictor = _model.predictor
+    if predictor is not None:
+        for tracker in getattr(predictor, "trackers", None) or []:
+            tracker.reset()
+
+    rows = {name: [] for name in COLUMNS}
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, read_from)
+    t0 = time.perf_counter()
+    frames = 0
+    try:
+        for frame_no in range(read_from, end):
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames += 1
+            res = _model.track(frame, conf=s["conf"], imgsz=s["imgsz"], tracker=s["tracker"],
+                               persist=True, classes=s["classes"], device=s["device"], verbose=False)[0]
+            boxes, ids, clss, confs = extract_tracks(res)
+            if boxes is None or len(boxes) == 0:
+                continue
+            n = len(boxes)
+            rows["frame"].extend([frame_no] * n)
+            rows["track_id"].extend(ids if ids is not None else [-1] * n)
+            rows["cls"].extend(clss if clss is not None else [-1] * n)
+            rows["conf"].extend(confs if confs is not None else [0.0] * n)
+            for k, name in enumerate(("x1", "y1", "x2", "y2")):
+                rows[name].extend(boxes[:, k])
+    finally:
+        cap.release()
+    seconds = time.perf_counter() - t0
+    return chunk, to_columns(rows), frames, seconds, os.getpid()
+
+
+def to_columns(rows):
+    return {name: np.asarray(rows[name], dtype=DTYPES[name]) for name in COLUMNS}
+
+
+# ============================================================
+# Stitching
+# ============================================================
+def box_iou(a, b):
+    """IoU of two (N, 4) box arrays, row by row."""
+    ix1 = np.maximum(a[:, 0], b[:, 0])
+    iy1 = np.maximum(a[:, 1], b[:, 1])
+    ix2 = np.minimum(a[:, 2], b[:, 2])
+    iy2 = np.minimum(a[:, 3], b[:, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area = lambda r: (r[:, 2] - r[:, 0]) * (r[:, 3] - r[:, 1])
+    return inter / np.maximum(area(a) + area(b) - inter, 1e-6)
+
+
+def match_overlap(prev, cur, start, min_iou=MATCH_IOU):
+    """Map cur chunk IDs -> prev chunk IDs using rows with frame < start.
+
+    Scores each ID pair by summed IoU over the overlap frames they share,
+    then assigns greedily (best pairs first, one-to-one).
+    """
+    prev_rows = {}
+    for i in np.nonzero((prev["frame"] < start) & (prev["track_id"] >= 0))[0]:
+        prev_rows.setdefault(int(prev["frame"][i]), []).append(i)
+
+    scores = {}
+    boxes = lambda c, idx: np.stack([c["x1"][idx], c["y1"][idx], c["x2"][idx], c["y2"][idx]], axis=1)
+    for j in np.nonzero((cur["frame"] < start) & (cur["track_id"] >= 0))[0]:
+        cand = prev_rows.get(int(cur["frame"][j]))
+        if not cand:
+            continue
+        cand = np.asarray(cand)
+        ious = box_iou(boxes(prev, cand), np.repeat(boxes(cur, [j]), len(cand), axis=0))
+        for i, iou in zip(cand, ious):
+            if iou >= min_iou:
+                key = (int(cur["track_id"][j]), int(prev["track_id"][i]))
+                scores[key] = scores.get(key, 0.0) + float(iou)
+
+    mapping, used = {}, set()
+    for (cur_id, prev_id), _ in sorted(scores.items(), key=lambda kv: -kv[1]):
+        if cur_id not in mapping and prev_id not in used:
+            mapping[cur_id] = prev_id
+            used.add(prev_id)
+    return mapping
+
+
+def stitch(chunks):
+    """chunks: [(start, columns)] in order -> one columns dict with global IDs."""
+    out = []
+    prev = None
+    next_id = 0
+    for start, cols in chunks:
+        cols = {k: v.copy() for k, v in cols.items()}
+        mapping = match_overlap(prev, cols, start) if prev is not None else {}
+        for local_id in np.unique(cols["track_id"][cols["track_id"] >= 0]):
+            if int(local_id) not in mapping:
+                mapping[int(local_id)] = next_id
+                next_id += 1
+        ids = cols["track_id"]
+        cols["track_id"] = np.array([mapping.get(int(t), -1) if t >= 0 else -1 for t in ids],
+                                    dtype=DTYPES["track_id"])
+        next_id = max([next_id] + [v + 1 for v in mapping.values()])
+        prev = cols
+        # Overlap rows were already written by the previous chunk.
+        keep = cols["frame"] >= start
+        out.append({k: v[keep] for k, v in cols.items()})
+    if not out:
+        return to_columns({name: [] for name in COLUMNS})
+    return {name: np.concatenate([c[name] for c in out]) for name in COLUMNS}
+
+
+# ============================================================
+# Output
+# ============================================================
+def write_columns(path, cols, info, fmt):
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.table(cols)
+        table = table.replace_schema_metadata({k: str(v) for k, v in info.items()})
+        pq.write_table(table, path, compression="zstd")
+    else:
+        np.savez_compressed(path, **cols, **{f"meta_{k}": np.asarray(v) for k, v in info.items()})
+
+
+# ============================================================
+# Main
+# ============================================================
+def main():
+    import testing_on_video as cfg
+
+    parser = argparse.ArgumentParser(description="Headless batch horse tracking")
+    parser.add_argument("inputs", nargs="+", help="video files, globs or directories")
+    parser.add_argument("--out", default="results", help="output directory")
+    parser.add_argument("--format", choices=("npz", "parquet"), default="npz")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--chunk-seconds", type=float, default=120.0, help="0 = one chunk per video")
+    parser.add_argument("--overlap", type=int, default=30, help="frames re-tracked before each chunk")
+    parser.add_argument("--weights", default=cfg.WEIGHTS)
+    parser.add_argument("--conf", type=float, default=cfg.CONF)
+    parser.add_argument("--imgsz", type=int, default=cfg.IMGSZ)
+    parser.add_argument("--device", default=cfg.DEVICE)
+    args = parser.parse_args()
+
+    if args.format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("[ERROR] --format parquet needs pyarrow (pip install pyarrow)")
+            sys.exit(1)
+    if not os.path.exists(args.weights):
+        print(f"[ERROR] Weights not found: {os.path.abspath(args.weights)}")
+        sys.exit(1)
+
+    infos, chunks = {}, []
+    for path in find_videos(args.inputs):
+        info = video_info(path)
+        if info is None or info["frames"] <= 0:
+            print(f"[WARN] Skipping unreadable video: {path}")
+            continue
+        infos[path] = info
+        chunks.extend(plan_chunks(path, info, args.chunk_seconds, args.overlap))
+    if not chunks:
+        print("[ERROR] No videos to process")
+        sys.exit(1)
+    os.makedirs(args.out, exist_ok=True)
+
+    settings = {"weights": args.weights, "conf": args.conf, "imgsz": args.imgsz,
+                "tracker": cfg.TRACKER_YAML, "classes": [0] if cfg.ONLY_HORSE else None,
+                "device": args.device}
+    print(f"[INFO] {len(infos)} videos, {len(chunks)} chunks, {args.workers} workers")
+
+    results = {path: {} for path in infos}
+    per_worker = {}
+    t0 = time.perf_counter()
+    # spawn: each worker imports torch itself instead of inheriting a forked copy.
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(args.workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(settings,)) as pool:
+        futures = [pool.submit(track_chunk, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            chunk, cols, frames, seconds, pid = future.result()
+            path, index, start, end, _ = chunk
+            results[path][index] = (start, cols)
+            w = per_worker.setdefault(pid, [0, 0.0])
+            w[0] += frames
+            w[1] += seconds
+            print(f"[INFO] {os.path.basename(path)} chunk {index} frames {start}-{end}: "
+                  f"{frames / seconds if seconds else 0:.1f} fps (pid {pid})")
+
+            if len(results[path]) == sum(1 for c in chunks if c[0] == path):
+                ordered = [results[path][i] for i in sorted(results[path])]
+                merged = stitch(ordered)
+                name = os.path.splitext(os.path.basename(path))[0]
+                out_path = os.path.join(args.out, f"{name}.{args.format}")
+                write_columns(out_path, merged, dict(infos[path], source=path), args.format)
+                tracks = len(np.unique(merged["track_id"][merged["track_id"] >= 0]))
+                print(f"[OK] {out_path}: {len(merged['frame'])} detections, {tracks} tracks")
+
+    wall = time.perf_counter() - t0
+    total = sum(w[0] for w in per_worker.values())
+    for pid, (frames, seconds) in sorted(per_worker.items()):
+        print(f"[STATS] worker {pid}: {frames} frames, {frames / seconds if seconds else 0:.1f} fps")
+    print(f"[STATS] overall: {total} frames in {wall:.1f}s = {total / wall if wall else 0:.1f} fps")
+
+
+if __name__ == "__main__":
+    main()
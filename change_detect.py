@@ -0,0 +1,80 @@
+# change_detect.py
+# ------------------------------------------------------------
+# Cheap "did anything meaningful change?" test on downsampled luma.
+# - Frames are shrunk to a thumbnail (INTER_AREA also averages away
+#   sensor noise) and converted to gray.
+# - A frame counts as changed when more than `changed_fraction` of the
+#   thumbnail pixels differ from the reference by more than
+#   `pixel_threshold` gray levels.
+# - The reference is the last *accepted* frame, so a slow drift still
+#   adds up and eventually triggers.
+# ------------------------------------------------------------
+
+import time
+
+import cv2
+
+
+class ChangeDetector:
+    def __init__(self, size=(64, 36), pixel_threshold=12, changed_fraction=0.01,
+                 max_static_s=None):
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.max_static_s = max_static_s   # force a refresh at least this often
+
+        self.reference = None
+        self.last_change = 0.0
+        self.last_score = 0.0
+
+        self.checked = 0
+        self.changed_count = 0
+        self.unchanged_count = 0
+
+    def thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def score(self, thumb):
+        """Fraction of thumbnail pixels that moved past the threshold."""
+        diff = cv2.absdiff(thumb, self.reference)
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        return cv2.countNonZero(mask) / float(mask.size)
+
+    def changed(self, frame):
+        """True if `frame` differs enough from the last accepted frame."""
+        self.checked += 1
+        thumb = self.thumbnail(frame)
+        now = time.monotonic()
+
+        if self.reference is None or self.reference.shape != thumb.shape:
+            is_changed = True
+            self.last_score = 1.0
+        else:
+            self.last_score = self.score(thumb)
+            is_changed = self.last_score >= self.changed_fraction
+            if not is_changed and self.max_static_s is not None:
+                is_changed = now - self.last_change >= self.max_static_s
+
+        if is_changed:
+            self.reference = thumb
+            self.last_change = now
+            self.changed_count += 1
+        else:
+            self.unchanged_count += 1
+        return is_changed
+
+    def reset(self):
+        self.reference = None
+
+    def stats(self):
+        return {
+            "checked": self.checked,
+            "changed": self.changed_count,
+            "unchanged": self.unchanged_count,
+            "last_score": round(self.last_score, 4),
+            "pixel_threshold": self.pixel_threshold,
+            "changed_fraction": self.changed_fraction,
+        }
@@ -0,0 +1,76 @@
+# control_protocol.py
+# ------------------------------------------------------------
+# Text control channel (port 5005), one command per line.
+#
+# Legacy mode : "move:dx:dy" ... no reply (what old clients send).
+# Acked mode  : "<seq> <command>"; the server answers every line with
+#     ack <seq> ok pan=95 tilt=25 zoom=0 focus=0    (resulting target)
+#     ack <seq> err <message>
+#   long jobs (autofocus) also get, when finished,
+#     done <seq> ok focus=812 | done <seq> err <message>
+#   and after every completed motor move acked clients receive
+#     pos pan=95 tilt=25 zoom=0 focus=0
+#
+# Commands: move:dx:dy | zoom:n | focus:n | vel:pan/s:tilt/s[:zoom/s:focus/s]
+#           | autofocus | quit
+# A vel: command holds for VELOCITY_HOLD_S; clients repeat it while a key is
+# held and send vel:0:0 on release (a lost release stops by itself).
+# ------------------------------------------------------------
+
+AXES_ORDER = ("pan", "tilt", "zoom", "focus")
+VELOCITY_HOLD_S = 0.5
+
+
+def split_seq(line):
+    """'12 move:1:0' -> (12, 'move:1:0'); legacy lines give (None, line)."""
+    head, _, rest = line.partition(" ")
+    if rest and head.isdigit():
+        return int(head), rest.strip()
+    return None, line
+
+
+def format_values(values):
+    return " ".join(f"{axis}={int(values[axis])}" for axis in AXES_ORDER if axis in values)
+
+
+def format_reply(kind, seq, values=None, error=None):
+    if error is not None:
+        return f"{kind} {seq} err {error}"
+    text = f"{kind} {seq} ok"
+    if values:
+        text += " " + format_values(values)
+    return text
+
+
+def format_position(values):
+    return "pos " + format_values(values)
+
+
+def parse_reply(line):
+    """Returns (kind, seq, ok, values, error); seq is None for pos lines.
+
+    Never raises: a malformed line comes back with ok False and an error.
+    """
+    parts = line.split()
+    if not parts:
+        return None, None, False, {}, "empty line"
+    kind = parts[0]
+    if kind == "pos":
+        seq, ok, rest = None, True, parts[1:]
+    else:
+        if len(parts) < 3:
+            return kind, None, False, {}, f"short reply {line!r}"
+        if not parts[1].isdigit():
+            return kind, None, False, {}, f"bad sequence number in {line!r}"
+        seq, ok, rest = int(parts[1]), parts[2] == "ok", parts[3:]
+    if not ok:
+        return kind, seq, False, {}, " ".join(rest)
+    values = {}
+    for field in rest:
+        key, _, value = field.partition("=")
+        if value:
+            try:
+                values[key] = int(value)
+            except ValueError:
+                return kind, seq, False, {}, f"bad value {field!r} in {line!r}"
+    return kind, seq, True, values, None
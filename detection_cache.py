@@ -0,0 +1,189 @@
+# detection_cache.py
+# ------------------------------------------------------------
+# Content-addressed cache of per-frame detections/tracks.
+#
+# Key = sha256(video content, weights content, inference parameters), so
+# changing any of WEIGHTS / CONF / IMGSZ / tracker / classes or the video
+# itself gives a new cache entry; changing drawing or target-selection
+# logic does not.
+#
+# Layout, one directory per key under CACHE_DIR:
+#   index.npy  int64 (n_frames, 2): [row offset, row count]; count -1 =
+#              frame not cached yet. Memory-mapped, updated in place.
+#   rows.bin   packed ROW_DTYPE records, appended; memory-mapped for reads.
+#   key.json   what went into the key (for humans).
+#
+# Track IDs are only meaningful within one continuous tracker pass, so a
+# cache is all or nothing: it is written by one pass from frame 0 that put
+# every `stride`-th frame in order, and a cache left partial (interrupted
+# run, or a pass that skipped a frame) is cleared when opened and
+# re-recorded from frame 0. The index is sized from the container's frame
+# count, which is only an estimate for many files; finish() marks the rows
+# past the real end of stream as empty so such a cache can still complete.
+# ------------------------------------------------------------
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+CACHE_DIR = "cache"
+CACHE_VERSION = 1
+ROW_DTYPE = np.dtype([("x1", "<f4"), ("y1", "<f4"), ("x2", "<f4"), ("y2", "<f4"),
+                      ("id", "<i4"), ("cls", "<i2"), ("conf", "<f4")])
+SAMPLE_BYTES = 4 * 1024 * 1024      # files above 4x this are hashed by samples
+
+
+def file_digest(path):
+    """sha256 of the file; big files use size + head + middle + tail samples."""
+    size = os.path.getsize(path)
+    h = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as f:
+        if size <= 4 * SAMPLE_BYTES:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        else:
+            for offset in (0, size // 2, size - SAMPLE_BYTES):
+                f.seek(offset)
+                h.update(f.read(SAMPLE_BYTES))
+    return h.hexdigest()
+
+
+def cache_key(video, weights, params):
+    parts = {
+        "version": CACHE_VERSION,
+        "video": file_digest(video),
+        "weights": file_digest(weights),
+        "params": params,
+    }
+    blob = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha256(blob).hexdigest()[:32], parts
+
+
+class DetectionCache:
+    def __init__(self, directory, n_frames, stride=1):
+        self.directory = directory
+        self.stride = max(1, stride)
+        os.makedirs(directory, exist_ok=True)
+        index_path = os.path.join(directory, "index.npy")
+        if os.path.exists(index_path):
+            self.index = np.load(index_path, mmap_mode="r+")
+        else:
+            self.index = np.lib.format.open_memmap(index_path, mode="w+", dtype=np.int64,
+                                                   shape=(n_frames, 2))
+            self.index[:, 0] = 0
+            self.index[:, 1] = -1
+            self.index.flush()
+        self.rows_path = os.path.join(directory, "rows.bin")
+        self.discarded = 0
+        if not self.complete():
+            # Partial: its IDs came from a pass we cannot continue.
+            self.discarded = self.cached_frames()
+            self.index[:, 0] = 0
+            self.index[:, 1] = -1
+            self.index.flush()
+        # Rows past the last index entry belong to an interrupted write.
+        cached = self.index[:, 1] >= 0
+        end = int((self.index[cached, 0] + self.index[cached, 1]).max()) if cached.any() else 0
+        with open(self.rows_path, "ab") as f:
+            f.truncate(end * ROW_DTYPE.itemsize)
+        self.n_rows = end
+        self._rows = None
+        self._writer = open(self.rows_path, "ab")
+        self.recording = not cached.any()
+        self.next_frame = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, video, weights, params, n_frames, root=CACHE_DIR, stride=1):
+        key, parts = cache_key(video, weights, params)
+        directory = os.path.join(root, key)
+        cache = cls(directory, n_frames, stride)
+        with open(os.path.join(directory, "key.json"), "w") as f:
+            json.dump(dict(parts, source=os.path.abspath(video)), f, indent=2, default=str)
+        return cache
+
+    def __len__(self):
+        return len(self.index)
+
+    def cached_frames(self):
+        return int((self.index[:, 1] >= 0).sum())
+
+    def complete(self):
+        """Every `stride`-th frame is cached."""
+        return bool((self.index[::self.stride, 1] >= 0).all())
+
+    def _row_view(self, end):
+        if self._rows is None or len(self._rows) < end:
+            self._writer.flush()
+            self._rows = np.memmap(self.rows_path, dtype=ROW_DTYPE, mode="r") if self.n_rows else None
+        return self._rows
+
+    def get(self, frame_no):
+        """(boxes_xyxy, ids, clss, confs) for a cached frame, else None."""
+        if frame_no >= len(self.index) or self.index[frame_no, 1] < 0:
+            self.misses += 1
+            return None
+        self.hits += 1
+        offset, count = (int(v) for v in self.index[frame_no])
+        if count == 0:
+            return None, None, None, None
+        rows = self._row_view(offset + count)[offset:offset + count]
+        boxes = np.stack([rows["x1"], rows["y1"], rows["x2"], rows["y2"]], axis=1)
+        ids = rows["id"] if (rows["id"] >= 0).any() else None
+        return boxes, ids, rows["cls"].astype(int), rows["conf"].astype(float)
+
+    def put(self, frame_no, boxes_xyxy, ids, clss, confs):
+        """Record the next frame of the pass; False once recording has stopped.
+
+        A frame that is not the next one due means the tracker skipped one
+        (or the pass restarted), so recording stops and the cache stays
+        partial, to be re-recorded by the next run.
+        """
+        if not self.recording or frame_no >= len(self.index):
+            return False
+        if frame_no != self.next_frame:
+            self.recording = False
+            return False
+        n = 0 if boxes_xyxy is None else len(boxes_xyxy)
+        if n:
+            rows = np.zeros(n, ROW_DTYPE)
+            for k, name in enumerate(("x1", "y1", "x2", "y2")):
+                rows[name] = boxes_xyxy[:, k]
+            rows["id"] = ids if ids is not None else -1
+            rows["cls"] = clss if clss is not None else -1
+            rows["conf"] = confs if confs is not None else 0.0
+            self._writer.write(rows.tobytes())
+        # Row data first, index entry second: a crash never leaves an
+        # index entry pointing at rows that were not written.
+        self._writer.flush()
+        self.index[frame_no] = (self.n_rows, n)
+        self.n_rows += n
+        self.next_frame = frame_no + self.stride
+        return True
+
+    def finish(self, frames_seen):
+        """End of stream after `frames_seen` frames; True if that completes the cache.
+
+        Rows past it (the frame count was an overestimate) hold no frame and
+        are marked empty. Only a pass that recorded every frame up to the
+        end counts.
+        """
+        if not self.recording or self.next_frame < frames_seen:
+            return False
+        self.index[frames_seen:, 0] = self.n_rows
+        self.index[frames_seen:, 1] = 0
+        self.index.flush()
+        self.recording = False
+        return True
+
+    def close(self):
+        self._writer.close()
+        self.index.flush()
+        self._rows = None
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "complete": self.complete(),
+                "cached_frames": self.cached_frames(), "frames": len(self.index)}
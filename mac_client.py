@@ -1,23 +1,253 @@
 import sys
 import socket
-import struct
 import cv2
 import numpy as np
 import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 import queue
+import time
+from collections import deque
 from PIL import Image, ImageTk
 
+from stream_protocol import HEADER_V2, LEGACY_HEADER, KIND_META, is_v2, parse_v2, legacy_header
+from overlay_meta import decode_meta, draw_overlay
+from control_protocol import parse_reply, format_values, VELOCITY_HOLD_S
+
 # ===== NETWORK & CAMERA CONFIGURATION =====
 PI_IP = "192.168.1.168"
 STREAM_PORT = 8000
 CONTROL_PORT = 5005
+INITIAL_FRAME_BUFFER = 512 * 1024   # grows if a bigger JPEG shows up
+LATENCY_WINDOW = 300                # frames kept for the percentiles
+DISPLAY_SIZE = (960, 540)           # initial video area; follows window resizes
+REFRESH_HZ = 60                     # GUI pacing (display refresh rate)
+STATS_INTERVAL_S = 0.5              # how often the stats text is redrawn
+CONTROL_ACKED = True                # False: old fire-and-forget command lines
+COALESCE_INTERVAL_S = 0.05          # button presses within this merge into one move
+ACK_TIMEOUT_S = 5.0                 # commands unacked for this long count as lost
+KEY_VELOCITY = 40                   # pan/tilt units per second while an arrow key is held
+SHOW_OVERLAY = True                 # draw boxes/HUD from the metadata stream ('o' toggles)
+# Segments that cross from Pi clock to this machine's clock are only
+# meaningful when both are NTP-synced.
+LATENCY_SEGMENTS = ("capture>encode", "encode>recv", "recv>decode", "decode>show", "total")
 # ==========================================
 
+
+class LatestSlot:
+    """Single-item hand-off that always keeps only the newest item.
+
+    put() returns the item it displaced (None if the slot was empty), so
+    the producer can count the drop and recycle the item.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+
+    def put(self, item):
+        with self._cond:
+            old, self._item = self._item, item
+            self._cond.notify()
+            return old
+
+    def take(self, timeout=None):
+        with self._cond:
+            if self._item is None:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+
+class LatencyStats:
+    """Rolling p50/p95/p99 per pipeline segment, in milliseconds."""
+
+    def __init__(self, segments=LATENCY_SEGMENTS, window=LATENCY_WINDOW):
+        self.samples = {name: deque(maxlen=window) for name in segments}
+        self.last_seq = None
+        self.seq_gaps = 0
+
+    def add(self, name, seconds):
+        if seconds is not None:
+            self.samples[name].append(seconds * 1000.0)
+
+    def see_seq(self, seq):
+        """Count frames the server published but never sent us (skipped)."""
+        if seq is None:
+            return
+        if self.last_seq is not None and seq > self.last_seq + 1:
+            self.seq_gaps += seq - self.last_seq - 1
+        self.last_seq = seq
+
+    def percentiles(self, name):
+        values = sorted(self.samples[name])
+        if not values:
+            return None
+        pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+        return pick(0.50), pick(0.95), pick(0.99)
+
+    def summary(self):
+        lines = []
+        for name in self.samples:
+            p = self.percentiles(name)
+            if p is not None:
+                lines.append(f"{name:<15} p50 {p[0]:6.1f}  p95 {p[1]:6.1f}  p99 {p[2]:6.1f} ms")
+        return "\n".join(lines)
+
+
+class ControlChannel:
+    """Acked control connection (see control_protocol.py).
+
+    Relative moves are summed and sent at most once per
+    COALESCE_INTERVAL_S, so holding or hammering a button never queues
+    stale moves. Velocity is re-sent while active so the server's hold
+    timer keeps running.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self._send_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self.seq = 0
+        self._sent = {}                 # seq -> monotonic send time, in seq order
+        self._sent_lock = threading.Lock()
+        self._pending = {}              # axis -> summed relative steps
+        self._velocity = {}
+        self.target = {}
+        self.position = {}
+        self.rtt = LatencyStats(segments=("control rtt",))
+        self.sent = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.lost_acks = 0
+        threading.Thread(target=self._read_loop, daemon=True).start()
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def send(self, command):
+        with self._send_lock:
+            self.seq += 1
+            now = time.monotonic()
+            with self._sent_lock:
+                # Oldest first: drop entries whose ack never came.
+                while self._sent:
+                    seq, sent_at = next(iter(self._sent.items()))
+                    if now - sent_at <= ACK_TIMEOUT_S:
+                        break
+                    del self._sent[seq]
+                    self.lost_acks += 1
+                self._sent[self.seq] = now
+            self.sent += 1
+            self.sock.sendall(f"{self.seq} {command}\n".encode("utf-8"))
+            return self.seq
+
+    def nudge(self, **deltas):
+        with self._cond:
+            for axis, delta in deltas.items():
+                if not delta:
+                    continue
+                if self._pending.get(axis):
+                    self.coalesced += 1
+                self._pending[axis] = self._pending.get(axis, 0) + delta
+            self._cond.notify()
+
+    def set_velocity(self, **rates):
+        with self._cond:
+            self._velocity = {axis: rate for axis, rate in rates.items() if rate}
+            self._cond.notify()
+        self._send_velocity(rates)
+
+    def _send_velocity(self, rates):
+        self.send("vel:" + ":".join(str(rates.get(axis, 0)) for axis in ("pan", "tilt", "zoom", "focus")))
+
+    def _flush_loop(self):
+        refresh_s = VELOCITY_HOLD_S / 3
+        next_refresh = 0.0
+        while True:
+            with self._cond:
+                if not self._pending:
+                    self._cond.wait(refresh_s if self._velocity else None)
+                pending, self._pending = self._pending, {}
+                velocity = dict(self._velocity)
+            try:
+                if pending.get("pan") or pending.get("tilt"):
+                    self.send(f"move:{pending.get('pan', 0)}:{pending.get('tilt', 0)}")
+                for axis in ("zoom", "focus"):
+                    if pending.get(axis):
+                        self.send(f"{axis}:{pending[axis]}")
+                if velocity and time.monotonic() >= next_refresh:
+                    next_refresh = time.monotonic() + refresh_s
+                    self._send_velocity(velocity)
+            except OSError as e:
+                print(f"Control channel closed: {e}")
+                return
+            time.sleep(COALESCE_INTERVAL_S)
+
+    def _read_loop(self):
+        try:
+            with self.sock.makefile("r", encoding="utf-8", newline="\n") as lines:
+                for line in lines:
+                    try:
+                        self._handle_reply(line.strip())
+                    except ValueError as e:
+                        # One bad line must not end the reader for good.
+                        self.errors += 1
+                        print(f"Bad control reply {line.strip()!r}: {e}")
+        except (OSError, ValueError) as e:
+            print(f"Control channel closed: {e}")
+
+    def _handle_reply(self, line):
+        if not line:
+            return
+        kind, seq, ok, values, error = parse_reply(line)
+        if kind == "pos" and ok:
+            self.position.update(values)
+            return
+        if kind == "ack":
+            with self._sent_lock:
+                sent_at = self._sent.pop(seq, None)
+            if sent_at is not None:
+                self.rtt.add("control rtt", time.monotonic() - sent_at)
+            if ok:
+                self.target.update(values)
+        if not ok:
+            self.errors += 1
+            print(f"Command {seq} failed: {error}")
+        elif kind == "done":
+            self.position.update(values)
+            print(f"Command {seq} done: {format_values(values)}")
+
+    def summary(self):
+        text = self.rtt.summary() or "control rtt     -"
+        return (f"{text}\nctrl sent {self.sent} merged {self.coalesced} err {self.errors} "
+                f"lost {self.lost_acks}  "
+                f"pos {format_values(self.position)}")
+
+
 # Global variables for communication
 control_socket = None
-frame_queue = queue.Queue()
+control = None               # ControlChannel when CONTROL_ACKED
+jpeg_slot = LatestSlot()     # receiver -> decoder: (buffer, length, info)
+frame_slot = LatestSlot()    # decoder -> GUI: (frame, info)
+free_buffers = queue.SimpleQueue()
+stats = {
+    "received": 0,
+    "decoded": 0,
+    "displayed": 0,
+    "dropped_jpeg": 0,     # overwritten before the decoder got to it
+    "dropped_frame": 0,    # decoded but replaced before the GUI showed it
+    "delay_ms": 0.0,       # receive -> display, smoothed
+}
+latency = LatencyStats()
+display_target = DISPLAY_SIZE   # (w, h) of the video area, set by the GUI
+
+# JPEG DCT scaling: decoding at 1/2, 1/4 or 1/8 size is much cheaper than
+# a full decode followed by a resize.
+REDUCED_DECODE = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+    (1, cv2.IMREAD_COLOR),
+)
 
 
 # --- GUI and Control Functions ---
@@ -32,6 +262,40 @@ def send_command(command):
         messagebox.showerror("Connection Error", "Failed to send command. Check server connection.")
 
 
+def recv_into_exact(sock, view):
+    """Fill `view` completely from `sock`; False if the peer closed."""
+    got = 0
+    size = len(view)
+    while got < size:
+        n = sock.recv_into(view[got:], size - got)
+        if n == 0:
+            return False
+        got += n
+    return True
+
+
+def read_frame_header(sock, header_view):
+    """Read one frame header, v2 or legacy. Returns a FrameHeader or None.
+
+    `header_view` must be at least HEADER_V2.size bytes.
+    """
+    first = header_view[:LEGACY_HEADER.size]
+    if not recv_into_exact(sock, first):
+        return None
+    if not is_v2(first):
+        return legacy_header(LEGACY_HEADER.unpack(first)[0])
+
+    if not recv_into_exact(sock, header_view[LEGACY_HEADER.size:HEADER_V2.size]):
+        return None
+    header, header_len = parse_v2(header_view[:HEADER_V2.size])
+    extra = header_len - HEADER_V2.size
+    if extra > 0:
+        # Fields added by a newer server; skip what we don't understand.
+        if not recv_into_exact(sock, memoryview(bytearray(extra))):
+            return None
+    return header
+
+
 def stream_video():
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     try:
@@ -41,49 +305,237 @@ def stream_video():
         print(f"Could not connect to video stream: {e}")
         return
 
-    connection = client_socket.makefile('rb')
+    threading.Thread(target=decode_frames, daemon=True).start()
+
+    # Three reusable buffers rotate between receiver, slot and decoder, so
+    # steady-state receiving allocates nothing and copies nothing.
+    for _ in range(2):
+        free_buffers.put(bytearray(INITIAL_FRAME_BUFFER))
+    buf = bytearray(INITIAL_FRAME_BUFFER)
+    header_view = memoryview(bytearray(HEADER_V2.size))
+    meta_seq, meta = None, None
 
     try:
         while True:
-            image_len_bytes = connection.read(struct.calcsize('<L'))
-            if not image_len_bytes:
+            header = read_frame_header(client_socket, header_view)
+            if header is None:
                 break
 
-            image_len = struct.unpack('<L', image_len_bytes)[0]
-
-            frame_data = b''
-            while len(frame_data) < image_len:
-                chunk = connection.read(image_len - len(frame_data))
-                if not chunk:
+            if header.kind == KIND_META:
+                # Overlay record for the JPEG with the same seq, which follows.
+                payload = bytearray(header.payload_len)
+                if not recv_into_exact(client_socket, memoryview(payload)):
                     break
-                frame_data += chunk
+                meta_seq, meta = header.seq, decode_meta(payload)
+                continue
 
-            frame_array = np.frombuffer(frame_data, dtype=np.uint8)
-            frame = cv2.imdecode(frame_array, cv2.IMREAD_COLOR)
+            image_len = header.payload_len
+            if image_len > len(buf):
+                buf = bytearray(max(image_len, 2 * len(buf)))
 
-            if frame is not None:
-                frame_queue.put(frame)
+            if not recv_into_exact(client_socket, memoryview(buf)[:image_len]):
+                break
+            stats["received"] += 1
+            latency.see_seq(header.seq)
+            info = {
+                "seq": header.seq,
+                "capture_ts": header.capture_ts,
+                "encode_ts": header.encode_ts,
+                "recv_ts": time.time(),
+                "recv_mono": time.monotonic(),
+                "ptz": (header.pan, header.tilt, header.zoom, header.focus),
+                "meta": meta if meta_seq == header.seq else None,
+            }
+
+            old = jpeg_slot.put((buf, image_len, info))
+            if old is not None:
+                stats["dropped_jpeg"] += 1
+                buf = old[0]
+            else:
+                buf = free_buffers.get()
 
     except Exception as e:
         print(f"Video stream stopped: {e}")
 
     finally:
-        connection.close()
         client_socket.close()
 
 
-def update_gui(video_label, root):
-    if not frame_queue.empty():
-        frame = frame_queue.get()
-
-        img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img_pil = Image.fromarray(img_rgb)
-        img_tk = ImageTk.PhotoImage(image=img_pil)
-
-        video_label.configure(image=img_tk)
-        video_label.image = img_tk
-
-    root.after(10, update_gui, video_label, root)
+def fit_size(src_w, src_h, box_w, box_h):
+    """Largest size with the source aspect ratio that fits the box."""
+    scale = min(box_w / src_w, box_h / src_h)
+    return max(1, int(src_w * scale)), max(1, int(src_h * scale))
+
+
+def pick_reduction(src_size, out_size):
+    """Biggest JPEG decode reduction that still covers out_size."""
+    for factor, flag in REDUCED_DECODE:
+        if src_size[0] // factor >= out_size[0] and src_size[1] // factor >= out_size[1]:
+            return factor, flag
+    return 1, cv2.IMREAD_COLOR
+
+
+def decode_frames():
+    """Decode stage: newest JPEG only, straight to a display-size RGB image.
+
+    Everything pixel-related (reduced decode, resize, BGR->RGB, PIL wrap)
+    happens here so the Tk thread only has to paste the result.
+    """
+    source_size = None
+    while True:
+        buf, image_len, info = jpeg_slot.take()
+        box = display_target
+        factor, flag = 1, cv2.IMREAD_COLOR
+        if source_size is not None:
+            factor, flag = pick_reduction(source_size, fit_size(*source_size, *box))
+        try:
+            frame_array = np.frombuffer(buf, dtype=np.uint8, count=image_len)
+            frame = cv2.imdecode(frame_array, flag)
+        finally:
+            free_buffers.put(buf)
+
+        if frame is None:
+            continue
+        h, w = frame.shape[:2]
+        source_size = (w * factor, h * factor)
+        out_size = fit_size(*source_size, *box)
+        if (w, h) != out_size:
+            interp = cv2.INTER_AREA if out_size[0] < w else cv2.INTER_LINEAR
+            frame = cv2.resize(frame, out_size, interpolation=interp)
+        if SHOW_OVERLAY and info.get("meta"):
+            # Drawn at display size: cheaper, and text stays readable.
+            draw_overlay(frame, info["meta"])
+        image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+        stats["decoded"] += 1
+        info["decode_mono"] = time.monotonic()
+        if frame_slot.put((image, info)) is not None:
+            stats["dropped_frame"] += 1
+
+
+def record_latency(info):
+    """Split capture -> display into segments for one displayed frame."""
+    shown_mono = time.monotonic()
+    shown_ts = time.time()
+    latency.add("recv>decode", info["decode_mono"] - info["recv_mono"])
+    latency.add("decode>show", shown_mono - info["decode_mono"])
+    if info["capture_ts"]:
+        latency.add("capture>encode", info["encode_ts"] - info["capture_ts"])
+        latency.add("encode>recv", info["recv_ts"] - info["encode_ts"])
+        latency.add("total", shown_ts - info["capture_ts"])
+
+
+def toggle_overlay(event=None):
+    global SHOW_OVERLAY
+    SHOW_OVERLAY = not SHOW_OVERLAY
+
+
+def set_display_target(event):
+    global display_target
+    if event.width > 1 and event.height > 1:
+        display_target = (event.width, event.height)
+
+
+def show_image(video_label, image):
+    """Paste into the label's PhotoImage; only rebuild it when the size changes."""
+    photo = getattr(video_label, "image", None)
+    if photo is not None and (photo.width(), photo.height()) == image.size:
+        photo.paste(image)
+        return
+    photo = ImageTk.PhotoImage(image=image)
+    video_label.configure(image=photo)
+    video_label.image = photo
+
+
+def update_gui(video_label, stats_label, root, next_due=None, next_stats=0.0):
+    """One display tick, rescheduled at REFRESH_HZ against a fixed clock."""
+    now = time.monotonic()
+    item = frame_slot.take(timeout=0)
+    if item is not None:
+        image, info = item
+        show_image(video_label, image)
+        stats["displayed"] += 1
+        record_latency(info)
+        delay_ms = (time.monotonic() - info["recv_mono"]) * 1000.0
+        stats["delay_ms"] += 0.1 * (delay_ms - stats["delay_ms"])
+
+    if now >= next_stats:
+        next_stats = now + STATS_INTERVAL_S
+        stats_label.configure(text=(
+            f"rx {stats['received']}  shown {stats['displayed']}  "
+            f"dropped {stats['dropped_jpeg']}+{stats['dropped_frame']}  "
+            f"seq gaps {latency.seq_gaps}  delay {stats['delay_ms']:.0f} ms\n"
+            + latency.summary()
+            + ("\n" + control.summary() if control else "")))
+
+    period = 1.0 / REFRESH_HZ
+    next_due = now + period if next_due is None or next_due + period < now else next_due + period
+    delay_ms = max(1, int((next_due - time.monotonic()) * 1000))
+    root.after(delay_ms, update_gui, video_label, stats_label, root, next_due, next_stats)
+
+
+def move(pan=0, tilt=0):
+    if control:
+        control.nudge(pan=pan, tilt=tilt)
+    else:
+        send_command(f"move:{pan}:{tilt}")
+
+
+def step(axis, amount):
+    if control:
+        control.nudge(**{axis: amount})
+    else:
+        send_command(f"{axis}:{amount}")
+
+
+def run_command(command):
+    if control:
+        control.send(command)
+    else:
+        send_command(command)
+
+
+class KeyVelocity:
+    """Arrow keys drive pan/tilt velocity for as long as they are held.
+
+    Key auto-repeat produces release/press pairs; a release only counts if
+    no press of the same key follows within RELEASE_GRACE_MS.
+    """
+    RELEASE_GRACE_MS = 60
+    KEYS = {"Left": ("pan", 1), "Right": ("pan", -1), "Up": ("tilt", -1), "Down": ("tilt", 1)}
+
+    def __init__(self, root, channel, speed=KEY_VELOCITY):
+        self.root = root
+        self.channel = channel
+        self.speed = speed
+        self.held = {}      # keysym -> last press time
+        for key in self.KEYS:
+            root.bind(f"<KeyPress-{key}>", self.press)
+            root.bind(f"<KeyRelease-{key}>", self.release)
+
+    def press(self, event):
+        is_new = event.keysym not in self.held
+        self.held[event.keysym] = time.monotonic()
+        if is_new:
+            self.update()
+
+    def release(self, event):
+        self.root.after(self.RELEASE_GRACE_MS, self._released, event.keysym, time.monotonic())
+
+    def _released(self, key, released_at):
+        if key in self.held and self.held[key] <= released_at:
+            del self.held[key]
+            self.update()
+
+    def update(self):
+        rates = {"pan": 0, "tilt": 0}
+        for key in self.held:
+            axis, sign = self.KEYS[key]
+            rates[axis] += sign * self.speed
+        try:
+            self.channel.set_velocity(**rates)
+        except OSError as e:
+            print(f"Failed to send velocity: {e}")
 
 
 def create_control_panel(root):
@@ -96,23 +548,29 @@ def create_control_panel(root):
     # --- Motor Controls ---
     motor_frame = ttk.LabelFrame(control_frame, text="Motor Control", padding=10)
     motor_frame.pack(pady=10, padx=10, fill="x")
-    ttk.Button(motor_frame, text="Move Up", command=lambda: send_command(f"move:0:-5\n")).pack(fill="x", pady=2)
-    ttk.Button(motor_frame, text="Move Down", command=lambda: send_command(f"move:0:5\n")).pack(fill="x", pady=2)
-    ttk.Button(motor_frame, text="Move Left", command=lambda: send_command(f"move:5:0\n")).pack(fill="x", pady=2)
-    ttk.Button(motor_frame, text="Move Right", command=lambda: send_command(f"move:-5:0\n")).pack(fill="x", pady=2)
+    ttk.Button(motor_frame, text="Move Up", command=lambda: move(tilt=-5)).pack(fill="x", pady=2)
+    ttk.Button(motor_frame, text="Move Down", command=lambda: move(tilt=5)).pack(fill="x", pady=2)
+    ttk.Button(motor_frame, text="Move Left", command=lambda: move(pan=5)).pack(fill="x", pady=2)
+    ttk.Button(motor_frame, text="Move Right", command=lambda: move(pan=-5)).pack(fill="x", pady=2)
+    if control:
+        KeyVelocity(root, control)
+        ttk.Label(motor_frame, text="Hold arrow keys to pan/tilt").pack(fill="x", pady=2)
 
     # --- Zoom and Focus Controls ---
     zoom_focus_frame = ttk.LabelFrame(control_frame, text="Zoom & Focus", padding=10)
     zoom_focus_frame.pack(pady=10, padx=10, fill="x")
-    ttk.Button(zoom_focus_frame, text="Zoom In", command=lambda: send_command(f"zoom:100\n")).pack(fill="x", pady=2)
-    ttk.Button(zoom_focus_frame, text="Zoom Out", command=lambda: send_command(f"zoom:-100\n")).pack(fill="x", pady=2)
-    ttk.Button(zoom_focus_frame, text="Focus In", command=lambda: send_command(f"focus:5\n")).pack(fill="x", pady=2)
-    ttk.Button(zoom_focus_frame, text="Focus Out", command=lambda: send_command(f"focus:-5\n")).pack(fill="x", pady=2)
-    ttk.Button(zoom_focus_frame, text="Autofocus", command=lambda: send_command(f"autofocus\n")).pack(fill="x", pady=2)
+    ttk.Button(zoom_focus_frame, text="Zoom In", command=lambda: step("zoom", 100)).pack(fill="x", pady=2)
+    ttk.Button(zoom_focus_frame, text="Zoom Out", command=lambda: step("zoom", -100)).pack(fill="x", pady=2)
+    ttk.Button(zoom_focus_frame, text="Focus In", command=lambda: step("focus", 5)).pack(fill="x", pady=2)
+    ttk.Button(zoom_focus_frame, text="Focus Out", command=lambda: step("focus", -5)).pack(fill="x", pady=2)
+    ttk.Button(zoom_focus_frame, text="Autofocus", command=lambda: run_command("autofocus")).pack(fill="x", pady=2)
 
     # --- Quit Button ---
     def on_quit():
-        send_command("quit\n")
+        try:
+            run_command("quit")      # through the channel's send lock when acked
+        except OSError as e:
+            print(f"Failed to send quit: {e}")
         root.destroy()
         sys.exit(0)
 
@@ -121,7 +579,7 @@ def create_control_panel(root):
 
 
 def main():
-    global control_socket
+    global control_socket, control
 
     # Connect to the command server first
     control_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -132,14 +590,27 @@ def main():
         print(f"Could not connect to control server: {e}")
         messagebox.showerror("Connection Error", "Could not connect to control server.")
         return
+    control_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if CONTROL_ACKED:
+        control = ControlChannel(control_socket)
 
     # Create the main Tkinter window
     root = tk.Tk()
     root.title("PTZ Camera Control")
 
     # Create video display area
-    video_label = tk.Label(root)
-    video_label.pack(side=tk.LEFT, padx=10, pady=10)
+    video_frame = ttk.Frame(root)
+    video_frame.pack(side=tk.LEFT, padx=10, pady=10, fill="both", expand=True)
+    # Fixed-size area the decoder scales into; the label must not resize
+    # it, or each frame would feed back into the next target size.
+    video_area = ttk.Frame(video_frame, width=DISPLAY_SIZE[0], height=DISPLAY_SIZE[1])
+    video_area.pack_propagate(False)
+    video_area.pack(fill="both", expand=True)
+    video_area.bind("<Configure>", set_display_target)
+    video_label = tk.Label(video_area)
+    video_label.pack(expand=True)
+    stats_label = ttk.Label(video_frame, font=('Courier', 10), justify=tk.LEFT)
+    stats_label.pack(fill="x")
 
     # Start the video stream in a separate thread
     video_thread = threading.Thread(target=stream_video, daemon=True)
@@ -147,9 +618,10 @@ def main():
 
     # Create control panel
     create_control_panel(root)
+    root.bind("<KeyPress-o>", toggle_overlay)
 
     # Start the GUI update loop
-    update_gui(video_label, root)
+    update_gui(video_label, stats_label, root)
 
     root.mainloop()
 
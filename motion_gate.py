@@ -0,0 +1,134 @@
+# motion_gate.py
+# ------------------------------------------------------------
+# Motion-gated inference for the CPU path.
+#
+# - MotionGate: asks change_detect.ChangeDetector whether the downsampled
+#   luma moved since the last *detected* frame. Static frames skip the
+#   detector, but a detection is forced at least every max_skip frames.
+# - BoxKalman: constant-velocity Kalman filter on (cx, cy, w, h), time in
+#   frame-index units, so gaps of several frames are one predict step.
+# - TrackPropagator: one BoxKalman per track ID. Real detections correct
+#   the filters; skipped frames get the predicted boxes of the IDs seen in
+#   the last detection.
+#
+#   gate, prop = MotionGate(max_skip=5), TrackPropagator()
+#   if gate.should_infer(frame):
+#       tracks = detect(frame); prop.update(index, tracks)
+#   else:
+#       tracks = prop.predict(index)
+# ------------------------------------------------------------
+
+import numpy as np
+
+from change_detect import ChangeDetector
+
+
+class MotionGate:
+    def __init__(self, detector=None, max_skip=5, pixel_threshold=16, changed_fraction=0.01):
+        # Finer thumbnail than the stream's change test: a horse walking
+        # across a wide shot only covers a few thumbnail pixels.
+        self.detector = detector or ChangeDetector(size=(96, 54), pixel_threshold=pixel_threshold,
+                                                   changed_fraction=changed_fraction)
+        self.max_skip = max_skip
+        self.run = 0            # consecutive skipped frames
+        self.frames = 0
+        self.skipped = 0
+
+    def should_infer(self, frame):
+        self.frames += 1
+        if self.detector.changed(frame):
+            self.run = 0
+            return True
+        if self.run >= self.max_skip:
+            # Forced detection: it becomes the reference for the next frames.
+            self.detector.reference = self.detector.thumbnail(frame)
+            self.run = 0
+            return True
+        self.run += 1
+        self.skipped += 1
+        return False
+
+    def reset(self):
+        self.detector.reset()
+        self.run = 0
+
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+
+class BoxKalman:
+    """State (cx, cy, w, h, vcx, vcy, vw, vh); measurement (cx, cy, w, h)."""
+
+    def __init__(self, box, index, pos_noise=1.0, vel_noise=0.5, meas_noise=4.0):
+        cx, cy, w, h = _to_cxcywh(box)
+        self.x = np.array([cx, cy, w, h, 0, 0, 0, 0], dtype=np.float64)
+        size = max(w, h, 1.0)
+        self.P = np.diag([size, size, size, size, size * 4, size * 4, size, size]) ** 2 * 0.01
+        self.q = np.array([pos_noise] * 4 + [vel_noise] * 4) ** 2
+        self.R = np.eye(4) * meas_noise ** 2
+        self.H = np.eye(4, 8)
+        self.index = index
+
+    @staticmethod
+    def _F(dt):
+        F = np.eye(8)
+        F[:4, 4:] = np.eye(4) * dt
+        return F
+
+    def predict(self, index):
+        """Box (x1, y1, x2, y2) expected at `index`; the filter is not changed."""
+        x = self._F(index - self.index) @ self.x
+        return _to_xyxy(x[:4])
+
+    def correct(self, box, index):
+        dt = index - self.index
+        F = self._F(dt)
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + np.diag(self.q * max(dt, 1))
+        z = np.array(_to_cxcywh(box))
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ (z - self.H @ self.x)
+        self.P = (np.eye(8) - K @ self.H) @ self.P
+        self.index = index
+
+
+class TrackPropagator:
+    def __init__(self, max_age=60):
+        self.max_age = max_age      # frames a filter survives without its ID
+        self.filters = {}           # track id -> BoxKalman
+        self.last = (None, None, None, None)
+        self.last_index = None
+
+    def update(self, index, tracks):
+        """Correct the filters with a real (boxes, ids, clss, confs) result."""
+        self.last, self.last_index = tracks, index
+        boxes_xyxy, ids = tracks[0], tracks[1]
+        if boxes_xyxy is not None and ids is not None:
+            for box, tid in zip(boxes_xyxy, ids):
+                kf = self.filters.get(int(tid))
+                if kf is None:
+                    self.filters[int(tid)] = BoxKalman(box, index)
+                else:
+                    kf.correct(box, index)
+        for tid in [t for t, kf in self.filters.items() if index - kf.index > self.max_age]:
+            del self.filters[tid]
+
+    def predict(self, index):
+        """Tracks of the last detection moved to `index` (unchanged without IDs)."""
+        boxes_xyxy, ids, clss, confs = self.last
+        if boxes_xyxy is None or ids is None:
+            return self.last
+        moved = np.array([self.filters[int(t)].predict(index) for t in ids], dtype=np.float32)
+        return moved.reshape(-1, 4), ids, clss, confs
+
+
+def _to_cxcywh(box):
+    x1, y1, x2, y2 = (float(v) for v in box)
+    return (x1 + x2) / 2.0, (y1 + y2) / 2.0, x2 - x1, y2 - y1
+
+
+def _to_xyxy(c):
+    cx, cy, w, h = c
+    w, h = max(w, 1.0), max(h, 1.0)
+    return cx - w / 2.0, cy - h / 2.0, cx + w / 2.0, cy + h / 2.0
@@ -0,0 +1,134 @@
+# orientation.py
+# ------------------------------------------------------------
+# Image orientation as a capture-pipeline stage.
+#
+# The old per-frame fix was `cv2.transpose` + `cv2.flip(..., 1)`: two
+# full-frame copies and two fresh allocations per frame. This stage:
+#   1. pushes whatever it can into the sensor/ISP (libcamera Transform
+#      supports hflip/vflip on the Pi; it cannot transpose),
+#   2. does the remaining work as ONE OpenCV call into a reused buffer,
+#   3. or skips pixel work entirely (`defer`) for consumers that only need
+#      coordinates, via map_point()/map_box().
+#
+# Names describe the final picture relative to the sensor image:
+#   "none", "hflip", "vflip", "rot180", "rot90cw", "rot90ccw".
+# "rot90cw" == transpose then flip(1), i.e. the old behaviour.
+# ------------------------------------------------------------
+
+import cv2
+import numpy as np
+
+# name -> (isp hflip, isp vflip, op left after the ISP, op with no ISP)
+# op is one of None, "transpose", or an OpenCV rotate/flip spec.
+_PLAN = {
+    "none":     (0, 0, None, None),
+    "hflip":    (1, 0, None, ("flip", 1)),
+    "vflip":    (0, 1, None, ("flip", 0)),
+    "rot180":   (1, 1, None, ("rotate", cv2.ROTATE_180)),
+    # transpose(vflip(x)) == rot90cw(x); transpose(hflip(x)) == rot90ccw(x)
+    "rot90cw":  (0, 1, ("transpose",), ("rotate", cv2.ROTATE_90_CLOCKWISE)),
+    "rot90ccw": (1, 0, ("transpose",), ("rotate", cv2.ROTATE_90_COUNTERCLOCKWISE)),
+}
+
+ORIENTATIONS = tuple(_PLAN)
+
+
+class Orientation:
+    def __init__(self, name="rot90cw", use_isp=True, defer=False, buffers=1):
+        if name not in _PLAN:
+            raise ValueError(f"unknown orientation {name!r}, expected one of {ORIENTATIONS}")
+        self.name = name
+        self.use_isp = use_isp
+        self.defer = defer
+        self.isp_active = False
+        # Ring of output buffers. One is enough when the consumer is done
+        # with a frame before the next apply(); use more when frames are
+        # handed to another thread.
+        self._buffers = [None] * max(1, buffers)
+        self._next = 0
+
+    # ============================================================
+    # Sensor / ISP side
+    # ============================================================
+    def camera_transform(self):
+        """libcamera Transform for Picamera2's configure(), or None.
+
+        Call this before configuring the camera and pass the result as
+        `transform=`; apply() then only does what the ISP could not.
+        """
+        hflip, vflip, _, _ = _PLAN[self.name]
+        if not self.use_isp or not (hflip or vflip):
+            return None
+        try:
+            from libcamera import Transform
+        except ImportError:
+            return None
+        self.isp_active = True
+        return Transform(hflip=hflip, vflip=vflip)
+
+    def software_op(self):
+        _, _, after_isp, no_isp = _PLAN[self.name]
+        return after_isp if self.isp_active else no_isp
+
+    # ============================================================
+    # Pixel side
+    # ============================================================
+    def _buffer(self, shape, dtype):
+        buf = self._buffers[self._next]
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype)
+            self._buffers[self._next] = buf
+        self._next = (self._next + 1) % len(self._buffers)
+        return buf
+
+    def output_shape(self, shape):
+        op = self.software_op()
+        if op is not None and (op[0] == "transpose" or (op[0] == "rotate" and op[1] in (
+                cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_90_COUNTERCLOCKWISE))):
+            return (shape[1], shape[0]) + tuple(shape[2:])
+        return tuple(shape)
+
+    def apply(self, frame):
+        """Return `frame` in display orientation (one op, reused buffer)."""
+        op = self.software_op()
+        if op is None or self.defer:
+            return frame
+        dst = self._buffer(self.output_shape(frame.shape), frame.dtype)
+        if op[0] == "transpose":
+            cv2.transpose(frame, dst)
+        elif op[0] == "rotate":
+            cv2.rotate(frame, op[1], dst)
+        else:
+            cv2.flip(frame, op[1], dst)
+        return dst
+
+    __call__ = apply
+
+    # ============================================================
+    # Coordinate side (for deferred consumers)
+    # ============================================================
+    def map_point(self, x, y, width, height):
+        """Map (x, y) in the captured image (width x height) to display coords.
+
+        The captured image is what the camera delivered, i.e. after any ISP
+        flips; only the software part of the transform is applied here.
+        """
+        op = self.software_op()
+        if op is None:
+            return x, y
+        if op[0] == "transpose":
+            return y, x
+        code = op[1]
+        if op[0] == "flip":
+            return (width - 1 - x, y) if code == 1 else (x, height - 1 - y)
+        if code == cv2.ROTATE_90_CLOCKWISE:
+            return height - 1 - y, x
+        if code == cv2.ROTATE_90_COUNTERCLOCKWISE:
+            return y, width - 1 - x
+        return width - 1 - x, height - 1 - y   # ROTATE_180
+
+    def map_box(self, x1, y1, x2, y2, width, height):
+        """Map an axis-aligned box; returns (x1, y1, x2, y2) sorted."""
+        ax, ay = self.map_point(x1, y1, width, height)
+        bx, by = self.map_point(x2, y2, width, height)
+        return min(ax, bx), min(ay, by), max(ax, bx), max(ay, by)
@@ -0,0 +1,187 @@
+# overlay_meta.py
+# ------------------------------------------------------------
+# Per-frame metadata instead of burned-in overlays.
+#
+# The Pi encodes clean frames and sends, next to each one, a small JSON
+# record with the same sequence number:
+#   {"ptz": {"pan": 90, "tilt": 25, "zoom": 0, "focus": 0},
+#    "dets": [[x1, y1, x2, y2, track_id, label, conf], ...],
+#    "target": {"id": 3, "state": "tracking"},
+#    "hud": "free text"}
+# Box coordinates are normalized to 0..1 of the frame they belong to, so a
+# client can draw them on whatever size it displays. Every key is optional.
+#
+# Transport:
+#   - length-prefixed stream: a KIND_META record right before the JPEG
+#     (stream_protocol.py)
+#   - HTTP servers: /meta as Server-Sent Events, rendered by VIEWER_HTML
+# ------------------------------------------------------------
+
+import json
+
+import cv2
+
+TARGET_COLOR = (0, 255, 0)
+OTHER_COLOR = (200, 200, 200)
+HUD_COLOR = (50, 200, 255)
+
+
+# ============================================================
+# Building records (Pi side)
+# ============================================================
+def detection(x1, y1, x2, y2, width, height, track_id=None, label=None, conf=None):
+    """One detection in pixel coords of a width x height frame -> record entry."""
+    return [round(x1 / width, 4), round(y1 / height, 4),
+            round(x2 / width, 4), round(y2 / height, 4),
+            -1 if track_id is None else int(track_id),
+            label, None if conf is None else round(float(conf), 3)]
+
+
+def detections_from_boxes(boxes_xyxy, ids, clss, confs, width, height):
+    """Ultralytics-style parallel arrays (see testing_on_video.draw_boxes)."""
+    if boxes_xyxy is None:
+        return []
+    return [detection(x1, y1, x2, y2, width, height, tid, c, p)
+            for (x1, y1, x2, y2), tid, c, p in zip(boxes_xyxy, ids, clss, confs)]
+
+
+def build_meta(ptz=None, dets=None, target=None, hud=None):
+    meta = {}
+    if ptz:
+        meta["ptz"] = {k: int(v) for k, v in ptz.items()}
+    if dets:
+        meta["dets"] = dets
+    if target:
+        meta["target"] = target
+    if hud:
+        meta["hud"] = hud
+    return meta
+
+
+def encode_meta(meta):
+    return json.dumps(meta, separators=(",", ":")).encode("utf-8")
+
+
+def decode_meta(payload):
+    return json.loads(bytes(payload).decode("utf-8"))
+
+
+def orient_meta(meta, orientation, width, height):
+    """Map normalized boxes through an Orientation (submitted -> encoded frame)."""
+    if not meta or not meta.get("dets") or orientation.software_op() is None:
+        return meta
+    out_h, out_w = orientation.output_shape((height, width))[:2]
+    dets = []
+    for x1, y1, x2, y2, *rest in meta["dets"]:
+        a, b, c, d = orientation.map_box(x1 * (width - 1), y1 * (height - 1),
+                                         x2 * (width - 1), y2 * (height - 1), width, height)
+        dets.append([round(a / (out_w - 1), 4), round(b / (out_h - 1), 4),
+                     round(c / (out_w - 1), 4), round(d / (out_h - 1), 4)] + rest)
+    return dict(meta, dets=dets)
+
+
+def meta_event(seq, info):
+    """One Server-Sent Event for frame `seq` (info as from wait_frame())."""
+    record = {"seq": seq, "capture_ts": info.get("capture_ts"), "encode_ts": info.get("encode_ts")}
+    record.update(info.get("meta") or {})
+    return b"id: %d\ndata: %s\n\n" % (seq, encode_meta(record))
+
+
+# ============================================================
+# Drawing (client side)
+# ============================================================
+def ptz_text(ptz):
+    return "  ".join(f"{k} {ptz[k]}" for k in ("pan", "tilt", "zoom", "focus") if k in ptz)
+
+
+def draw_overlay(img, meta, highlight_id=None):
+    """Draw boxes, IDs and HUD from a record onto `img` in place."""
+    if not meta:
+        return img
+    h, w = img.shape[:2]
+    target = meta.get("target") or {}
+    if highlight_id is None:
+        highlight_id = target.get("id")
+
+    for x1, y1, x2, y2, tid, label, conf in meta.get("dets", ()):
+        hot = highlight_id is not None and tid == highlight_id
+        color = TARGET_COLOR if hot else OTHER_COLOR
+        p1 = (int(x1 * w), int(y1 * h))
+        cv2.rectangle(img, p1, (int(x2 * w), int(y2 * h)), color, 2 if hot else 1)
+        text = f"ID {tid}" if tid >= 0 else (str(label) if label is not None else "")
+        if text:
+            cv2.putText(img, text, (p1[0], max(p1[1] - 6, 10)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+
+    lines = []
+    if meta.get("ptz"):
+        lines.append(ptz_text(meta["ptz"]))
+    if target:
+        lines.append(f"target {target.get('id', '-')} {target.get('state', '')}".strip())
+    if meta.get("hud"):
+        lines.append(meta["hud"])
+    for i, line in enumerate(lines):
+        cv2.putText(img, line, (10, 22 + 22 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                    HUD_COLOR, 2, cv2.LINE_AA)
+    return img
+
+
+# ============================================================
+# Browser viewer (served at / by FOR_ME.py and async_stream_server.py)
+# ============================================================
+VIEWER_HTML = b"""<!doctype html>
+<html><head><meta charset="utf-8"><title>Mergui Camera</title>
+<style>
+  body { margin: 0; background: #111; color: #ccc; font: 13px sans-serif; }
+  #view { position: relative; display: inline-block; }
+  #video { display: block; max-width: 100vw; max-height: 95vh; }
+  #overlay { position: absolute; left: 0; top: 0; pointer-events: none; }
+</style></head>
+<body>
+<div id="view"><img id="video" src="/video"><canvas id="overlay"></canvas></div>
+<div><label><input id="show" type="checkbox" checked> overlay</label> <span id="info"></span></div>
+<script>
+const img = document.getElementById("video");
+const canvas = document.getElementById("overlay");
+const ctx = canvas.getContext("2d");
+const info = document.getElementById("info");
+const show = document.getElementById("show");
+let meta = null;
+
+function draw() {
+  canvas.width = img.clientWidth;
+  canvas.height = img.clientHeight;
+  ctx.clearRect(0, 0, canvas.width, canvas.height);
+  if (!meta || !show.checked) return;
+  const w = canvas.width, h = canvas.height;
+  const target = meta.target || {};
+  ctx.font = "14px sans-serif";
+  for (const [x1, y1, x2, y2, id, label] of (meta.dets || [])) {
+    const hot = target.id !== undefined && id === target.id;
+    ctx.strokeStyle = ctx.fillStyle = hot ? "#0f0" : "#ccc";
+    ctx.lineWidth = hot ? 3 : 1;
+    ctx.strokeRect(x1 * w, y1 * h, (x2 - x1) * w, (y2 - y1) * h);
+    const text = id >= 0 ? "ID " + id : (label === null ? "" : String(label));
+    ctx.fillText(text, x1 * w, Math.max(y1 * h - 6, 12));
+  }
+  const lines = [];
+  if (meta.ptz) lines.push(["pan", "tilt", "zoom", "focus"]
+      .filter(k => k in meta.ptz).map(k => k + " " + meta.ptz[k]).join("  "));
+  if (meta.target) lines.push("target " + (meta.target.id ?? "-") + " " + (meta.target.state || ""));
+  if (meta.hud) lines.push(meta.hud);
+  ctx.fillStyle = "#ffc832";
+  lines.forEach((line, i) => ctx.fillText(line, 10, 22 + 20 * i));
+}
+
+// MJPEG in an <img> exposes no per-frame hook, so the newest record is
+// drawn; the seq shown below lets you check they stay in step.
+const events = new EventSource("/meta");
+events.onmessage = e => {
+  meta = JSON.parse(e.data);
+  info.textContent = "seq " + meta.seq;
+  requestAnimationFrame(draw);
+};
+window.addEventListener("resize", () => requestAnimationFrame(draw));
+</script>
+</body></html>
+"""
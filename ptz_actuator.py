@@ -0,0 +1,244 @@
+# ptz_actuator.py
+# ------------------------------------------------------------
+# One thread owns the Focuser; everyone else posts requests and returns
+# immediately.
+# - Moves are setpoints: relative steps add onto the latest target, and
+#   requests arriving while a move is in flight merge into one move.
+# - Other work (IR-CUT, mode, autofocus...) runs as queued jobs and
+#   returns a Future.
+# - Velocity mode (set_velocity) turns rates into small setpoint steps on
+#   the actuator thread until the rates are zeroed or the hold expires.
+# - status() is served from cached state and never touches the bus.
+# ------------------------------------------------------------
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from B016712MP.Focuser import Focuser
+
+AXES = {
+    "pan": Focuser.OPT_MOTOR_X,
+    "tilt": Focuser.OPT_MOTOR_Y,
+    "zoom": Focuser.OPT_ZOOM,
+    "focus": Focuser.OPT_FOCUS,
+}
+
+
+def clamp_axis(axis, value):
+    info = Focuser.opts[AXES[axis]]
+    return int(max(info["MIN_VALUE"], min(info["MAX_VALUE"], value)))
+
+
+VELOCITY_TICK_S = 0.04
+
+
+class PTZActuator:
+    def __init__(self, focuser, position=None):
+        self.focuser = focuser
+        # Last completed position (what the motors were told and finished).
+        self.position = {"pan": 90, "tilt": 90, "zoom": 0, "focus": 0}
+        if position:
+            self.position.update(position)
+        # Latest requested target per axis (position + anything pending).
+        self.target = dict(self.position)
+
+        self._cond = threading.Condition()
+        self._pending = {}          # axis -> absolute target not yet sent
+        self._jobs = deque()        # (fn, future, name)
+        self._listeners = []
+        self.busy = False
+        self.job_name = None
+
+        self.velocity = {}          # axis -> units per second
+        self._vel_until = 0.0
+        self._vel_last = 0.0
+        self._vel_accum = {}
+
+        self.requests = 0
+        self.moves = 0
+        self.merged = 0
+        self.last_move_s = 0.0
+
+        self.running = False
+        self._thread = None
+
+    # ============================================================
+    # Lifecycle
+    # ============================================================
+    def start(self):
+        if self.running:
+            return self
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="ptz-actuator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+    def add_listener(self, fn):
+        """fn(status) is called on the actuator thread after every move.
+
+        status is status() plus "moved" (axes the move included, sent or
+        failed) and "move_started" (time.monotonic() when it began).
+        """
+        self._listeners.append(fn)
+
+    # ============================================================
+    # Requests (non-blocking)
+    # ============================================================
+    def move_to(self, **targets):
+        """Set absolute targets, e.g. move_to(pan=90, tilt=25)."""
+        with self._cond:
+            for axis, value in targets.items():
+                self._set_target(axis, value)
+            self._cond.notify()
+            return dict(self.target)
+
+    def move_by(self, **deltas):
+        """Relative steps on top of the latest target, e.g. move_by(pan=5)."""
+        with self._cond:
+            for axis, delta in deltas.items():
+                self._set_target(axis, self.target[axis] + delta)
+            self._cond.notify()
+            return dict(self.target)
+
+    def _set_target(self, axis, value):
+        value = clamp_axis(axis, value)
+        self.requests += 1
+        if axis in self._pending:
+            self.merged += 1
+        self.target[axis] = value
+        self._pending[axis] = value
+
+    def set_velocity(self, hold_s=0.5, **rates):
+        """Move continuously, e.g. set_velocity(pan=30) (units/s).
+
+        Rates replace the previous ones and stay active for `hold_s`; call
+        again to keep moving, or with all rates 0 to stop.
+        """
+        with self._cond:
+            now = time.monotonic()
+            if not self.velocity:
+                self._vel_last = now
+                self._vel_accum = {}
+            self.velocity = {axis: float(rate) for axis, rate in rates.items() if rate}
+            self._vel_until = now + hold_s
+            self._cond.notify()
+            return dict(self.target)
+
+    def submit(self, fn, name=None):
+        """Run fn(focuser) on the actuator thread; returns a Future."""
+        future = Future()
+        with self._cond:
+            self._jobs.append((fn, future, name or getattr(fn, "__name__", "job")))
+            self._cond.notify()
+        return future
+
+    def set_option(self, opt, value):
+        return self.submit(lambda focuser: focuser.set(opt, value), name="set_option")
+
+    def record_position(self, **values):
+        """For jobs that drive motors themselves (e.g. autofocus)."""
+        with self._cond:
+            self.position.update(values)
+            self.target.update(values)
+
+    def status(self):
+        with self._cond:
+            return {
+                "position": dict(self.position),
+                "target": dict(self.target),
+                "busy": self.busy or bool(self._pending),
+                "job": self.job_name,
+                "requests": self.requests,
+                "moves": self.moves,
+                "merged": self.merged,
+                "velocity": dict(self.velocity),
+                "last_move_ms": round(self.last_move_s * 1000.0, 1),
+            }
+
+    # ============================================================
+    # Actuator thread
+    # ============================================================
+    def _run(self):
+        while True:
+            with self._cond:
+                while self.running and not self._pending and not self._jobs:
+                    if not self.velocity:
+                        self._cond.wait()
+                        continue
+                    self._apply_velocity()
+                    if not self._pending:
+                        self._cond.wait(VELOCITY_TICK_S)
+                if not self.running:
+                    return
+                if self._jobs:
+                    fn, future, name = self._jobs.popleft()
+                    pending = None
+                else:
+                    pending, self._pending = self._pending, {}
+                self.busy = True
+                self.job_name = None if pending else name
+
+            if pending is None:
+                self._run_job(fn, future)
+            else:
+                self._move(pending)
+
+            with self._cond:
+                self.busy = False
+                self.job_name = None
+
+    def _apply_velocity(self):
+        # Called with the lock held. Time spent in the last move counts, so
+        # the speed stays right even when the bus is the bottleneck.
+        now = time.monotonic()
+        if now >= self._vel_until:
+            self.velocity = {}
+            return
+        dt, self._vel_last = now - self._vel_last, now
+        for axis, rate in self.velocity.items():
+            acc = self._vel_accum.get(axis, 0.0) + rate * dt
+            step = int(acc)
+            self._vel_accum[axis] = acc - step
+            if step:
+                value = clamp_axis(axis, self.target[axis] + step)
+                self.target[axis] = value
+                self._pending[axis] = value
+
+    def _run_job(self, fn, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(self.focuser))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _move(self, pending):
+        t0 = time.monotonic()
+        for axis, value in pending.items():
+            try:
+                self.focuser.set(AXES[axis], value)
+            except Exception as e:
+                print(f"[PTZ] {axis} -> {value} failed: {e}")
+                continue
+            with self._cond:
+                self.position[axis] = value
+        self.last_move_s = time.monotonic() - t0
+        self.moves += 1
+
+        status = self.status()
+        status["moved"] = list(pending)
+        status["move_started"] = t0
+        for fn in self._listeners:
+            try:
+                fn(status)
+            except Exception as e:
+                print(f"[PTZ] listener failed: {e}")
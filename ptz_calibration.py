@@ -0,0 +1,260 @@
+# ptz_calibration.py
+# ------------------------------------------------------------
+# Pixel <-> degree calibration of the PTZ camera, per zoom level.
+#
+# For every zoom level in ZOOM_LEVELS the camera makes a known pan move
+# and a known tilt move (out and back). The image shift each move causes is
+# measured by phase correlation (cv2.phaseCorrelate) of the frames before
+# and after. The result, pixels per motor degree with sign, goes to a JSON
+# lookup table:
+#
+#   python ptz_calibration.py                 # on the Pi
+#   python ptz_calibration.py --simulate      # SimulatedBus + rendered scene
+#
+# CalibrationTable loads it, interpolates between zoom levels and plugs
+# into ptz_controller.PTZController (field of view, axis signs), so one
+# correction move lands on the target instead of converging over several.
+# ------------------------------------------------------------
+
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+# ====================== USER CONFIG =========================
+CALIBRATION_FILE = "ptz_calibration.json"
+ZOOM_LEVELS = (0, 500, 1000, 1500, 2100)
+STEP_FRACTION = 0.15     # test move = this share of the (modelled) field of view
+SETTLE_FRAMES = 3        # frames dropped after a move before grabbing
+MIN_RESPONSE = 0.05      # weaker phase-correlation peaks are re-measured, then dropped
+MIN_PX_PER_DEG = 0.5     # smaller |px/deg| is not a real measurement (no shift seen)
+RETRIES = 2              # extra attempts per zoom level before it is dropped
+CALIBRATED_KP = 1.0      # controller gain once the geometry is measured
+# ===========================================================
+
+
+# ============================================================
+# Measurement
+# ============================================================
+def _gray(frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return np.float32(gray)
+
+
+def measure_shift(before, after):
+    """(dx, dy, response): how far the scene moved in the image, in pixels."""
+    a, b = _gray(before), _gray(after)
+    window = cv2.createHanningWindow(a.shape[::-1], cv2.CV_32F)
+    (dx, dy), response = cv2.phaseCorrelate(a, b, window)
+    return dx, dy, response
+
+
+def grab(camera, skip=SETTLE_FRAMES):
+    for _ in range(skip):
+        camera.capture_array()
+    return camera.capture_array()
+
+
+def wait_idle(actuator, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while actuator.status()["busy"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def calibrate_axis(actuator, camera, axis, step):
+    """Signed pixels per degree for `axis`, averaged over an out-and-back move."""
+    column = 0 if axis == "pan" else 1
+    wait_idle(actuator)
+    a = grab(camera)
+    actuator.move_by(**{axis: step})
+    wait_idle(actuator)
+    b = grab(camera)
+    actuator.move_by(**{axis: -step})
+    wait_idle(actuator)
+    c = grab(camera)
+
+    out, back = measure_shift(a, b), measure_shift(b, c)
+    px_per_deg = (out[column] - back[column]) / 2.0 / step
+    return px_per_deg, min(out[2], back[2])
+
+
+def calibrate(actuator, camera, zooms=ZOOM_LEVELS, fov=None):
+    """Measure every zoom level; returns the table as a dict."""
+    from ptz_controller import fov_at_zoom
+    fov = fov or fov_at_zoom
+    frame = grab(camera, 0)
+    h, w = frame.shape[:2]
+    entries = []
+    for zoom in zooms:
+        actuator.move_to(zoom=zoom)
+        wait_idle(actuator)
+        hfov, vfov = fov(zoom)
+        pan_step = max(1, int(round(STEP_FRACTION * hfov)))
+        tilt_step = max(1, int(round(STEP_FRACTION * vfov)))
+        for attempt in range(1 + RETRIES):
+            pan_ppd, pan_resp = calibrate_axis(actuator, camera, "pan", pan_step)
+            tilt_ppd, tilt_resp = calibrate_axis(actuator, camera, "tilt", tilt_step)
+            entry = {"zoom": zoom, "pan_px_per_deg": round(pan_ppd, 3), "tilt_px_per_deg": round(tilt_ppd, 3),
+                     "pan_step": pan_step, "tilt_step": tilt_step,
+                     "response": round(min(pan_resp, tilt_resp), 3)}
+            ok = valid_entry(entry)
+            flag = "" if ok else "  [WARN] weak correlation or no shift, low texture?"
+            print(f"[INFO] zoom {zoom:4d}: pan {pan_ppd:7.2f} px/deg (hfov {w / max(abs(pan_ppd), 1e-6):5.1f}) "
+                  f"tilt {tilt_ppd:7.2f} px/deg (vfov {h / max(abs(tilt_ppd), 1e-6):5.1f}) "
+                  f"response {entry['response']:.2f}{flag}")
+            if ok:
+                entries.append(entry)
+                break
+        else:
+            print(f"[WARN] zoom {zoom:4d}: dropped after {1 + RETRIES} attempts")
+    if not entries:
+        raise RuntimeError("no zoom level gave a usable measurement; nothing to save")
+    return {"frame_size": [w, h], "created": time.strftime("%Y-%m-%d %H:%M:%S"), "entries": entries}
+
+
+def valid_entry(entry):
+    """Strong enough correlation and a real shift on both axes."""
+    return (entry["response"] >= MIN_RESPONSE
+            and abs(entry["pan_px_per_deg"]) >= MIN_PX_PER_DEG
+            and abs(entry["tilt_px_per_deg"]) >= MIN_PX_PER_DEG)
+
+
+# ============================================================
+# Lookup table
+# ============================================================
+class CalibrationTable:
+    def __init__(self, data):
+        self.data = data
+        self.w, self.h = data["frame_size"]
+        entries = sorted(data["entries"], key=lambda e: e["zoom"])
+        if not entries:
+            raise ValueError("calibration table has no entries")
+        for e in entries:
+            # fov() divides by these; zero or tiny would mean an infinite or
+            # absurd field of view and wild setpoints.
+            if abs(e["pan_px_per_deg"]) < MIN_PX_PER_DEG or abs(e["tilt_px_per_deg"]) < MIN_PX_PER_DEG:
+                raise ValueError(f"calibration entry for zoom {e['zoom']} has no usable px/deg")
+        self.zooms = np.array([e["zoom"] for e in entries], dtype=np.float64)
+        self.pan_ppd = np.array([e["pan_px_per_deg"] for e in entries], dtype=np.float64)
+        self.tilt_ppd = np.array([e["tilt_px_per_deg"] for e in entries], dtype=np.float64)
+        # Panning towards +pan moves the scene the other way in the image.
+        self.pan_sign = -1 if np.median(self.pan_ppd) > 0 else 1
+        self.tilt_sign = -1 if np.median(self.tilt_ppd) > 0 else 1
+
+    @classmethod
+    def load(cls, path=CALIBRATION_FILE):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path=CALIBRATION_FILE):
+        with open(path, "w") as f:
+            json.dump(self.data, f, indent=2)
+
+    def px_per_deg(self, zoom):
+        """(pan, tilt) pixels per degree at `zoom`, at the calibration frame size."""
+        return (abs(float(np.interp(zoom, self.zooms, self.pan_ppd))),
+                abs(float(np.interp(zoom, self.zooms, self.tilt_ppd))))
+
+    def fov(self, zoom):
+        """(hfov, vfov) degrees covered by the full frame; resolution independent."""
+        pan_ppd, tilt_ppd = self.px_per_deg(zoom)
+        return self.w / pan_ppd, self.h / tilt_ppd
+
+    def offset_to_degrees(self, nx, ny, zoom):
+        """Pan/tilt move that centres a point at normalized offset (nx, ny) from centre."""
+        hfov, vfov = self.fov(zoom)
+        return self.pan_sign * nx * hfov, self.tilt_sign * ny * vfov
+
+    def apply(self, controller):
+        """Use the measured geometry (and a full-step gain) in a PTZController."""
+        controller.fov = self.fov
+        controller.pan_sign = self.pan_sign
+        controller.tilt_sign = self.tilt_sign
+        controller.kp_wide = controller.kp_tele = CALIBRATED_KP
+        return controller
+
+
+# ============================================================
+# Simulation
+# ============================================================
+class PanoramaCamera:
+    """Renders a textured world seen by the simulated PTZ head.
+
+    The view follows the SimulatedBus motor positions; its true field of
+    view is fov_scale times ptz_controller's model, so calibration has
+    something to find.
+    """
+
+    def __init__(self, bus, size=(640, 360), fov_scale=0.8, px_per_world_deg=16, seed=0):
+        from ptz_controller import fov_at_zoom
+        self.bus = bus
+        self.w, self.h = size
+        self.fov = lambda zoom: tuple(f * fov_scale for f in fov_at_zoom(zoom))
+        self.res = px_per_world_deg
+        rng = np.random.default_rng(seed)
+        side = 200 * px_per_world_deg
+        noise = rng.random((side // 8, side // 8), dtype=np.float32)
+        world = cv2.resize(noise, (side, side), interpolation=cv2.INTER_CUBIC)
+        world += 0.5 * cv2.resize(rng.random((side // 2, side // 2), dtype=np.float32), (side, side))
+        self.world = cv2.normalize(world, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+
+    def capture_array(self):
+        time.sleep(1 / 30.0)
+        pan, tilt, zoom = self.bus.position(0x05), self.bus.position(0x06), self.bus.position(0x01)
+        hfov, vfov = self.fov(zoom)
+        centre = ((pan + 10) * self.res, (190 - tilt) * self.res)     # +tilt looks up
+        patch = cv2.getRectSubPix(self.world, (int(hfov * self.res), int(vfov * self.res)), centre)
+        view = cv2.resize(patch, (self.w, self.h), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(view, cv2.COLOR_GRAY2BGR)
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# ============================================================
+# Main
+# ============================================================
+def main():
+    from B016712MP.Focuser import Focuser
+    from ptz_actuator import PTZActuator
+
+    parser = argparse.ArgumentParser(description="Measure pixels per pan/tilt degree at each zoom level")
+    parser.add_argument("--simulate", action="store_true", help="SimulatedBus + rendered panorama")
+    parser.add_argument("--zoom", type=int, nargs="+", default=list(ZOOM_LEVELS))
+    parser.add_argument("--out", default=CALIBRATION_FILE)
+    parser.add_argument("--pan", type=int, default=90, help="pan position to calibrate at")
+    parser.add_argument("--tilt", type=int, default=60, help="tilt position to calibrate at")
+    args = parser.parse_args()
+
+    if args.simulate:
+        from B016712MP.SimulatedBus import SimulatedBus
+        bus = SimulatedBus()
+        focuser = Focuser(bus)
+        camera = PanoramaCamera(bus)
+    else:
+        from orientation import Orientation
+        from ptz_stream_server import open_picamera
+        focuser = Focuser(1)
+        camera = open_picamera(Orientation("none"))
+
+    actuator = PTZActuator(focuser).start()
+    try:
+        actuator.move_to(pan=args.pan, tilt=args.tilt)
+        data = calibrate(actuator, camera, args.zoom)
+        CalibrationTable(data).save(args.out)
+        print(f"[OK] Calibration written to {args.out}")
+    except (RuntimeError, ValueError) as e:
+        print(f"[ERROR] Calibration not saved: {e}")
+    finally:
+        actuator.stop()
+        camera.stop()
+        camera.close()
+
+
+if __name__ == "__main__":
+    main()
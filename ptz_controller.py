@@ -0,0 +1,250 @@
+# ptz_controller.py
+# ------------------------------------------------------------
+# Closed-loop pan/tilt tracking.
+#
+# PTZController turns the target's normalized box centre (0..1, 0.5 =
+# image centre) into absolute pan/tilt setpoints:
+# - error -> angle: the centre error times the field of view at the current
+#   zoom gives the target's direction relative to where the camera pointed
+#   at capture time; plus the camera angle = target angle in PTZ degrees.
+# - an alpha-beta filter per axis smooths that angle and estimates the
+#   target's angular velocity,
+# - the setpoint leads the target by the measured detection -> motor-done
+#   latency, and the correction is scaled by a zoom-dependent gain (narrow
+#   field of view = smaller steps).
+#
+# TargetFollower runs a controller on its own thread for a PTZActuator:
+# the detector posts observations and returns, the follower sends only the
+# newest setpoint and measures actuation latency (fed back as the lead).
+# ------------------------------------------------------------
+
+import threading
+import time
+from collections import deque
+
+from ptz_actuator import clamp_axis
+
+# ====================== USER CONFIG =========================
+HFOV_DEG = 62.0          # horizontal field of view at zoom 0
+VFOV_DEG = 37.0          # vertical field of view at zoom 0
+ZOOM_MAX = 2100          # Focuser OPT_ZOOM range
+ZOOM_MAX_RATIO = 3.0     # focal length at ZOOM_MAX / at zoom 0
+PAN_SIGN = 1             # +1: target right of centre -> pan value increases
+TILT_SIGN = -1           # -1: target below centre -> tilt value decreases
+# ===========================================================
+
+
+def fov_at_zoom(zoom):
+    """(hfov, vfov) in degrees, assuming focal length linear in zoom steps."""
+    ratio = 1.0 + (ZOOM_MAX_RATIO - 1.0) * max(0, min(ZOOM_MAX, zoom)) / ZOOM_MAX
+    return HFOV_DEG / ratio, VFOV_DEG / ratio
+
+
+class AlphaBeta:
+    """Position/velocity tracker for one axis (units, units per second)."""
+
+    def __init__(self, alpha=0.6, beta=0.15, max_gap_s=1.0):
+        self.alpha = alpha
+        self.beta = beta
+        self.max_gap_s = max_gap_s
+        self.reset()
+
+    def reset(self):
+        self.pos = None
+        self.vel = 0.0
+        self.t = None
+
+    def update(self, measured, t):
+        if self.pos is None or t - self.t > self.max_gap_s:
+            self.pos, self.vel, self.t = measured, 0.0, t
+            return self.pos, self.vel
+        dt = t - self.t
+        if dt <= 0:
+            return self.pos, self.vel
+        predicted = self.pos + self.vel * dt
+        residual = measured - predicted
+        self.pos = predicted + self.alpha * residual
+        self.vel += self.beta * residual / dt
+        self.t = t
+        return self.pos, self.vel
+
+    def predict(self, t):
+        return None if self.pos is None else self.pos + self.vel * (t - self.t)
+
+
+class PTZController:
+    def __init__(self, fov=fov_at_zoom, alpha=0.6, beta=0.15, kp_wide=0.9, kp_tele=0.6,
+                 deadzone=0.03, min_step=1, max_lead_s=0.5, latency_s=0.15):
+        self.fov = fov                  # zoom -> (hfov, vfov); ptz_calibration can replace it
+        self.pan_sign = PAN_SIGN
+        self.tilt_sign = TILT_SIGN
+        self.kp_wide = kp_wide
+        self.kp_tele = kp_tele
+        self.deadzone = deadzone        # normalized error that is left alone
+        self.min_step = min_step        # smallest move worth sending (motor units)
+        self.max_lead_s = max_lead_s
+        self.latency_s = latency_s      # detection -> motor done, EWMA
+        self.axes = {"pan": AlphaBeta(alpha, beta), "tilt": AlphaBeta(alpha, beta)}
+
+    def reset(self):
+        for f in self.axes.values():
+            f.reset()
+
+    def gain(self, zoom):
+        k = max(0, min(ZOOM_MAX, zoom)) / ZOOM_MAX
+        return self.kp_wide + (self.kp_tele - self.kp_wide) * k
+
+    def observe_latency(self, seconds):
+        self.latency_s += 0.2 * (seconds - self.latency_s)
+
+    def update(self, cx, cy, t, camera):
+        """Setpoints {axis: value} for a detection at time t, or {} to stay.
+
+        camera: {"pan", "tilt", "zoom"} where the camera pointed at capture.
+        """
+        hfov, vfov = self.fov(camera.get("zoom", 0))
+        errors = {"pan": cx - 0.5, "tilt": cy - 0.5}
+        degrees = {"pan": self.pan_sign * errors["pan"] * hfov, "tilt": self.tilt_sign * errors["tilt"] * vfov}
+        kp = self.gain(camera.get("zoom", 0))
+        lead = min(self.latency_s, self.max_lead_s)
+
+        setpoints = {}
+        for axis, f in self.axes.items():
+            angle, velocity = f.update(camera[axis] + degrees[axis], t)
+            moving = abs(velocity) * lead >= self.min_step
+            if abs(errors[axis]) < self.deadzone and not moving:
+                continue
+            aim = angle + velocity * lead
+            value = clamp_axis(axis, camera[axis] + kp * (aim - camera[axis]))
+            if abs(value - camera[axis]) >= self.min_step:
+                setpoints[axis] = value
+        return setpoints
+
+
+class TargetFollower:
+    """
+    Posts go to the newest-observation slot and return at once. A thread
+    running at rate_hz feeds the newest observation to the controller and
+    hands the setpoints to the actuator, which merges anything that arrives
+    while a move is in flight.
+    """
+
+    def __init__(self, actuator, controller=None, rate_hz=10, max_age_s=0.5, stats_every_s=5.0,
+                 inflight_timeout_s=2.0):
+        self.actuator = actuator
+        self.controller = controller or PTZController()
+        self.period = 1.0 / rate_hz
+        self.max_age_s = max_age_s
+        self.stats_every_s = stats_every_s
+        self.inflight_timeout_s = inflight_timeout_s
+        self._lock = threading.Lock()
+        self._obs = None            # (cx, cy, t_capture), newest only
+        self._inflight = None       # (setpoints, t_capture, t_sent) of the last command
+        self._settled_at = 0.0      # when the motors last finished a commanded move
+        self.posted = 0
+        self.overwritten = 0
+        self.discarded = 0
+        self.commands = 0
+        self.timeouts = 0
+        self.cmd_latency = deque(maxlen=200)    # capture -> setpoint posted
+        self.move_latency = deque(maxlen=200)   # capture -> motors finished
+        self.running = False
+        self._thread = None
+        actuator.add_listener(self._on_moved)
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="ptz-follower", daemon=True)
+        self._thread.start()
+        return self
+
+    def post(self, cx, cy, t_capture=None):
+        """Target box centre, normalized (0.5, 0.5 = image centre)."""
+        with self._lock:
+            if self._obs is not None:
+                self.overwritten += 1
+            self._obs = (cx, cy, time.monotonic() if t_capture is None else t_capture)
+            self.posted += 1
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def _run(self):
+        next_stats = time.monotonic() + self.stats_every_s
+        while self.running:
+            time.sleep(self.period)
+            with self._lock:
+                obs, self._obs = self._obs, None
+            inflight = self._inflight
+            if inflight is not None and time.monotonic() - inflight[2] > self.inflight_timeout_s:
+                # The move never reported back (e.g. the actuator thread is
+                # stuck on the bus): do not stop tracking for good.
+                self._inflight = None
+                self._settled_at = time.monotonic()
+                self.timeouts += 1
+            if obs is None or time.monotonic() - obs[2] > self.max_age_s:
+                pass
+            elif self._inflight is not None or obs[2] < self._settled_at:
+                # Captured while the camera was moving: its pointing is not
+                # known, which would read as target motion.
+                self.discarded += 1
+            else:
+                self._command(*obs)
+            if self.stats_every_s and time.monotonic() >= next_stats:
+                next_stats += self.stats_every_s
+                print(self.summary())
+
+    def _command(self, cx, cy, t_capture):
+        # Last completed position: where the camera pointed, up to one move.
+        camera = dict(self.actuator.position)
+        setpoints = self.controller.update(cx, cy, t_capture, camera)
+        if not setpoints:
+            return
+        self._inflight = (setpoints, t_capture, time.monotonic())
+        self.actuator.move_to(**setpoints)
+        self.commands += 1
+        self.cmd_latency.append(time.monotonic() - t_capture)
+
+    def _on_moved(self, status):
+        # Actuator thread, after every move.
+        inflight = self._inflight
+        if inflight is None:
+            return
+        setpoints, t_capture, t_sent = inflight
+        # The first move started after the command that includes its axes
+        # carried it. The position may still differ: a failed write, or
+        # another client's target merged in. Either way it is done.
+        if status["move_started"] >= t_sent and any(axis in setpoints for axis in status["moved"]):
+            self._inflight = None
+            self._settled_at = time.monotonic()
+            latency = self._settled_at - t_capture
+            self.move_latency.append(latency)
+            self.controller.observe_latency(latency)
+
+    def metrics(self):
+        """Counters and latency percentiles (ms) as a flat dict, e.g. for telemetry."""
+        def ms(values, q):
+            values = sorted(values)
+            return round(values[min(len(values) - 1, int(q * len(values)))] * 1000.0, 1) if values else 0.0
+        return {"ptz_posted": self.posted, "ptz_overwritten": self.overwritten,
+                "ptz_discarded": self.discarded, "ptz_commands": self.commands,
+                "ptz_timeouts": self.timeouts,
+                "ptz_merged": self.actuator.merged,
+                "ptz_cmd_p50_ms": ms(self.cmd_latency, 0.5),
+                "ptz_moved_p50_ms": ms(self.move_latency, 0.5),
+                "ptz_moved_p95_ms": ms(self.move_latency, 0.95),
+                "ptz_lead_ms": round(self.controller.latency_s * 1000.0, 1),
+                "ptz_bus_ms": round(self.actuator.last_move_s * 1000.0, 1)}
+
+    def summary(self):
+        m = self.metrics()
+        return (f"[STATS] ptz posted={m['ptz_posted']} overwritten={m['ptz_overwritten']} "
+                f"discarded={m['ptz_discarded']} commands={m['ptz_commands']} merged={m['ptz_merged']} "
+                f"timeouts={m['ptz_timeouts']} | "
+                f"capture->cmd p50 {m['ptz_cmd_p50_ms']:.0f}ms | "
+                f"capture->moved p50 {m['ptz_moved_p50_ms']:.0f}ms "
+                f"p95 {m['ptz_moved_p95_ms']:.0f}ms | "
+                f"lead {m['ptz_lead_ms']:.0f}ms | "
+                f"bus {m['ptz_bus_ms']:.0f}ms")
@@ -0,0 +1,234 @@
+# ptz_rest_server.py
+# ------------------------------------------------------------
+# HTTP control API on port 5005 for tz_client_arducam_gui.py.
+#
+#   POST /center               pan/tilt to CENTER
+#   POST /mode                 toggle motor mode (OPT_MODE)
+#   POST /ircut                toggle IR-CUT
+#   POST /autofocus            start an AF scan (background job)
+#   GET  /autofocus            AF state + progress
+#   POST /focus?step=n         relative focus
+#   POST /zoom?step=n          relative zoom
+#   POST /step?dx=n&dy=n       relative pan/tilt
+#   GET  /status               cached position, target, modes, AF progress
+#
+# Every handler only posts to the PTZActuator and returns, so none of them
+# waits for the motors (waitingForFree runs on the actuator thread).
+# Steps arriving while a move is in flight merge into one move. The
+# server speaks HTTP/1.1 keep-alive so pooled clients reuse connections.
+#
+# Local test without a Pi:
+#   python ptz_rest_server.py --simulate
+# ------------------------------------------------------------
+
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from B016712MP.Focuser import Focuser
+from B016712MP.AutoFocus import AutoFocus
+from ptz_actuator import PTZActuator
+
+# ====================== USER CONFIG =========================
+PORT   = 5005
+CENTER = {"pan": 90, "tilt": 25}
+# ===========================================================
+
+
+class PTZRestService:
+    """Route logic, independent of the HTTP layer. get_frame feeds autofocus."""
+
+    def __init__(self, actuator, get_frame=None, mode=1, ircut=0):
+        self.actuator = actuator
+        self.get_frame = get_frame
+        self.mode = mode
+        self.ircut = ircut
+        self._lock = threading.Lock()
+        self._af = None             # AutoFocus of the current/last scan
+        self._af_job = None         # its Future
+        self._af_started = None
+
+    # --- motion (never blocks) ---------------------------------
+    def center(self, params):
+        return {"target": self.actuator.move_to(**CENTER)}
+
+    def step(self, params):
+        return {"target": self.actuator.move_by(pan=_int(params, "dx"), tilt=_int(params, "dy"))}
+
+    def focus(self, params):
+        return {"target": self.actuator.move_by(focus=_int(params, "step"))}
+
+    def zoom(self, params):
+        return {"target": self.actuator.move_by(zoom=_int(params, "step"))}
+
+    # --- options -----------------------------------------------
+    def toggle_mode(self, params):
+        with self._lock:
+            self.mode = 1 - self.mode
+            self.actuator.set_option(Focuser.OPT_MODE, self.mode)
+            return {"mode": self.mode}
+
+    def toggle_ircut(self, params):
+        with self._lock:
+            self.ircut = 1 - self.ircut
+            self.actuator.set_option(Focuser.OPT_IRCUT, self.ircut)
+            return {"ircut": self.ircut}
+
+    # --- autofocus ---------------------------------------------
+    def start_autofocus(self, params):
+        if self.get_frame is None:
+            return 503, {"error": "no camera for autofocus"}
+        with self._lock:
+            if self._af_job is not None and not self._af_job.done():
+                return 409, self.autofocus_state()
+            self._af_started = time.time()
+            self._af = None
+            self._af_job = self.actuator.submit(self._run_autofocus, name="autofocus")
+            return 202, self.autofocus_state()
+
+    def _run_autofocus(self, focuser):
+        af = AutoFocus(focuser)
+        self._af = af
+        best_pos, best_score = af.runFocus(self.get_frame)
+        self.actuator.record_position(focus=best_pos)
+        return {"focus": best_pos, "score": round(float(best_score), 2)}
+
+    def autofocus_state(self, params=None):
+        job, af = self._af_job, self._af
+        if job is None:
+            return {"state": "idle"}
+        state = {"started": self._af_started}
+        if not job.done():
+            state.update(state="running" if af is not None else "queued",
+                         progress=round(af.progress(), 3) if af is not None else 0.0)
+        elif job.exception() is not None:
+            state.update(state="failed", error=str(job.exception()))
+        else:
+            state.update(state="done", progress=1.0, result=job.result())
+        return state
+
+    # --- status (cached) ---------------------------------------
+    def status(self, params=None):
+        status = self.actuator.status()
+        status.update(mode=self.mode, ircut=self.ircut, autofocus=self.autofocus_state())
+        return status
+
+
+def _int(params, name, default=0):
+    return int(params.get(name, default))
+
+
+ROUTES = {
+    ("POST", "/center"): "center",
+    ("POST", "/mode"): "toggle_mode",
+    ("POST", "/ircut"): "toggle_ircut",
+    ("POST", "/autofocus"): "start_autofocus",
+    ("GET", "/autofocus"): "autofocus_state",
+    ("POST", "/focus"): "focus",
+    ("POST", "/zoom"): "zoom",
+    ("POST", "/step"): "step",
+    ("GET", "/status"): "status",
+}
+
+
+class PTZRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"       # keep-alive
+    disable_nagle_algorithm = True      # headers and body go out as separate writes
+    service = None                      # set by make_server()
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        route = ROUTES.get((method, url.path))
+        if route is None:
+            known = any(path == url.path for _, path in ROUTES)
+            self._reply(405 if known else 404, {"error": f"no route {method} {url.path}"})
+            return
+        try:
+            result = getattr(self.service, route)(params)
+        except ValueError as e:
+            self._reply(400, {"error": str(e)})
+            return
+        status, body = result if isinstance(result, tuple) else (200, result)
+        self._reply(status, body)
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        # Query-string API; drain any body so keep-alive stays in sync.
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self._dispatch("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(service, host="0.0.0.0", port=PORT):
+    handler = type("BoundPTZRequestHandler", (PTZRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+# ============================================================
+# Main
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="PTZ REST server for tz_client_arducam_gui")
+    parser.add_argument("--simulate", action="store_true", help="simulated I2C bus + synthetic frames")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--no-camera", action="store_true", help="no frames: /autofocus returns 503")
+    args = parser.parse_args()
+
+    if args.simulate:
+        from B016712MP.SimulatedBus import SimulatedBus
+        focuser = Focuser(SimulatedBus())
+    else:
+        focuser = Focuser(1)
+        focuser.set(Focuser.OPT_MODE, 1)
+        time.sleep(0.5)
+        focuser.set(Focuser.OPT_IRCUT, 0)
+
+    actuator = PTZActuator(focuser).start()
+    actuator.move_to(**CENTER)
+
+    camera = None
+    if not args.no_camera:
+        from orientation import Orientation
+        from ptz_stream_server import SyntheticCamera, open_picamera
+        # AF only needs a centre crop; orientation does not matter here.
+        camera = SyntheticCamera(actuator=actuator) if args.simulate else open_picamera(Orientation("none"))
+
+    service = PTZRestService(actuator, get_frame=camera.capture_array if camera else None)
+    server = make_server(service, args.host, args.port)
+    print(f"[INFO] PTZ REST API on :{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        actuator.stop()
+        if camera is not None:
+            camera.stop()
+            camera.close()
+        print("[OK] Stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+# ptz_stream_server.py
+# ------------------------------------------------------------
+# Pi-side server for mac_client.py.
+# - Video  (STREAM_PORT) : each frame is sent as a v2 header (sequence,
+#   capture/encode timestamps, PTZ state; see stream_protocol.py) + JPEG.
+#   Each frame is preceded by a metadata record (PTZ state, detections)
+#   with the same sequence number; clients draw the overlays, the frames
+#   stay clean. --legacy sends the old <L length + JPEG instead.
+#   Frames are encoded once (FrameBroadcaster) and shared by all clients;
+#   a slow client skips to the newest frame instead of queuing.
+# - Control (CONTROL_PORT): text lines
+#       move:dx:dy | zoom:n | focus:n | vel:dpan:dtilt | autofocus | quit
+#   optionally prefixed with a sequence number to get acks and position
+#   updates back (see control_protocol.py). Commands go to the PTZ actuator
+#   thread and return immediately, so a motor move never stalls a video
+#   socket. Replies go out through a per-client writer thread, so a client
+#   that stops reading never stalls the actuator either.
+#
+# Local test without a Pi:
+#   python ptz_stream_server.py --simulate
+#   (synthetic frames + SimulatedBus), then point mac_client at 127.0.0.1.
+# ------------------------------------------------------------
+
+import time
+import socket
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+from B016712MP.Focuser import Focuser
+from B016712MP.AutoFocus import AutoFocus
+from control_protocol import split_seq, format_reply, format_position, VELOCITY_HOLD_S
+from orientation import Orientation
+from ptz_actuator import PTZActuator
+from stream_broadcast import FrameBroadcaster
+from overlay_meta import build_meta, detection, encode_meta
+from stream_protocol import pack_v2, pack_legacy, KIND_META
+
+# ====================== USER CONFIG =========================
+STREAM_PORT  = 8000
+CONTROL_PORT = 5005
+FRAME_SIZE   = (640, 360)
+MAX_FPS      = 30
+ORIENTATION  = "rot90cw"
+HOME         = {"pan": 90, "tilt": 25}
+MAX_OUTBOUND = 256       # unsent reply lines before a control client is dropped
+# ===========================================================
+
+
+# ============================================================
+# Frame sources
+# ============================================================
+class SyntheticCamera:
+    """Stand-in for Picamera2: a moving test pattern with one "object".
+
+    `detections` holds the object's box for the last frame, standing in
+    for a detector's output.
+    """
+
+    def __init__(self, size=FRAME_SIZE, fps=MAX_FPS, actuator=None):
+        self.w, self.h = size
+        self.interval = 1.0 / fps
+        self.actuator = actuator
+        self.n = 0
+        self.detections = []
+        self.next_due = time.monotonic()
+        xs = np.linspace(0, 255, self.w, dtype=np.float32)
+        self.base = np.repeat(np.tile(xs, (self.h, 1))[:, :, None], 3, axis=2).astype(np.uint8)
+
+    def capture_array(self):
+        now = time.monotonic()
+        if self.next_due > now:
+            time.sleep(self.next_due - now)
+        self.next_due = max(self.next_due + self.interval, now)
+        self.n += 1
+
+        frame = np.roll(self.base, self.n * 4, axis=1)
+        x = int((self.n * 3) % self.w)
+        y = self.h // 2
+        cv2.circle(frame, (x, y), 20, (0, 0, 255), -1)
+        self.detections = [detection(x - 20, y - 20, x + 20, y + 20, self.w, self.h,
+                                     track_id=1, label="ball", conf=1.0)]
+        return frame
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def open_picamera(orientation, size=FRAME_SIZE):
+    from picamera2 import Picamera2
+
+    cam = Picamera2()
+    extra = {}
+    transform = orientation.camera_transform()
+    if transform is not None:
+        extra["transform"] = transform
+    cam.configure(cam.create_video_configuration(
+        main={"size": size, "format": "RGB888"}, **extra))
+    cam.start()
+    time.sleep(2)
+    return cam
+
+
+# ============================================================
+# Control replies
+# ============================================================
+class ControlWriter:
+    """Outbound lines of one control client, sent by its own thread.
+
+    put() never blocks, so the actuator thread (position pushes, done
+    replies) and the command loop only queue. An unsent position push is
+    replaced by the newer one; a client that lets MAX_OUTBOUND lines pile
+    up is disconnected.
+    """
+
+    def __init__(self, conn, name, max_lines=MAX_OUTBOUND):
+        self.conn = conn
+        self.name = name
+        self.max_lines = max_lines
+        self._cond = threading.Condition()
+        self._lines = deque()
+        self._position = None
+        self.closed = False
+        self.coalesced = 0
+        self._thread = threading.Thread(target=self._run, name=f"{name}-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, line, position=False):
+        """Queue one line; False if the client is gone."""
+        with self._cond:
+            if self.closed:
+                return False
+            if position:
+                if self._position is not None:
+                    self.coalesced += 1
+                self._position = line
+            elif len(self._lines) >= self.max_lines:
+                print(f"[WARN] {self.name} not reading, disconnecting")
+                self._close()
+                return False
+            else:
+                self._lines.append(line)
+            self._cond.notify()
+            return True
+
+    def close(self):
+        with self._cond:
+            self._close()
+
+    def _close(self):
+        # Lock held. Shutting the socket down also ends the client's reader.
+        if self.closed:
+            return
+        self.closed = True
+        self._cond.notify()
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._lines or self._position or self.closed)
+                if self.closed:
+                    return
+                batch = list(self._lines)
+                self._lines.clear()
+                if self._position is not None:
+                    batch.append(self._position)
+                    self._position = None
+            try:
+                self.conn.sendall(("\n".join(batch) + "\n").encode("utf-8"))
+            except OSError:
+                self.close()
+                return
+
+
+# ============================================================
+# Server
+# ============================================================
+class PTZStreamServer:
+    def __init__(self, camera, actuator, broadcaster, host="0.0.0.0",
+                 stream_port=STREAM_PORT, control_port=CONTROL_PORT, legacy=False):
+        self.camera = camera
+        self.actuator = actuator
+        self.broadcaster = broadcaster
+        self.host = host
+        self.stream_port = stream_port
+        self.control_port = control_port
+        self.legacy = legacy
+
+        self._frame_cond = threading.Condition()
+        self._frame = None
+        self._frame_count = 0
+        self._sockets = []
+        self._acked_clients = set()     # ControlWriters of acked-mode clients
+        self._acked_lock = threading.Lock()
+        self.running = False
+        actuator.add_listener(self._send_position)
+
+    def start(self):
+        self.running = True
+        self.broadcaster.start()
+        self.actuator.start()
+        self._spawn(self._capture_loop, "capture")
+        self._spawn(self._accept_loop, "stream-accept", self._listen(self.stream_port), self._stream_client)
+        self._spawn(self._accept_loop, "control-accept", self._listen(self.control_port), self._control_client)
+        print(f"[INFO] Video on :{self.stream_port}, control on :{self.control_port}")
+        return self
+
+    def stop(self):
+        self.running = False
+        for s in self._sockets:
+            try:
+                s.close()
+            except OSError:
+                pass
+        self.broadcaster.stop()
+        self.actuator.stop()
+
+    def _spawn(self, target, name, *args):
+        t = threading.Thread(target=target, name=name, args=args, daemon=True)
+        t.start()
+        return t
+
+    def _listen(self, port):
+        srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        srv.bind((self.host, port))
+        srv.listen(16)
+        self._sockets.append(srv)
+        return srv
+
+    def _accept_loop(self, srv, handler):
+        while self.running:
+            try:
+                conn, addr = srv.accept()
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._spawn(handler, f"client-{addr[0]}:{addr[1]}", conn, addr)
+
+    # --- frames ------------------------------------------------
+    def _capture_loop(self):
+        while self.running:
+            frame = self.camera.capture_array()
+            capture_ts = time.time()
+            with self._frame_cond:
+                self._frame = frame
+                self._frame_count += 1
+                self._frame_cond.notify_all()
+            meta = build_meta(ptz=self.actuator.position,
+                              dets=getattr(self.camera, "detections", None))
+            self.broadcaster.submit(frame, capture_ts=capture_ts, meta=meta)
+
+    def next_frame(self, timeout=1.0):
+        """Block until a frame newer than the current one is captured."""
+        with self._frame_cond:
+            seen = self._frame_count
+            self._frame_cond.wait_for(lambda: self._frame_count > seen, timeout)
+            return self._frame
+
+    # --- video clients -----------------------------------------
+    def _stream_client(self, conn, addr):
+        print(f"[INFO] Video client {addr} connected")
+        client = self.broadcaster.register(f"{addr[0]}:{addr[1]}")
+        try:
+            while self.running:
+                # The tier's fps cap: record_send() sets when the next frame is due.
+                delay = client.next_due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                seq, jpeg, info = self.broadcaster.wait_frame(client.last_seq, tier=client.tier)
+                if jpeg is None:
+                    continue
+                client.advance(seq, len(jpeg))
+                if self.legacy:
+                    header = pack_legacy(len(jpeg))
+                else:
+                    meta = info["meta"] or {}
+                    capture_ts = info["capture_ts"] or 0.0
+                    header = pack_v2(len(jpeg), seq, capture_ts, info["encode_ts"], ptz=meta.get("ptz"))
+                    if meta:
+                        record = encode_meta(meta)
+                        header = pack_v2(len(record), seq, capture_ts, info["encode_ts"],
+                                         ptz=meta.get("ptz"), kind=KIND_META) + record + header
+                started = time.monotonic()
+                conn.sendall(header + jpeg)
+                client.record_send(started, time.monotonic() - started)
+        except OSError:
+            pass
+        finally:
+            self.broadcaster.unregister(client)
+            conn.close()
+            print(f"[INFO] Video client {addr} left (sent {client.sent}, skipped {client.dropped})")
+
+    # --- control clients ---------------------------------------
+    def _control_client(self, conn, addr):
+        print(f"[INFO] Control client {addr} connected")
+        writer = ControlWriter(conn, f"control-{addr[0]}:{addr[1]}")
+        reply = writer.put
+
+        try:
+            with conn, conn.makefile("r", encoding="utf-8", newline="\n") as lines:
+                for line in lines:
+                    seq, line = split_seq(line.strip())
+                    if not line:
+                        continue
+                    if line == "quit":
+                        break
+                    if seq is None:
+                        try:
+                            self.handle_command(line)
+                        except (ValueError, KeyError, IndexError) as e:
+                            print(f"[WARN] Bad command {line!r} from {addr}: {e}")
+                        continue
+                    with self._acked_lock:
+                        self._acked_clients.add(writer)
+                    reply(self._execute(seq, line, reply))
+        except OSError:
+            pass
+        finally:
+            with self._acked_lock:
+                self._acked_clients.discard(writer)
+            writer.close()
+        print(f"[INFO] Control client {addr} left")
+
+    def _execute(self, seq, line, reply):
+        """Run one acked command and return its ack line."""
+        try:
+            result = self.handle_command(line)
+        except (ValueError, KeyError, IndexError) as e:
+            return format_reply("ack", seq, error=e)
+        if isinstance(result, Future):
+            result.add_done_callback(lambda f: self._send_done(reply, seq, f))
+            result = self.actuator.status()["target"]
+        return format_reply("ack", seq, result)
+
+    def _send_done(self, reply, seq, future):
+        # Actuator thread: only queues (ControlWriter.put).
+        error = future.exception()
+        if error is not None:
+            reply(format_reply("done", seq, error=error))
+        else:
+            reply(format_reply("done", seq, self.actuator.status()["position"]))
+
+    def _send_position(self, status):
+        """Actuator listener: queue the finished position for acked clients."""
+        line = format_position(status["position"])
+        with self._acked_lock:
+            clients = list(self._acked_clients)
+        for writer in clients:
+            writer.put(line, position=True)
+
+    def handle_command(self, line):
+        """Dispatch one control line; never blocks on the bus."""
+        parts = line.split(":")
+        cmd = parts[0]
+        if cmd == "move":
+            return self.actuator.move_by(pan=int(parts[1]), tilt=int(parts[2]))
+        if cmd == "zoom":
+            return self.actuator.move_by(zoom=int(parts[1]))
+        if cmd == "focus":
+            return self.actuator.move_by(focus=int(parts[1]))
+        if cmd == "vel":
+            rates = dict(zip(("pan", "tilt", "zoom", "focus"), (float(p) for p in parts[1:])))
+            return self.actuator.set_velocity(hold_s=VELOCITY_HOLD_S, **rates)
+        if cmd == "autofocus":
+            return self.actuator.submit(self._autofocus, name="autofocus")
+        raise ValueError(f"unknown command {cmd!r}")
+
+    def _autofocus(self, focuser):
+        best_pos, best_score = AutoFocus(focuser).runFocus(self.next_frame)
+        self.actuator.record_position(focus=best_pos)
+        print(f"[INFO] Autofocus done: focus={best_pos} score={best_score:.2f}")
+        return best_pos
+
+
+# ============================================================
+# Main
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="PTZ video + control server for mac_client")
+    parser.add_argument("--simulate", action="store_true", help="synthetic frames + simulated I2C bus")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--stream-port", type=int, default=STREAM_PORT)
+    parser.add_argument("--control-port", type=int, default=CONTROL_PORT)
+    parser.add_argument("--legacy", action="store_true", help="send v1 frames (<L length + JPEG)")
+    args = parser.parse_args()
+
+    orientation = Orientation("none" if args.simulate else ORIENTATION)
+
+    if args.simulate:
+        from B016712MP.SimulatedBus import SimulatedBus
+        focuser = Focuser(SimulatedBus())
+    else:
+        focuser = Focuser(1)
+        focuser.set(Focuser.OPT_MODE, 1)
+        time.sleep(0.5)
+        focuser.set(Focuser.OPT_IRCUT, 0)
+
+    actuator = PTZActuator(focuser)
+    actuator.move_to(**HOME)
+
+    camera = SyntheticCamera(actuator=actuator) if args.simulate else open_picamera(orientation)
+    broadcaster = FrameBroadcaster(max_fps=MAX_FPS, transform=orientation)
+    server = PTZStreamServer(camera, actuator, broadcaster, host=args.host,
+                             stream_port=args.stream_port, control_port=args.control_port,
+                             legacy=args.legacy).start()
+
+    try:
+        while True:
+            time.sleep(5)
+            s = broadcaster.stats()
+            print(f"[STATS] encoded={s['encoded']} clients={len(s['clients'])} ptz={actuator.status()['position']}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        camera.stop()
+        camera.close()
+        print("[OK] Stopped.")
+
+
+if __name__ == "__main__":
+    main()
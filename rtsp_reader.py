@@ -0,0 +1,192 @@
+# rtsp_reader.py
+# ------------------------------------------------------------
+# Freshest-frame RTSP reader.
+#
+# cap.read() on the display thread returns the *oldest* buffered frame,
+# so with FFmpeg buffering the picture can lag by seconds. Here one
+# background thread drains the stream with grab() (cheap, no colour
+# conversion) as fast as it arrives; a frame is only retrieve()d when a
+# consumer asks for one, and it is always the newest. Connection loss is
+# handled on the same thread with exponential backoff, so consumers just
+# see "no new frame" for a while.
+#
+#   reader = RTSPReader(url).start()
+#   ok, frame = reader.read(timeout=1.0)
+#   reader.stats()   # age_ms, dropped, reconnects, fps...
+# ------------------------------------------------------------
+
+import os
+import threading
+import time
+
+import cv2
+
+
+class RTSPReader:
+    def __init__(self, url, transports=("tcp", "udp"), buffer_size=1024,
+                 backoff_initial=0.5, backoff_max=10.0, open_timeout_ms=5000):
+        self.url = url
+        self.transports = transports
+        self.buffer_size = buffer_size
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.open_timeout_ms = open_timeout_ms
+
+        self._cond = threading.Condition()
+        self._requests = 0          # read() calls so far
+        self._answered = 0          # _requests value at the last retrieve()
+        self._frame = None
+        self._frame_info = None
+        self._frame_id = 0          # bumps on every retrieve()
+
+        self.connected = False
+        self.transport = None
+        self.last_error = None
+        self.grabbed = 0
+        self.retrieved = 0
+        self.delivered = 0
+        self.reconnects = 0
+        self.age_ms = 0.0           # grab -> handed to consumer, smoothed
+        self._last_grab = None
+        self._fps = 0.0
+
+        self.running = False
+        self._thread = None
+
+    # ============================================================
+    # Lifecycle
+    # ============================================================
+    def start(self):
+        if self.running:
+            return self
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="rtsp-reader", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    release = stop
+
+    # ============================================================
+    # Consumer side
+    # ============================================================
+    def read(self, timeout=1.0):
+        """(ok, frame) with the newest frame; (False, None) on timeout.
+
+        Blocks until the grab thread decodes its next frame, so the result
+        is never older than one frame interval.
+        """
+        frame, info = self.read_with_info(timeout)
+        return frame is not None, frame
+
+    def read_with_info(self, timeout=1.0):
+        """(frame, info) where info has grab_ts (time.monotonic()) and age_ms."""
+        with self._cond:
+            seen = self._frame_id
+            self._requests += 1
+            self._cond.wait_for(lambda: self._frame_id != seen or not self.running, timeout)
+            if self._frame_id == seen:
+                return None, None
+            frame, info = self._frame, dict(self._frame_info)
+
+        info["age_ms"] = (time.monotonic() - info["grab_ts"]) * 1000.0
+        self.age_ms += 0.1 * (info["age_ms"] - self.age_ms)
+        self.delivered += 1
+        return frame, info
+
+    def stats(self):
+        return {
+            "connected": self.connected,
+            "transport": self.transport,
+            "grabbed": self.grabbed,
+            "retrieved": self.retrieved,
+            "delivered": self.delivered,
+            "dropped": self.grabbed - self.retrieved,
+            "reconnects": self.reconnects,
+            "fps": round(self._fps, 1),
+            "age_ms": round(self.age_ms, 1),
+            "last_error": self.last_error,
+        }
+
+    # ============================================================
+    # Grab thread
+    # ============================================================
+    def _open(self):
+        for transport in self.transports:
+            # The FFmpeg backend only reads its options from the environment.
+            os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = \
+                f"rtsp_transport;{transport}|buffer_size;{self.buffer_size}"
+            try:
+                cap = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG,
+                                       [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, self.open_timeout_ms])
+            except (TypeError, AttributeError):    # OpenCV < 4.5.2: no open params
+                cap = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG)
+            if cap.isOpened():
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                self.transport = transport
+                return cap
+            cap.release()
+        self.last_error = f"could not open {self.url} via {'/'.join(self.transports)}"
+        return None
+
+    def _run(self):
+        backoff = self.backoff_initial
+        while self.running:
+            cap = self._open()
+            if cap is None:
+                self._sleep(backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+                continue
+
+            self.connected = True
+            print(f"[INFO] RTSP connected ({self.transport}): {self.url}")
+            got_frame = self._drain(cap)
+            cap.release()
+            self.connected = False
+            if not self.running:
+                break
+
+            if got_frame:
+                backoff = self.backoff_initial
+            self.reconnects += 1
+            print(f"[WARN] RTSP stream lost, reconnecting in {backoff:.1f}s")
+            self._sleep(backoff)
+            backoff = min(backoff * 2, self.backoff_max)
+
+    def _drain(self, cap):
+        """grab() until the stream fails; retrieve() only when asked."""
+        got_frame = False
+        while self.running:
+            if not cap.grab():
+                self.last_error = "grab failed"
+                return got_frame
+            now = time.monotonic()
+            got_frame = True
+            self.grabbed += 1
+            if self._last_grab is not None and now > self._last_grab:
+                self._fps += 0.05 * (1.0 / (now - self._last_grab) - self._fps)
+            self._last_grab = now
+
+            if self._requests == self._answered:
+                continue
+            ok, frame = cap.retrieve()
+            if not ok:
+                continue
+            self.retrieved += 1
+            with self._cond:
+                self._frame = frame
+                self._frame_info = {"grab_ts": now, "index": self.grabbed}
+                self._frame_id += 1
+                self._answered = self._requests
+                self._cond.notify_all()
+        return got_frame
+
+    def _sleep(self, seconds):
+        with self._cond:
+            self._cond.wait_for(lambda: not self.running, seconds)
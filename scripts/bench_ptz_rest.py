@@ -0,0 +1,128 @@
+# python
+# ------------------------------------------------------------
+# Request latency of the PTZ REST API under concurrent clients, on a
+# SimulatedBus (realistic motor/busy timing, no Pi needed).
+#   actuator : ptz_rest_server as shipped (handlers post to PTZActuator)
+#   blocking : same routes, but each handler drives the Focuser itself
+#              under a lock and /status reads the bus (the naive server)
+#
+# Each client keeps one keep-alive session and sends /step (and /status
+# every few requests) as fast as it gets answers, like held arrow keys.
+#
+# Usage: python scripts/bench_ptz_rest.py [--clients 1 4 8] [--seconds 3]
+# ------------------------------------------------------------
+import os
+import sys
+import time
+import argparse
+import threading
+
+import requests
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from B016712MP.Focuser import Focuser
+from B016712MP.SimulatedBus import SimulatedBus
+from ptz_actuator import PTZActuator, AXES
+from ptz_rest_server import PTZRestService, make_server
+
+
+class BlockingService(PTZRestService):
+    """Naive variant: the request thread waits for the motors."""
+
+    def __init__(self, actuator, focuser):
+        super().__init__(actuator)
+        self.focuser = focuser
+        self.bus_lock = threading.Lock()
+        self.position = dict(actuator.position)
+
+    def _move_by(self, **deltas):
+        with self.bus_lock:
+            for axis, delta in deltas.items():
+                self.position[axis] += delta
+                self.focuser.set(AXES[axis], self.position[axis])
+            return dict(self.position)
+
+    def step(self, params):
+        return {"target": self._move_by(pan=int(params.get("dx", 0)), tilt=int(params.get("dy", 0)))}
+
+    def status(self, params=None):
+        with self.bus_lock:
+            return {axis: self.focuser.get(opt) for axis, opt in AXES.items()}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+
+
+def client(base, seconds, results, index):
+    session = requests.Session()
+    direction = 1 if index % 2 else -1
+    end = time.monotonic() + seconds
+    n = 0
+    while time.monotonic() < end:
+        n += 1
+        if n % 5 == 0:
+            path, method, params = "/status", session.get, None
+        else:
+            # Sweep back and forth so moves have real distance to travel.
+            if n % 40 == 0:
+                direction = -direction
+            path, method, params = "/step", session.post, {"dx": 2 * direction}
+        t0 = time.perf_counter()
+        r = method(base + path, params=params, timeout=10)
+        r.raise_for_status()
+        results.setdefault(path, []).append((time.perf_counter() - t0) * 1e3)
+
+
+def run(variant, clients, seconds):
+    focuser = Focuser(SimulatedBus())
+    actuator = PTZActuator(focuser).start()
+    service = PTZRestService(actuator) if variant == "actuator" else BlockingService(actuator, focuser)
+    server = make_server(service, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    per_client = [{} for _ in range(clients)]
+    threads = [threading.Thread(target=client, args=(base, seconds, per_client[i], i))
+               for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    server.shutdown()
+    server.server_close()
+    status = actuator.status()
+    actuator.stop()
+
+    merged = {}
+    for res in per_client:
+        for path, values in res.items():
+            merged.setdefault(path, []).extend(values)
+    return merged, status
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"{'variant':<9} {'clients':>7} {'route':<8} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}  moves")
+    for clients in args.clients:
+        for variant in ("blocking", "actuator"):
+            results, status = run(variant, clients, args.seconds)
+            for path in ("/step", "/status"):
+                values = results.get(path, [])
+                moves = (f"{status['moves']} moves for {status['requests']} axis requests"
+                         if variant == "actuator" and path == "/step" else "")
+                print(f"{variant:<9} {clients:>7} {path:<8} {len(values) / args.seconds:>7.0f} "
+                      f"{percentile(values, .5):>8.1f} {percentile(values, .95):>8.1f} "
+                      f"{percentile(values, .99):>8.1f} {max(values, default=float('nan')):>8.1f}  {moves}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# python
+# ------------------------------------------------------------
+# Skip ratio and box drift of motion-gated inference (motion_gate.py)
+# against full inference on every frame.
+#
+# Every frame is tracked for real (YOLO + ByteTrack, settings from
+# testing_on_video.py; results go through its detection cache, so re-runs
+# are fast). In the same pass each --max-skip value drives its own
+# MotionGate + TrackPropagator: on frames the gate lets through, the
+# propagator is corrected with the real tracks; on skipped frames its
+# Kalman boxes are compared with the real ones (per track ID).
+#
+# Approximation: a gated run's ByteTrack sees fewer frames; here the real
+# tracks on gated-through frames come from the ungated tracker.
+#
+# Usage: python scripts/eval_motion_gate.py [videos/] [--max-skip 3 5 10]
+# ------------------------------------------------------------
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+import testing_on_video as cfg
+from batch_track import find_videos
+from motion_gate import MotionGate, TrackPropagator
+from target_roi import box_iou
+
+
+class GateRun:
+    def __init__(self, max_skip, pixel_threshold, changed_fraction):
+        self.max_skip = max_skip
+        self.gate = MotionGate(max_skip=max_skip, pixel_threshold=pixel_threshold,
+                               changed_fraction=changed_fraction)
+        self.propagator = TrackPropagator()
+        self.ious = []
+        self.missed = 0
+        self.gate_s = 0.0
+
+    def step(self, index, frame, real):
+        started = time.perf_counter()
+        infer = self.gate.should_infer(frame)
+        self.gate_s += time.perf_counter() - started
+        if infer:
+            self.propagator.update(index, real)
+            return
+        boxes, ids = self.propagator.predict(index)[:2]
+        predicted = {} if boxes is None or ids is None else {int(t): b for b, t in zip(boxes, ids)}
+        real_boxes, real_ids = real[:2]
+        if real_boxes is None or real_ids is None:
+            return
+        for box, tid in zip(real_boxes, real_ids):
+            if int(tid) in predicted:
+                self.ious.append(box_iou(box, predicted[int(tid)]))
+            else:
+                self.missed += 1
+
+    def row(self, infer_ms):
+        skip = self.gate.skip_ratio()
+        ious = np.array(self.ious) if self.ious else np.zeros(1)
+        checked = len(self.ious) + self.missed
+        gate_ms = self.gate_s * 1000.0 / max(1, self.gate.frames)
+        per_frame = (1.0 - skip) * infer_ms + gate_ms
+        return (f"K={self.max_skip:<3d} skip {skip:6.1%}  IoU mean {ious.mean():.3f} p10 "
+                f"{np.percentile(ious, 10):.3f} >=0.5 {np.mean(ious >= 0.5):6.1%}  "
+                f"missed {self.missed / max(1, checked):6.1%}  gate {gate_ms:.2f}ms  "
+                f"speedup x{infer_ms / per_frame if per_frame else 0:.1f}")
+
+
+def evaluate(path, max_skips, limit, pixel_threshold, changed_fraction):
+    classes = [0] if cfg.ONLY_HORSE else None
+    stage = cfg.TrackStage(cfg.load_model, classes, every=1, cache=cfg.open_cache(path, classes))
+    runs = [GateRun(k, pixel_threshold, changed_fraction) for k in max_skips]
+    infer_s, frames = 0.0, 0
+    for pkt in cfg.read_frames(path):
+        started = time.perf_counter()
+        real = stage(pkt)["tracks"]
+        infer_s += time.perf_counter() - started
+        for run in runs:
+            run.step(pkt["index"], pkt["frame"], real)
+        frames += 1
+        if limit and frames >= limit:
+            break
+    if stage.cache is not None:
+        stage.cache.close()
+    infer_ms = infer_s * 1000.0 / max(1, frames)
+    if stage.full_frames == 0:
+        # All frames came from the cache: timing is disk speed, not YOLO.
+        print("[WARN] all tracks cached; speedup uses the cache read time, rerun with --no-cache for CPU timing")
+    print(f"[STATS] {os.path.basename(path)}: {frames} frames, full inference {infer_ms:.1f} ms/frame")
+    for run in runs:
+        print(f"        {run.row(infer_ms)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Motion gate skip ratio / drift vs full inference")
+    parser.add_argument("inputs", nargs="*", default=[os.path.join(project_root, "videos")])
+    parser.add_argument("--max-skip", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--pixel-threshold", type=int, default=16, help="gray levels that count as change")
+    parser.add_argument("--fraction", type=float, default=0.01, help="changed thumbnail share that counts as motion")
+    parser.add_argument("--frames", type=int, default=0, help="stop after N frames per video (0 = all)")
+    parser.add_argument("--no-cache", action="store_true", help="always run YOLO (for timing)")
+    args = parser.parse_args()
+
+    if not os.path.exists(cfg.WEIGHTS):
+        print(f"[ERROR] Weights not found: {os.path.abspath(cfg.WEIGHTS)}")
+        sys.exit(1)
+    # Reference = full inference on every frame, whole image.
+    cfg.MOTION_GATE = False
+    cfg.ROI_LOCK = False
+    cfg.USE_CACHE = not args.no_cache
+
+    for path in find_videos(args.inputs):
+        evaluate(path, args.max_skip, args.frames, args.pixel_threshold, args.fraction)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,14 @@ import sys
 import time
 import threading
 import argparse
+from contextlib import contextmanager
 import gi
 import cv2
 import numpy as np
 
 gi.require_version('Gst', '1.0')
-from gi.repository import Gst, GLib
+gi.require_version('GstVideo', '1.0')
+from gi.repository import Gst, GstVideo, GLib
 import hailo
 
 # --- HAILO IMPORTS ---
@@ -29,6 +31,29 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
 from B016712MP.Focuser import Focuser
 from B016712MP.AutoFocus import AutoFocus
+from ptz_actuator import PTZActuator, AXES, clamp_axis
+from ptz_controller import PTZController, TargetFollower
+from ptz_calibration import CALIBRATION_FILE, CalibrationTable
+from telemetry import Telemetry
+
+# --- PTZ ACTUATION ---
+CONTROL_HZ = 20          # pan/tilt setpoints per second from the follower thread
+OBS_MAX_AGE_S = 0.5      # older target observations are not acted on
+AF_SETTLE_TIMEOUT_S = 2.0  # score AF frames anyway if a focus move never completes
+CALIBRATION_PATH = os.path.join(project_root, CALIBRATION_FILE)   # from ptz_calibration.py
+
+# --- FRAME ACCESS ---
+SNAPSHOT_DIR = os.path.join(project_root, "snapshots")
+
+# --- TELEMETRY (see telemetry.py) ---
+# JSON lines file, "stdout" or "udp://host:port"; the callback never prints.
+TELEMETRY_SINK = os.environ.get("PTZ_TELEMETRY", os.path.join(project_root, "telemetry.jsonl"))
+TELEMETRY_FLUSH_S = 1.0  # metrics record (counters, gauges, ptz latency) period
+TELEMETRY_LIMITS = {     # event kind -> max events per second
+    "detection": 2.0,
+    "target": 5.0,
+    "af_step": 10.0,
+}
 
 
 # =====================================================================
@@ -39,13 +64,17 @@ def user_input_loop(user_data):
     This runs in the background. It waits for you to type an ID.
     """
     print("\n>>> THREAD: Input listener started.")
-    print(">>> THREAD: Type a number (ID) to track, or -1 to see all.\n")
+    print(">>> THREAD: Type a number (ID) to track, or -1 to see all, 's' for a snapshot.\n")
 
     while True:
         try:
             # This line waits for you to type in the terminal
             user_input = input()  # Waits for Enter
 
+            if user_input.strip().lower() == "s":
+                user_data.snapshot_requested = True
+                continue
+
             # Convert string to integer
             new_id = int(user_input)
 
@@ -63,6 +92,126 @@ def user_input_loop(user_data):
             break
 
 
+# =====================================================================
+# PTZ ACTUATION (off the GStreamer thread)
+# =====================================================================
+class ActuatorFocuser:
+    """
+    Focuser stand-in for AutoFocus: set() posts to the actuator, no I2C wait.
+
+    AutoFocus counts FRAMES_TO_WAIT from when set() returns, which used to
+    be when the lens had stopped; now the focus move may still be queued
+    behind (or merged with) pan/tilt moves. lens_settled() tells whether
+    the last focus setpoint has been reached, so frames are only scored
+    from then on.
+    """
+
+    AXIS_OF = {opt: axis for axis, opt in AXES.items()}
+
+    def __init__(self, actuator, settle_timeout_s=AF_SETTLE_TIMEOUT_S):
+        self.actuator = actuator
+        self.settle_timeout_s = settle_timeout_s
+        self.focus_target = None
+        self.focus_sent = 0.0
+
+    def set(self, opt, value):
+        axis = self.AXIS_OF.get(opt)
+        if axis is None:
+            self.actuator.set_option(opt, value)
+            return
+        if axis == "focus":
+            self.focus_target = clamp_axis(axis, value)
+            self.focus_sent = time.monotonic()
+        self.actuator.move_to(**{axis: value})
+
+    def lens_settled(self):
+        if self.focus_target is None:
+            return True
+        if self.actuator.position["focus"] == self.focus_target:
+            self.focus_target = None
+            return True
+        if time.monotonic() - self.focus_sent > self.settle_timeout_s:
+            print(f"[WARN] Focus move to {self.focus_target} did not complete, continuing")
+            self.focus_target = None
+            return True
+        return False
+
+
+# =====================================================================
+# LAZY FRAME ACCESS
+# =====================================================================
+def frame_layout(pad):
+    """(stride, offset) of the pixel plane from the negotiated caps, or None."""
+    caps = pad.get_current_caps()
+    if caps is None:
+        return None
+    if hasattr(GstVideo.VideoInfo, "new_from_caps"):
+        info = GstVideo.VideoInfo.new_from_caps(caps)
+    else:
+        info = GstVideo.VideoInfo()
+        if not info.from_caps(caps):
+            info = None
+    return None if info is None else (info.stride[0], info.offset[0])
+
+
+@contextmanager
+def mapped_frame(buffer, caps, layout):
+    """
+    Read-only zero-copy view of the buffer's pixels, valid only inside the
+    with block (the buffer is unmapped on exit). The row stride comes from
+    the buffer's video meta or the caps (`layout`); non-RGB formats, an
+    unknown layout or a buffer too small for it fall back to hailo's
+    copying converter.
+    """
+    fmt, w, h = caps
+    if fmt != "RGB" or layout is None:
+        yield get_numpy_from_buffer(buffer, fmt, w, h)
+        return
+    stride, offset = layout
+    meta = GstVideo.buffer_get_video_meta(buffer)
+    if meta is not None:
+        stride, offset = meta.stride[0], meta.offset[0]
+    ok, map_info = buffer.map(Gst.MapFlags.READ)
+    if not ok:
+        yield None
+        return
+    try:
+        data = np.frombuffer(map_info.data, dtype=np.uint8)
+        if stride >= w * 3 and data.size >= offset + stride * (h - 1) + w * 3:
+            # Rows may be padded and the plane may have trailing bytes.
+            yield np.lib.stride_tricks.as_strided(data[offset:], shape=(h, w, 3),
+                                                  strides=(stride, 3, 1), writeable=False)
+            return
+    finally:
+        buffer.unmap(map_info)
+    yield get_numpy_from_buffer(buffer, fmt, w, h)
+
+
+def capture_time(element, buffer, max_age_s=2.0):
+    """
+    time.monotonic() at which the buffer was captured, from its PTS
+    (running time) + the pipeline's base time on its clock, or None if
+    that is unknown or implausible. The clock -> monotonic offset is taken
+    now, so it holds whatever clock the pipeline runs on.
+    """
+    pts = buffer.pts
+    if element is None or pts == Gst.CLOCK_TIME_NONE:
+        return None
+    clock = element.get_clock()
+    if clock is None:
+        return None
+    now = time.monotonic()
+    t = now - (clock.get_time() - element.get_base_time() - pts) / 1e9
+    return t if now - max_age_s <= t <= now else None
+
+
+def save_snapshot(frame_rgb):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = os.path.join(SNAPSHOT_DIR, time.strftime("snapshot_%Y%m%d_%H%M%S.jpg"))
+    cv2.imwrite(path, cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR))
+    print(f" [SYSTEM] Snapshot saved: {path}")
+
+
 # =====================================================================
 # USER APP CLASS
 # =====================================================================
@@ -92,38 +241,97 @@ class UserApp(app_callback_class):
         except Exception as e:
             print(f"[ERROR] PTZ Init failed: {e}")
 
+        # Telemetry first: everything below may report to it.
+        self.telemetry = Telemetry(TELEMETRY_SINK, flush_interval_s=TELEMETRY_FLUSH_S)
+        for kind, rate_hz in TELEMETRY_LIMITS.items():
+            self.telemetry.limit(kind, rate_hz=rate_hz)
+        self.telemetry.start()
+        print(f"[INIT] Telemetry -> {TELEMETRY_SINK}")
+
         # State Variables
         self.target_id = -1
         self.frame_counter = 0
 
-        # Current Motor Positions (Software State)
-        self.current_pan = self.center_pan
-        self.current_tilt = self.center_tilt
+        # From here on only the actuator thread talks to the Focuser, so
+        # nothing in the GStreamer callback waits for the motors.
+        self.actuator = PTZActuator(
+            self.focuser, position={"pan": self.center_pan, "tilt": self.center_tilt}
+        ).start()
+        controller = PTZController()
+        if os.path.exists(CALIBRATION_PATH):
+            try:
+                CalibrationTable.load(CALIBRATION_PATH).apply(controller)
+                print(f"[INIT] PTZ calibration loaded: {CALIBRATION_PATH}")
+            except (ValueError, KeyError) as e:
+                print(f"[ERROR] PTZ calibration {CALIBRATION_PATH} unusable ({e}), using the FOV model")
+        else:
+            print("[INIT] No PTZ calibration, using the FOV model (run ptz_calibration.py)")
+        self.follower = TargetFollower(self.actuator, controller, rate_hz=CONTROL_HZ,
+                                       max_age_s=OBS_MAX_AGE_S, stats_every_s=0).start()
+        self.telemetry.add_collector(self.follower.metrics)
 
         # --- FIX: This was missing and caused the crash ---
         self.track_gain = 30  # Controls tracking speed
 
         # Autofocus logic
         self.is_focusing = True
-        self.focuser.set(Focuser.OPT_FOCUS, 200)
+        self.actuator.move_to(focus=200)
 
         print("[INIT] Starting Initial AutoFocus...")
 
-        # Using the Library AutoFocus as you requested
-        self.autofocus = AutoFocus(self.focuser, camera=None)
+        # Using the Library AutoFocus as you requested; its lens moves go
+        # through the actuator too.
+        self.af_focuser = ActuatorFocuser(self.actuator)
+        self.autofocus = AutoFocus(self.af_focuser, camera=None)
         self.autofocus.debug = True
+        self.autofocus.telemetry = self.telemetry
         self.autofocus.startFocus_hailo()
         self.info_printed = False
 
-
-        # ======================================================
-        # NEW: Non-blocking cooldown for PTZ moves
-        # ======================================================
-        self.last_move_time = 0.0      # time of last PTZ move
-        self.move_cooldown = 0.2       # seconds between moves (tune this)
+        # Pixel access: caps are read once; buffers are only mapped while
+        # a consumer (AF, snapshot, anything in frame_consumers) wants them.
+        self.caps = None
+        self.layout = None              # (stride, offset) for mapped_frame
+        self.element = None             # for the pipeline clock (capture_time)
+        self.snapshot_requested = False
+        self.frame_consumers = set()    # e.g. a recorder adds its name here
+        self.cb_time = {True: [0, 0.0], False: [0, 0.0]}   # mapped? -> [frames, seconds]
+        self.telemetry.add_collector(self.callback_metrics)
         print("[INIT] Ready.")
         print("=" * 40 + "\n")
 
+    def wants_pixels(self):
+        return self.is_focusing or self.snapshot_requested or bool(self.frame_consumers)
+
+    def consume_frame(self, frame):
+        """Everything that needs pixels; `frame` is only valid during this call."""
+        # --- AUTOFOCUS STEP (Existing Logic) ---
+        # Frames before the lens reaches its setpoint are not counted or
+        # scored, as when Focuser.set() blocked until the move was done.
+        if self.is_focusing and self.af_focuser.lens_settled():
+            finished, best_pos = self.autofocus.stepFocus_hailo(frame)
+            if finished:
+                print(f"!!! [AF-H] FINISHED! Best Focus: {best_pos} !!!")
+                self.telemetry.event("af_done", pos=best_pos, score=round(self.autofocus.best_score, 2))
+                self.is_focusing = False
+                self.actuator.move_to(focus=best_pos)
+
+        if self.snapshot_requested:
+            self.snapshot_requested = False
+            threading.Thread(target=save_snapshot, args=(frame.copy(),), daemon=True).start()
+
+    def record_callback(self, mapped, seconds):
+        entry = self.cb_time[mapped]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def callback_metrics(self):
+        # Telemetry flusher thread; reads counters the callback only adds to.
+        avg = lambda e: round(e[1] * 1000.0 / e[0], 3) if e[0] else 0.0
+        return {"cb_frames_mapped": self.cb_time[True][0], "cb_ms_mapped": avg(self.cb_time[True]),
+                "cb_frames_unmapped": self.cb_time[False][0], "cb_ms_unmapped": avg(self.cb_time[False]),
+                "frames": self.frame_counter, "target_id": self.target_id}
+
 
 # =====================================================================
 # CALLBACK FUNCTION
@@ -132,12 +340,17 @@ def app_callback(pad, info, user_data: UserApp):
     buffer = info.get_buffer()
     if buffer is None:
         return Gst.PadProbeReturn.OK
+    started = time.perf_counter()
 
     roi = hailo.get_roi_from_buffer(buffer)
     user_data.frame_counter += 1
 
-    fmt, w, h = get_caps_from_pad(pad)
-    frame = get_numpy_from_buffer(buffer, fmt, w, h)
+    # Caps are fixed once negotiated; parse them only for the first buffer.
+    if user_data.caps is None:
+        user_data.caps = get_caps_from_pad(pad)
+        user_data.layout = frame_layout(pad)
+        user_data.element = pad.get_parent_element()
+    fmt, w, h = user_data.caps
     # -------------------------------------------------------------
     # PRINT SCREEN INFO ONCE (When first frame arrives)
     # -------------------------------------------------------------
@@ -155,19 +368,27 @@ def app_callback(pad, info, user_data: UserApp):
         print(f"# Bottom-Right: ({w}, {h})     -> Norm: (1.0, 1.0)")
         print("#" * 60 + "\n")
         user_data.info_printed = True
-    if frame is None:
-        return Gst.PadProbeReturn.OK
 
-    # --- AUTOFOCUS STEP (Existing Logic) ---
-    if user_data.is_focusing:
-        finished, best_pos = user_data.autofocus.stepFocus_hailo(frame)
-        if finished:
-            print(f"!!! [AF-H] FINISHED! Best Focus: {best_pos} !!!")
-            user_data.is_focusing = False
-            user_data.focuser.set(Focuser.OPT_FOCUS, best_pos)
+    # --- PIXELS (only when someone needs them) ---
+    mapped = user_data.wants_pixels()
+    if mapped:
+        with mapped_frame(buffer, user_data.caps, user_data.layout) as frame:
+            if frame is not None:
+                user_data.consume_frame(frame)
 
     # --- DETECTION & TRACKING ---
     detections = roi.get_objects_typed(hailo.HAILO_DETECTION)
+    telemetry = user_data.telemetry
+    telemetry.count("detections", len(detections))
+
+    # When the frame was captured, not when inference finished: the
+    # follower discards frames captured mid-move and measures its lead
+    # from this. Without a usable PTS, post() stamps the call time.
+    t_capture = capture_time(user_data.element, buffer)
+    if t_capture is None:
+        telemetry.count("capture_time_missing")
+    else:
+        telemetry.gauge("capture_age_ms", round((time.monotonic() - t_capture) * 1000.0, 1))
 
     for det in detections:
         label = det.get_label()
@@ -189,68 +410,36 @@ def app_callback(pad, info, user_data: UserApp):
             center_x = bbox.xmin() + (bbox.width() / 2)
             center_y = bbox.ymin() + (bbox.height() / 2)
 
-            print(f"*** TARGET  [{track_id}] ***: Pos: X={center_x:.2f}")
+            telemetry.count("persons")
+            if user_data.target_id == -1:
+                telemetry.event("detection", id=track_id, x=round(center_x, 3), y=round(center_y, 3))
 
             # =========================================================
-            # TRACKING LOGIC (Horizontal Only)
+            # TRACKING LOGIC (pan + tilt, see ptz_controller.py)
             # =========================================================
             if user_data.target_id != -1:
 
-                # --- ADDED: CHECK COOLDOWN ---
-
                 # 1. Calculate Error (Center is 0.5)
                 # If X > 0.5 (Right side), Error is Positive
                 error_x = center_x - 0.5
-
-                norm_x = bbox.xmin()
-                norm_y = bbox.ymin()
-
-                pixel_x = int(norm_x * w)
-                pixel_y = int(norm_y * h)
-
-                print(f"Normalized: ({norm_x:.2f}, {norm_y:.2f})  -->  Pixels: ({pixel_x}, {pixel_y})")
-
-                back_to_norm_x = pixel_x / w
-                back_to_norm_y = pixel_y / h
-
-                print(f"Check Back: ({back_to_norm_x:.2f}, {back_to_norm_y:.2f})")
-
-                print("distance between object and center:", abs(error_x))
-                normalized_error_x = int(center_x * w)
-                print("normalized error x in pixels:", normalized_error_x)
-
-                # 2. Deadzone (Don't move if error is small, e.g. < 5%)
-                if abs(error_x) > 0.2:
-
-                    # 3. Calculate New Pan Position
-                    A_current = user_data.current_pan
-
-                    # --- YOUR LOGIC KEPT EXACTLY AS IS ---
-                    A_c = ((pixel_x - 640) / 13.3)/2
-
-                    print("A_current:", A_current)
-                    print("A_c:", A_c)
-                    new_pan = int(A_current + A_c)
-                    print("new_pan:", new_pan)
-                    # 4. Clamp Limits (0 to 1000)
-                    new_pan = max(0, min(180, new_pan))
-
-                    # 5. Move Motor (Only if changed significantly)
-                    if abs(new_pan - user_data.current_pan) > 2:
-                        # --------------------------------------------------------
-                        # Non-blocking cooldown using time.monotonic()
-                        # --------------------------------------------------------
-                        now = time.monotonic()
-                        if now - user_data.last_move_time >= user_data.move_cooldown:
-                            print("[TRACK] Moving to new pan...")
-                            user_data.focuser.set(Focuser.OPT_MOTOR_X, new_pan)
-                            user_data.current_pan = new_pan
-                            user_data.last_move_time = now
-                        else:
-                            # Optional: debug to see how often it wants to move
-                            remaining = user_data.move_cooldown - (now - user_data.last_move_time)
-                            print(f"[TRACK] Cooldown active, skipping move ({remaining:.2f}s left)")
-
+                error_y = center_y - 0.5
+
+                # Latest values go out with every metrics record; the
+                # per-frame event is rate limited.
+                telemetry.count("target_frames")
+                telemetry.gauge("target_x", round(center_x, 4))
+                telemetry.gauge("target_y", round(center_y, 4))
+                telemetry.gauge("target_px", (int(center_x * w), int(center_y * h)))
+                telemetry.gauge("error_x", round(error_x, 4))
+                telemetry.gauge("error_y", round(error_y, 4))
+                telemetry.event("target", id=track_id, x=round(center_x, 3), y=round(center_y, 3),
+                                error_x=round(error_x, 3), error_y=round(error_y, 3))
+
+                # 2. Hand off the box centre to the follower thread (pan/tilt
+                #    controller and the I2C writes run there; returns at once).
+                user_data.follower.post(center_x, center_y, t_capture)
+
+    user_data.record_callback(mapped, time.perf_counter() - started)
     return Gst.PadProbeReturn.OK
 
 
@@ -282,4 +471,8 @@ if __name__ == "__main__":
     try:
         app.run()
     except KeyboardInterrupt:
-        pass
\ No newline at end of file
+        pass
+    finally:
+        user_data.follower.stop()
+        user_data.actuator.stop()
+        user_data.telemetry.stop()
\ No newline at end of file
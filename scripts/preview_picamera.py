@@ -17,12 +17,21 @@ sys.path.insert(0, project_root)
 from B016712MP.Focuser import Focuser
 
 from B016712MP.AutoFocus import AutoFocus
+from orientation import Orientation
 # ============================================================
 # Camera Setup
 # ============================================================
+# Same rot90cw as before; the vertical flip is done by the ISP when
+# libcamera is available, the transpose lands in a reused buffer.
+orientation = Orientation("rot90cw")
+camera_extra = {}
+camera_transform = orientation.camera_transform()
+if camera_transform is not None:
+    camera_extra["transform"] = camera_transform
+
 cam = Picamera2()
 cam.configure(cam.create_video_configuration(
-    main={"size": (360, 640), "format": "RGB888"}
+    main={"size": (360, 640), "format": "RGB888"}, **camera_extra
 ))
 cam.start()
 time.sleep(2)
@@ -70,8 +79,7 @@ try:
         frame = cam.capture_array()
 
         # Rotate for correct orientation
-        frame = cv2.transpose(frame)
-        frame = cv2.flip(frame, 1)
+        frame = orientation.apply(frame)
 
         # Read pan/tilt from focuser (safe)
         try:
@@ -0,0 +1,148 @@
+# python
+# ------------------------------------------------------------
+# PTZController against a simulated target on a SimulatedBus.
+#
+# The "camera" looks where the simulated motors physically are
+# (SimulatedBus.position, interpolated during moves). A target moves in
+# PTZ degrees; every frame its normalized box centre is computed from the
+# true field of view and posted to a TargetFollower after --detect-delay
+# (the detector). The follower/actuator run exactly as on the Pi.
+#
+# Per scenario and zoom it reports, for pan and tilt:
+#   settle  : time until |pointing error| stays below --tol degrees
+#   overshoot: largest error past the target, % of the initial error (step)
+#   rms     : pointing error RMS over the second half (moving targets)
+#
+# --fov-error makes the true field of view differ from the controller's
+# model; --calibration loads a ptz_calibration.py table (e.g. one made with
+# `ptz_calibration.py --simulate`, whose scene has fov_scale 0.8).
+#
+# Usage: python scripts/sim_ptz_controller.py [--seconds 4] [--no-lead]
+# ------------------------------------------------------------
+import os
+import sys
+import math
+import time
+import argparse
+from collections import deque
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from B016712MP.Focuser import Focuser
+from B016712MP.SimulatedBus import SimulatedBus
+from ptz_actuator import PTZActuator
+import ptz_controller
+from ptz_controller import PTZController, TargetFollower, fov_at_zoom
+from ptz_calibration import CalibrationTable
+
+FPS = 30
+START = {"pan": 90, "tilt": 60}
+
+
+def scenarios(hfov, vfov):
+    """name -> f(t) giving the target's (pan, tilt) in degrees."""
+    step_pan, step_tilt = 0.35 * hfov, 0.3 * vfov
+    return {
+        "step": lambda t: (START["pan"] + step_pan, START["tilt"] + step_tilt),
+        "ramp": lambda t: (START["pan"] + 0.15 * hfov + 12.0 * t, START["tilt"] + 4.0 * t),
+        "sine": lambda t: (START["pan"] + 15.0 * math.sin(2 * math.pi * 0.3 * t),
+                           START["tilt"] + 5.0 * math.sin(2 * math.pi * 0.2 * t)),
+    }
+
+
+def run(name, target, zoom, args):
+    bus = SimulatedBus()
+    actuator = PTZActuator(Focuser(bus), position=dict(START, zoom=zoom)).start()
+    actuator.move_to(zoom=zoom, **START)
+    while actuator.status()["busy"]:
+        time.sleep(0.01)
+
+    controller = PTZController(max_lead_s=0.0 if args.no_lead else 0.5)
+    if args.calibration:
+        CalibrationTable.load(args.calibration).apply(controller)
+    follower = TargetFollower(actuator, controller, rate_hz=args.control_hz, stats_every_s=0).start()
+    hfov, vfov = (f * args.fov_error for f in fov_at_zoom(zoom))
+
+    pending = deque()               # (deliver_at, cx, cy, t_capture)
+    log = []                        # (t, pan error, tilt error)
+    t0 = time.monotonic()
+    next_frame = t0
+    while True:
+        now = time.monotonic()
+        t = now - t0
+        if t >= args.seconds:
+            break
+        cam_pan, cam_tilt = bus.position(0x05, now), bus.position(0x06, now)
+        tgt_pan, tgt_tilt = target(t)
+        err_pan, err_tilt = tgt_pan - cam_pan, tgt_tilt - cam_tilt
+        log.append((t, err_pan, err_tilt))
+
+        cx = 0.5 + ptz_controller.PAN_SIGN * err_pan / hfov
+        cy = 0.5 + ptz_controller.TILT_SIGN * err_tilt / vfov
+        if 0.0 <= cx <= 1.0 and 0.0 <= cy <= 1.0:
+            noise = np.random.normal(0.0, args.noise, 2)
+            pending.append((now + args.detect_delay, cx + noise[0], cy + noise[1], now))
+        while pending and pending[0][0] <= now:
+            _, px, py, t_capture = pending.popleft()
+            follower.post(px, py, t_capture)
+
+        next_frame += 1.0 / FPS
+        time.sleep(max(0.0, next_frame - time.monotonic()))
+
+    follower.stop()
+    actuator.stop()
+    return np.array(log), follower
+
+
+def metrics(log, column, tol, step):
+    t, err = log[:, 0], log[:, column]
+    outside = np.flatnonzero(np.abs(err) > tol)
+    settle = 0.0 if len(outside) == 0 else (t[outside[-1] + 1] if outside[-1] + 1 < len(t) else None)
+    overshoot = None
+    if step and abs(err[0]) > tol:
+        past = -err * np.sign(err[0])
+        overshoot = max(0.0, past.max()) / abs(err[0]) * 100.0
+    rms = float(np.sqrt(np.mean(err[len(err) // 2:] ** 2)))
+    return settle, overshoot, rms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated PTZ tracking: settling time and overshoot")
+    parser.add_argument("--seconds", type=float, default=4.0)
+    parser.add_argument("--zoom", type=int, nargs="+", default=[0, ptz_controller.ZOOM_MAX])
+    parser.add_argument("--scenario", nargs="+", default=["step", "ramp", "sine"])
+    parser.add_argument("--detect-delay", type=float, default=0.06, help="capture -> detection (s)")
+    parser.add_argument("--control-hz", type=float, default=10.0)
+    parser.add_argument("--noise", type=float, default=0.003, help="box centre noise (normalized)")
+    parser.add_argument("--tol", type=float, default=1.5, help="settled when |error| <= tol degrees")
+    parser.add_argument("--fov-error", type=float, default=1.0, help="true FOV / controller's FOV model")
+    parser.add_argument("--calibration", help="ptz_calibration.py table to load into the controller")
+    parser.add_argument("--no-lead", action="store_true", help="disable latency compensation")
+    args = parser.parse_args()
+
+    np.random.seed(0)
+    print(f"[INFO] lead {'off' if args.no_lead else 'on'}, detect delay {args.detect_delay * 1000:.0f}ms, "
+          f"control {args.control_hz:.0f}Hz, fov error x{args.fov_error}, "
+          f"calibration {args.calibration or 'none'}")
+    for zoom in args.zoom:
+        hfov, vfov = fov_at_zoom(zoom)
+        for name in args.scenario:
+            log, follower = run(name, scenarios(hfov, vfov)[name], zoom, args)
+            parts = []
+            for axis, column in (("pan", 1), ("tilt", 2)):
+                settle, overshoot, rms = metrics(log, column, args.tol, name == "step")
+                text = f"{axis} settle {'never' if settle is None else f'{settle:.2f}s'}"
+                if overshoot is not None:
+                    text += f" overshoot {overshoot:.0f}%"
+                parts.append(text + f" rms {rms:.2f}deg")
+            moved = sorted(follower.move_latency)
+            lat = moved[len(moved) // 2] * 1000.0 if moved else 0.0
+            print(f"[STATS] zoom {zoom:4d} {name:5s} | {' | '.join(parts)} | "
+                  f"cmds {follower.commands} latency p50 {lat:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# stage_pipeline.py
+# ------------------------------------------------------------
+# Small building blocks for running decode / inference / render as
+# separate threads connected by bounded queues.
+#
+# - StageQueue: bounded hand-off. With drop_oldest=True (live sources) a
+#   full queue discards its oldest item, so a slow stage always works on
+#   recent frames. With drop_oldest=False (files) put() blocks: lossless.
+# - StageStats: per-stage throughput, processing latency and drops.
+# - Stage: a thread that pulls from one queue, calls fn(item), pushes the
+#   result to the next queue. SourceStage feeds a queue from an iterator.
+#
+# Items are dicts ("packets"); every stage may add keys. The end of the
+# stream is signalled with END.
+# ------------------------------------------------------------
+
+import threading
+import time
+from collections import deque
+
+END = object()
+
+
+class StageQueue:
+    def __init__(self, maxsize=2, drop_oldest=False):
+        self.maxsize = maxsize
+        self.drop_oldest = drop_oldest
+        self._items = deque()
+        self._cond = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        """Add an item; returns False if it could not be queued (closed)."""
+        with self._cond:
+            if item is not END:
+                if self.drop_oldest:
+                    while len(self._items) >= self.maxsize:
+                        self._items.popleft()
+                        self.dropped += 1
+                else:
+                    self._cond.wait_for(lambda: len(self._items) < self.maxsize or self.closed)
+            if self.closed:
+                return False
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Next item, END once the producer is done, or None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self.closed, timeout):
+                return None
+            if not self._items:
+                return END
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """Wake everyone; pending items are discarded."""
+        with self._cond:
+            self.closed = True
+            self._items.clear()
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class StageStats:
+    def __init__(self, name, window=60):
+        self.name = name
+        self.count = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._durations = deque(maxlen=window)
+        self._finished = deque(maxlen=window)
+
+    def record(self, started, finished=None):
+        finished = time.monotonic() if finished is None else finished
+        with self._lock:
+            self.count += 1
+            self._durations.append(finished - started)
+            self._finished.append(finished)
+
+    def snapshot(self):
+        with self._lock:
+            durations = sorted(self._durations)
+            finished = list(self._finished)
+        fps = 0.0
+        if len(finished) > 1 and finished[-1] > finished[0]:
+            fps = (len(finished) - 1) / (finished[-1] - finished[0])
+        ms = lambda q: durations[min(len(durations) - 1, int(q * len(durations)))] * 1000.0 if durations else 0.0
+        return {"name": self.name, "count": self.count, "fps": round(fps, 1),
+                "p50_ms": round(ms(0.5), 1), "p95_ms": round(ms(0.95), 1), "dropped": self.dropped}
+
+    def summary(self):
+        s = self.snapshot()
+        text = f"{s['name']} {s['fps']:.0f}/s {s['p50_ms']:.0f}ms"
+        return text + (f" drop {s['dropped']}" if s["dropped"] else "")
+
+
+class Stage(threading.Thread):
+    """Worker thread: outq.put(fn(item)) for every item from inq.
+
+    fn may return None to swallow an item. `outq` may be None for a sink.
+    """
+
+    def __init__(self, name, fn, inq, outq=None):
+        super().__init__(name=name, daemon=True)
+        self.fn = fn
+        self.inq = inq
+        self.outq = outq
+        self.stats = StageStats(name)
+        self.error = None
+
+    def run(self):
+        try:
+            while True:
+                item = self.inq.get()
+                if item is END:
+                    break
+                started = time.monotonic()
+                out = self.fn(item)
+                self.stats.record(started)
+                if out is not None and self.outq is not None:
+                    if not self.outq.put(out):
+                        return
+                    self.stats.dropped = self.outq.dropped
+        except Exception as e:
+            self.error = e
+            print(f"[ERROR] stage {self.name}: {e}")
+        if self.outq is not None:
+            self.outq.put(END)
+
+
+class SourceStage(Stage):
+    """Feeds outq from an iterator (e.g. a frame reader)."""
+
+    def __init__(self, name, iterable, outq):
+        super().__init__(name, None, None, outq)
+        self.iterable = iterable
+
+    def run(self):
+        try:
+            it = iter(self.iterable)
+            while True:
+                started = time.monotonic()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                self.stats.record(started)
+                if not self.outq.put(item):
+                    return
+                self.stats.dropped = self.outq.dropped
+        except Exception as e:
+            self.error = e
+            print(f"[ERROR] stage {self.name}: {e}")
+        self.outq.put(END)
@@ -0,0 +1,405 @@
+# stream_broadcast.py
+# ------------------------------------------------------------
+# Encode-once, broadcast-to-many MJPEG engine.
+# - The capture thread submits raw frames (cheap, never blocks).
+# - One encoder thread JPEG-encodes each new frame exactly once per
+#   quality tier in use and publishes the bytes with a sequence number.
+# - Every viewer waits on a condition variable for a newer sequence and
+#   writes the shared bytes. A slow viewer simply skips to the newest
+#   frame (drop-to-latest); it never holds back the encoder.
+# - Each viewer adapts its own tier (JPEG quality, resolution, frame rate)
+#   from measured send time and socket backlog.
+# - An optional change detector drops frames that match the last encoded
+#   one; viewers then get the previous JPEG again as a keep-alive.
+# - An optional transform (orientation) runs on the encoder thread, only
+#   for frames that actually get encoded.
+# - Per-frame metadata (PTZ, detections...) travels with each frame and is
+#   served next to it (wait_frame(), meta_stream()); see overlay_meta.py.
+# ------------------------------------------------------------
+
+import itertools
+import threading
+import time
+
+import cv2
+
+from overlay_meta import meta_event, orient_meta
+
+MJPEG_BOUNDARY = "frame"
+MJPEG_MIMETYPE = f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}"
+
+# (JPEG quality, resolution scale, max fps) — tier 0 is full quality.
+QUALITY_TIERS = (
+    (88, 1.0, 30),
+    (70, 1.0, 30),
+    (55, 0.75, 15),
+    (40, 0.5, 10),
+)
+
+
+def mjpeg_part(jpeg):
+    """Wrap one JPEG in a multipart/x-mixed-replace part."""
+    return (b"--" + MJPEG_BOUNDARY.encode() + b"\r\n"
+            b"Content-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n")
+
+
+class StreamClient:
+    """Per-viewer bookkeeping and quality adaptation."""
+    _ids = itertools.count(1)
+
+    # Adaptation: a send slower than SLOW_FRACTION of the frame interval (or
+    # a socket backlog above BACKLOG_LIMIT bytes) is "behind"; DOWN_AFTER of
+    # those in a row drop one tier, UP_AFTER fast sends in a row raise one.
+    SLOW_FRACTION = 0.6
+    FAST_FRACTION = 0.2
+    BACKLOG_LIMIT = 128 * 1024
+    DOWN_AFTER = 3
+    UP_AFTER = 60
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, name=None, tiers=QUALITY_TIERS, adaptive=True):
+        self.id = next(self._ids)
+        self.name = name or f"client-{self.id}"
+        self.tiers = tiers
+        self.adaptive = adaptive
+        self.tier = 0
+        self.last_seq = 0
+        self.sent = 0
+        self.dropped = 0
+        self.bytes_sent = 0
+        self.send_ewma = 0.0
+        self.backlog = 0
+        self.tier_changes = 0
+        self.next_due = 0.0
+        self._slow = 0
+        self._fast = 0
+        self.connected_at = time.time()
+
+    def frame_interval(self):
+        return 1.0 / self.tiers[self.tier][2]
+
+    def advance(self, seq, size=0):
+        """Record delivery of `seq`; frames jumped over count as dropped."""
+        if self.last_seq and seq > self.last_seq + 1:
+            self.dropped += seq - self.last_seq - 1
+        self.last_seq = seq
+        self.sent += 1
+        self.bytes_sent += size
+
+    def record_send(self, started, seconds, backlog=0):
+        """Feed one send measurement; may move the client up or down a tier."""
+        self.send_ewma += self.EWMA_ALPHA * (seconds - self.send_ewma)
+        self.backlog = backlog
+        interval = self.frame_interval()
+        self.next_due = started + interval
+        if not self.adaptive:
+            return
+
+        if seconds > self.SLOW_FRACTION * interval or backlog > self.BACKLOG_LIMIT:
+            self._slow += 1
+            self._fast = 0
+        elif self.send_ewma < self.FAST_FRACTION * interval and backlog == 0:
+            self._fast += 1
+            self._slow = 0
+        else:
+            self._slow = self._fast = 0
+
+        if self._slow >= self.DOWN_AFTER and self.tier < len(self.tiers) - 1:
+            self._set_tier(self.tier + 1)
+        elif self._fast >= self.UP_AFTER and self.tier > 0:
+            self._set_tier(self.tier - 1)
+
+    def _set_tier(self, tier):
+        self.tier = tier
+        self.tier_changes += 1
+        self._slow = self._fast = 0
+        # Start the new tier with a neutral estimate, not the old backlog.
+        self.send_ewma = 0.0
+
+    def stats(self):
+        quality, scale, fps = self.tiers[self.tier]
+        return {
+            "id": self.id,
+            "name": self.name,
+            "tier": self.tier,
+            "quality": quality,
+            "scale": scale,
+            "max_fps": fps,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "bytes_sent": self.bytes_sent,
+            "avg_send_ms": round(self.send_ewma * 1000.0, 2),
+            "backlog_bytes": self.backlog,
+            "tier_changes": self.tier_changes,
+            "connected_s": round(time.time() - self.connected_at, 1),
+        }
+
+
+class FrameBroadcaster:
+    def __init__(self, tiers=QUALITY_TIERS, max_fps=30.0, change_detector=None, keepalive_s=2.0,
+                 transform=None):
+        self.tiers = tiers
+        # Applied on the encoder thread just before encoding (e.g. an
+        # Orientation), so the capture thread does no pixel work.
+        self.transform = transform
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.change_detector = change_detector
+        self.keepalive_s = keepalive_s
+
+        # Raw frame slot (capture -> encoder). Only the newest is kept.
+        self._raw_cond = threading.Condition()
+        self._raw_frame = None
+        self._raw_info = (None, None)   # (capture_ts, meta) of _raw_frame
+        self._raw_seq = 0
+
+        # Encoded frame slot (encoder -> viewers): tier index -> JPEG bytes.
+        self._cond = threading.Condition()
+        self.seq = 0
+        self.jpegs = {}
+        self.timestamp = 0.0        # encode time (time.time())
+        self.capture_ts = None      # capture time of the source frame
+        self.meta = None            # whatever the producer attached
+
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+
+        self.frames_in = 0
+        self.encoded = 0
+        self.encodes_saved = 0
+        self.keepalives = 0
+        self.tier_encodes = [0] * len(tiers)
+        self.running = False
+        self._thread = None
+
+    @property
+    def jpeg(self):
+        return self.jpegs.get(0)
+
+    # ============================================================
+    # Producer side
+    # ============================================================
+    def submit(self, frame, prepare=None, capture_ts=None, meta=None):
+        """Hand a new raw frame to the encoder (overwrites any unencoded one).
+
+        With a change detector set, a frame that matches the last accepted
+        one is dropped here and False is returned. `prepare` (e.g. an
+        orientation fix) only runs on frames that pass the gate.
+        `capture_ts` (time.time()) and `meta` travel with the frame and come
+        back from wait_frame().
+        """
+        if self.change_detector is not None and not self.change_detector.changed(frame):
+            self.encodes_saved += 1
+            return False
+        if prepare is not None:
+            frame = prepare(frame)
+        with self._raw_cond:
+            self._raw_frame = frame
+            self._raw_info = (capture_ts, meta)
+            self._raw_seq += 1
+            self.frames_in += 1
+            self._raw_cond.notify()
+        return True
+
+    def active_tiers(self):
+        """Tier 0 (snapshots, new viewers) plus every tier a viewer is on."""
+        with self._clients_lock:
+            return {0} | {c.tier for c in self._clients.values()}
+
+    def encode(self, frame, tiers=(0,)):
+        """Encode `frame` once per requested tier; resized images are shared."""
+        scaled = {}
+        jpegs = {}
+        for tier in sorted(tiers):
+            quality, scale, _ = self.tiers[tier]
+            img = scaled.get(scale)
+            if img is None:
+                img = frame if scale == 1.0 else cv2.resize(
+                    frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                scaled[scale] = img
+            ok, jpeg = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if ok:
+                jpegs[tier] = jpeg.tobytes()
+                self.tier_encodes[tier] += 1
+        return jpegs
+
+    def publish(self, jpegs, capture_ts=None, meta=None):
+        """Make `jpegs` the current frame and wake every waiting viewer."""
+        with self._cond:
+            self.seq += 1
+            self.jpegs = jpegs
+            self.timestamp = time.time()
+            self.capture_ts = capture_ts
+            self.meta = meta
+            self.encoded += 1
+            self._cond.notify_all()
+
+    def start(self, threaded=True):
+        """Start encoding. With threaded=False the caller drives encode_next()."""
+        if self.running:
+            return
+        self.running = True
+        if not threaded:
+            return
+        self._thread = threading.Thread(target=self._encode_loop, name="mjpeg-encoder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        with self._raw_cond:
+            self._raw_cond.notify_all()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def encode_next(self, after_seq, timeout=0.5):
+        """Wait for a raw frame newer than `after_seq`, encode and publish it.
+
+        Returns (raw_seq, jpegs); jpegs is None if nothing new arrived. Used by
+        the encoder thread and by executor-based (asyncio) servers alike.
+        """
+        with self._raw_cond:
+            if self._raw_seq == after_seq:
+                self._raw_cond.wait(timeout)
+            if self._raw_seq == after_seq or self._raw_frame is None:
+                return after_seq, None
+            frame, raw_seq = self._raw_frame, self._raw_seq
+            capture_ts, meta = self._raw_info
+
+        if self.transform is not None:
+            if meta and hasattr(self.transform, "map_box"):
+                meta = orient_meta(meta, self.transform, frame.shape[1], frame.shape[0])
+            frame = self.transform(frame)
+        jpegs = self.encode(frame, self.active_tiers())
+        if not jpegs:
+            return raw_seq, None
+        self.publish(jpegs, capture_ts, meta)
+        return raw_seq, jpegs
+
+    def _encode_loop(self):
+        last_seq = 0
+        next_due = 0.0
+        while self.running:
+            last_seq, jpegs = self.encode_next(last_seq)
+            if jpegs is None:
+                continue
+
+            # Cap the output rate; frames arriving meanwhile collapse into one.
+            now = time.monotonic()
+            next_due = max(next_due + self.min_interval, now)
+            if next_due > now:
+                time.sleep(next_due - now)
+
+    # ============================================================
+    # Viewer side
+    # ============================================================
+    def _pick(self, tier):
+        # A viewer that just changed tier may be ahead of the encoder; fall
+        # back to the closest better tier that exists for this frame.
+        for t in range(tier, -1, -1):
+            jpeg = self.jpegs.get(t)
+            if jpeg is not None:
+                return jpeg
+        return None
+
+    def wait_for(self, after_seq, timeout=1.0, tier=0):
+        """Block until a frame newer than `after_seq` exists.
+
+        Returns (seq, jpeg) for `tier`; jpeg is None on timeout or shutdown.
+        """
+        with self._cond:
+            if self.seq <= after_seq:
+                self._cond.wait_for(lambda: self.seq > after_seq or not self.running, timeout)
+            if self.seq <= after_seq:
+                return after_seq, None
+            return self.seq, self._pick(tier)
+
+    def wait_frame(self, after_seq, timeout=1.0, tier=0):
+        """Like wait_for() but returns (seq, jpeg, info).
+
+        info = {"capture_ts", "encode_ts", "meta"} for the same frame, read
+        under the same lock as the JPEG.
+        """
+        with self._cond:
+            if self.seq <= after_seq:
+                self._cond.wait_for(lambda: self.seq > after_seq or not self.running, timeout)
+            if self.seq <= after_seq:
+                return after_seq, None, None
+            info = {"capture_ts": self.capture_ts, "encode_ts": self.timestamp, "meta": self.meta}
+            return self.seq, self._pick(tier), info
+
+    def latest(self, tier=0):
+        """Current (seq, jpeg) without waiting."""
+        with self._cond:
+            return self.seq, self._pick(tier)
+
+    def latest_info(self):
+        """Current (seq, info) without waiting; see wait_frame()."""
+        with self._cond:
+            return self.seq, {"capture_ts": self.capture_ts, "encode_ts": self.timestamp,
+                              "meta": self.meta}
+
+    def register(self, name=None, adaptive=True):
+        client = StreamClient(name, tiers=self.tiers, adaptive=adaptive)
+        with self._clients_lock:
+            self._clients[client.id] = client
+        return client
+
+    def unregister(self, client):
+        with self._clients_lock:
+            self._clients.pop(client.id, None)
+
+    def mjpeg_stream(self, name=None, adaptive=True):
+        """Generator of multipart parts for one viewer (drop-to-latest).
+
+        The time between a yield and the next resume is how long the server
+        took to push the part into the socket, which drives adaptation. A WSGI
+        generator cannot see the socket, so unlike the asyncio server there is
+        no backlog figure: a viewer is only stepped down once sends get slow.
+        """
+        client = self.register(name, adaptive)
+        try:
+            while self.running:
+                delay = client.next_due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                seq, jpeg = self.wait_for(client.last_seq, timeout=self.keepalive_s, tier=client.tier)
+                if jpeg is None:
+                    # Static scene: re-send the current JPEG so the viewer
+                    # (and any proxy in between) knows we are alive.
+                    seq, jpeg = self.latest(client.tier)
+                    if jpeg is None:
+                        continue
+                    self.keepalives += 1
+                client.advance(seq, len(jpeg))
+                started = time.monotonic()
+                yield mjpeg_part(jpeg)
+                client.record_send(started, time.monotonic() - started)
+        finally:
+            self.unregister(client)
+
+    def meta_stream(self):
+        """Generator of Server-Sent Events, one metadata record per frame."""
+        seq = 0
+        while self.running:
+            new_seq, jpeg, info = self.wait_frame(seq, timeout=self.keepalive_s)
+            if jpeg is None:
+                yield b": keepalive\n\n"
+                continue
+            seq = new_seq
+            yield meta_event(seq, info)
+
+    def stats(self):
+        with self._clients_lock:
+            clients = [c.stats() for c in self._clients.values()]
+        return {
+            "seq": self.seq,
+            "frames_in": self.frames_in,
+            "encoded": self.encoded,
+            "encodes_saved": self.encodes_saved,
+            "keepalives": self.keepalives,
+            "change_gate": self.change_detector.stats() if self.change_detector else None,
+            "tier_encodes": list(self.tier_encodes),
+            "tiers": [list(t) for t in self.tiers],
+            "clients": clients,
+        }
@@ -0,0 +1,68 @@
+# stream_protocol.py
+# ------------------------------------------------------------
+# Wire format of the length-prefixed video stream (port 8000).
+#
+# v1 (legacy): <L payload_len> <JPEG>
+# v2         : <40-byte header> <payload>
+#   magic       4s  b"MGF2"
+#   version     B   2
+#   kind        B   KIND_JPEG, or KIND_META (JSON overlay record for the
+#                   frame with the same seq, sent right before it)
+#   header_len  H   total header size (lets later versions append fields)
+#   seq         I   frame sequence number
+#   capture_ts  d   time.time() on the Pi when the frame was captured
+#   encode_ts   d   time.time() on the Pi when the JPEG was ready
+#   pan, tilt, zoom, focus  h x4   PTZ state at capture (-1 = unknown)
+#   payload_len I
+#
+# A reader tells the two apart from the first 4 bytes: as a v1 length,
+# b"MGF2" would mean an ~840 MB JPEG, which never happens.
+# ------------------------------------------------------------
+
+import struct
+from collections import namedtuple
+
+MAGIC = b"MGF2"
+VERSION = 2
+KIND_JPEG = 0
+KIND_META = 1
+
+LEGACY_HEADER = struct.Struct('<L')
+HEADER_V2 = struct.Struct('<4sBBHIddhhhhI')
+
+FrameHeader = namedtuple(
+    "FrameHeader",
+    "version kind seq capture_ts encode_ts pan tilt zoom focus payload_len")
+
+
+def _ptz_fields(ptz):
+    ptz = ptz or {}
+    return tuple(int(ptz.get(k, -1)) for k in ("pan", "tilt", "zoom", "focus"))
+
+
+def pack_v2(payload_len, seq, capture_ts, encode_ts, ptz=None, kind=KIND_JPEG):
+    return HEADER_V2.pack(MAGIC, VERSION, kind, HEADER_V2.size, seq & 0xFFFFFFFF,
+                          capture_ts, encode_ts, *_ptz_fields(ptz), payload_len)
+
+
+def pack_legacy(payload_len):
+    return LEGACY_HEADER.pack(payload_len)
+
+
+def is_v2(first4):
+    return bytes(first4) == MAGIC
+
+
+def parse_v2(header):
+    """Parse a full v2 header (HEADER_V2.size bytes) into a FrameHeader."""
+    (magic, version, kind, header_len, seq, capture_ts, encode_ts,
+     pan, tilt, zoom, focus, payload_len) = HEADER_V2.unpack(header)
+    if magic != MAGIC:
+        raise ValueError("not a v2 frame header")
+    return FrameHeader(version, kind, seq, capture_ts, encode_ts,
+                       pan, tilt, zoom, focus, payload_len), header_len
+
+
+def legacy_header(payload_len):
+    """FrameHeader for a v1 frame (no timing or PTZ information)."""
+    return FrameHeader(1, KIND_JPEG, None, None, None, -1, -1, -1, -1, payload_len)
@@ -0,0 +1,74 @@
+# target_roi.py
+# ------------------------------------------------------------
+# Helpers for "locked target" inference: once a target is chosen, run the
+# detector on a padded crop around where the target should be instead of
+# on the whole frame.
+#
+# - TargetPredictor: keeps the target's recent boxes and extrapolates the
+#   next one with constant velocity (in frame-index units).
+# - roi_around(): square crop around a predicted box, padded and clipped.
+# - match_target(): picks the crop detection that continues the target.
+#
+# The caller decides when to fall back to a full-frame pass (every N
+# frames, lost target, low confidence) to re-acquire and keep other IDs.
+# ------------------------------------------------------------
+
+from collections import deque
+
+import numpy as np
+
+
+class TargetPredictor:
+    def __init__(self, history=5):
+        self.track_id = None
+        self.history = deque(maxlen=history)    # (frame_index, box xyxy)
+
+    def reset(self, track_id=None):
+        self.track_id = track_id
+        self.history.clear()
+
+    def update(self, frame_index, box):
+        self.history.append((frame_index, np.asarray(box, dtype=np.float32)))
+
+    def predict(self, frame_index):
+        """Expected box at frame_index, or None without history."""
+        if not self.history:
+            return None
+        last_index, last = self.history[-1]
+        if len(self.history) < 2:
+            return last.copy()
+        first_index, first = self.history[0]
+        span = last_index - first_index
+        if span <= 0:
+            return last.copy()
+        velocity = (last - first) / span
+        return last + velocity * (frame_index - last_index)
+
+
+def roi_around(box, frame_shape, pad=1.0, min_size=256):
+    """(x0, y0, x1, y1) integer crop: the box grown by `pad` box sizes per side."""
+    h, w = frame_shape[:2]
+    x1, y1, x2, y2 = box
+    cx, cy = (x1 + x2) / 2.0, (y1 + y2) / 2.0
+    side = max(x2 - x1, y2 - y1) * (1.0 + 2.0 * pad)
+    side = int(min(max(side, min_size), w, h))
+    x0 = int(round(min(max(cx - side / 2.0, 0), w - side)))
+    y0 = int(round(min(max(cy - side / 2.0, 0), h - side)))
+    return x0, y0, x0 + side, y0 + side
+
+
+def box_iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_target(boxes_xyxy, confs, predicted, min_iou=0.2):
+    """Index of the detection that best overlaps `predicted`, or None."""
+    if boxes_xyxy is None or len(boxes_xyxy) == 0:
+        return None
+    ious = [box_iou(b, predicted) for b in boxes_xyxy]
+    best = int(np.argmax(ious))
+    return best if ious[best] >= min_iou else None
@@ -0,0 +1,215 @@
+# telemetry.py
+# ------------------------------------------------------------
+# Structured telemetry for hot paths (GStreamer callbacks, capture loops).
+#
+# The hot path only does cheap in-memory work:
+#   telemetry.event("target", id=3, x=0.41)   # ring of structured events
+#   telemetry.count("detections")             # counters
+#   telemetry.gauge("error_x", -0.08)         # last-value gauges
+# Events go into a bounded deque (append/popleft are atomic, so producers
+# never take a lock; when full the oldest event is overwritten). Each event
+# kind can be rate limited (token bucket) and/or sampled (1 in N); what is
+# dropped is counted, not lost silently.
+#
+# A background thread drains the ring every flush_interval_s and writes
+# JSON lines to the sink, followed by one "metrics" record with counters,
+# gauges and whatever the registered collectors return.
+#
+#   sink: None (keep in memory), "stdout", "file:<path>" or a plain path,
+#         "udp://host:port"
+# ------------------------------------------------------------
+
+import json
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+
+# ============================================================
+# Sinks
+# ============================================================
+class StdoutSink:
+    def write(self, lines):
+        sys.stdout.write("".join(line + "\n" for line in lines))
+        sys.stdout.flush()
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    def __init__(self, path):
+        self.f = open(path, "a", buffering=1 << 16)
+
+    def write(self, lines):
+        self.f.write("".join(line + "\n" for line in lines))
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class UDPSink:
+    MAX_DATAGRAM = 8192
+
+    def __init__(self, host, port):
+        self.addr = (host, int(port))
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def write(self, lines):
+        batch, size = [], 0
+        for line in lines:
+            if batch and size + len(line) + 1 > self.MAX_DATAGRAM:
+                self._send(batch)
+                batch, size = [], 0
+            batch.append(line)
+            size += len(line) + 1
+        if batch:
+            self._send(batch)
+
+    def _send(self, batch):
+        try:
+            self.sock.sendto("\n".join(batch).encode(), self.addr)
+        except OSError:
+            pass                    # telemetry must never take the app down
+
+    def close(self):
+        self.sock.close()
+
+
+def open_sink(spec):
+    if spec is None or spec == "":
+        return None
+    if spec == "stdout":
+        return StdoutSink()
+    if spec.startswith("udp://"):
+        host, port = spec[len("udp://"):].rsplit(":", 1)
+        return UDPSink(host, port)
+    return FileSink(spec[len("file:"):] if spec.startswith("file:") else spec)
+
+
+# ============================================================
+# Telemetry
+# ============================================================
+class Telemetry:
+    def __init__(self, sink=None, capacity=4096, flush_interval_s=1.0):
+        self.sink = open_sink(sink) if isinstance(sink, str) or sink is None else sink
+        self.flush_interval_s = flush_interval_s
+        self.ring = deque(maxlen=capacity)
+        self.counters = {}
+        self.gauges = {}
+        self.collectors = []
+        self._limits = {}           # kind -> [rate_hz, burst, sample]
+        self._buckets = {}          # kind -> [tokens, last_t, seen]
+        self.emitted = 0
+        self.flushed = 0
+        self.limited = {}           # kind -> events dropped by rate/sampling
+
+        self.running = False
+        self._wake = threading.Event()
+        self._thread = None
+
+    # --- configuration -----------------------------------------
+    def limit(self, kind, rate_hz=None, burst=1, sample=1):
+        """At most rate_hz events/s of `kind` (bursts of `burst`), and 1 in `sample`."""
+        self._limits[kind] = (rate_hz, float(burst), max(1, int(sample)))
+        self._buckets[kind] = [float(burst), time.monotonic(), 0]
+        return self
+
+    def add_collector(self, fn):
+        """fn() -> {name: value}, merged into every metrics record (flusher thread)."""
+        self.collectors.append(fn)
+        return self
+
+    # --- hot path ----------------------------------------------
+    def event(self, kind, **fields):
+        """Record an event; False if rate limiting/sampling dropped it."""
+        limit = self._limits.get(kind)
+        if limit is not None and not self._admit(kind, limit):
+            self.limited[kind] = self.limited.get(kind, 0) + 1
+            return False
+        self.ring.append((time.time(), kind, fields))
+        self.emitted += 1
+        return True
+
+    def _admit(self, kind, limit):
+        # Best effort without a lock: a race between two producers of the
+        # same kind can at worst let one extra event through.
+        rate_hz, burst, sample = limit
+        bucket = self._buckets[kind]
+        bucket[2] += 1
+        if bucket[2] % sample:
+            return False
+        if rate_hz is None:
+            return True
+        now = time.monotonic()
+        bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate_hz)
+        bucket[1] = now
+        if bucket[0] < 1.0:
+            return False
+        bucket[0] -= 1.0
+        return True
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    # --- flusher -----------------------------------------------
+    def start(self):
+        if self.running:
+            return self
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self.flush()
+        if self.sink is not None:
+            self.sink.close()
+
+    def _run(self):
+        while self.running:
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[WARN] telemetry flush failed: {e}")
+
+    def drain(self):
+        events = []
+        while True:
+            try:
+                events.append(self.ring.popleft())
+            except IndexError:
+                return events
+
+    def metrics(self):
+        record = {"counters": dict(self.counters), "gauges": dict(self.gauges),
+                  "limited": dict(self.limited),
+                  "overwritten": self.emitted - self.flushed - len(self.ring)}
+        for fn in self.collectors:
+            try:
+                record["gauges"].update(fn())
+            except Exception as e:
+                record.setdefault("errors", []).append(str(e))
+        return record
+
+    def flush(self):
+        """Write pending events and one metrics record (no-op without a sink)."""
+        if self.sink is None:
+            return
+        events = self.drain()
+        self.flushed += len(events)
+        lines = [json.dumps(dict(fields, t=round(t, 3), kind=kind), default=str) for t, kind, fields in events]
+        lines.append(json.dumps(dict(self.metrics(), t=round(time.time(), 3), kind="metrics"), default=str))
+        self.sink.write(lines)
@@ -4,6 +4,25 @@
 # - Click on a box to set the target ID to follow.
 # - Press 'c' to clear target, 'q' to quit.
 # - Displays live only (no saving).
+# - Decode, inference and render run as separate stages (threads joined by
+#   bounded queues), so a slow detector no longer stalls decoding. Live
+#   sources drop the oldest queued frame; files are processed losslessly.
+#   Per-stage rate/latency is shown in the HUD.
+# - For video files, tracks are cached on disk (detection_cache.py), keyed
+#   by the video, weights and inference settings. Re-runs that only change
+#   selection/drawing read boxes from the cache instead of running YOLO.
+#   A cache is written by one continuous tracker pass from frame 0; a
+#   partial one (e.g. the run was stopped early) is re-tracked from scratch.
+# - Once a target is picked, inference runs on a padded crop around its
+#   predicted box at ROI_IMGSZ (target_roi.py). A full-frame pass every
+#   ROI_REFRESH frames, or whenever the target is lost / low-confidence,
+#   re-acquires it and keeps the other IDs alive. Not while a track cache
+#   is being recorded: that pass stays full-frame so the cache is complete.
+# - On the CPU path (MOTION_GATE), frames whose downsampled luma barely
+#   moved since the last detection skip the detector; their boxes come from
+#   per-track constant-velocity Kalman filters (motion_gate.py). A real
+#   detection runs at least every MOTION_MAX_SKIP frames. Gated runs replay
+#   a complete track cache but never record one.
 #
 # Requirements:
 #   pip install ultralytics opencv-python numpy
@@ -12,9 +31,16 @@
 from ultralytics import YOLO
 import cv2
 import numpy as np
+from collections import deque
 from pathlib import Path
 import time
 
+from detection_cache import DetectionCache
+from motion_gate import MotionGate, TrackPropagator
+from stage_pipeline import END, SourceStage, Stage, StageQueue, StageStats
+from target_roi import TargetPredictor, match_target, roi_around
+from track_store import TrackStore
+
 # ====================== USER CONFIG =========================
 WEIGHTS      = r"downloaded_weights/artifact_yolo-horse-v1_v0/best.pt"   # path to your YOLO weights (.pt)
 SOURCE       = "videos/videoplayback.mp4"                              # "0" for default webcam, or RTSP URL, or path to video
@@ -23,6 +49,20 @@ IMGSZ        = 640                              # smaller is faster; 640/736 goo
 TRACKER_YAML = "bytetrack.yaml"                 # shipped with ultralytics
 ONLY_HORSE   = True                             # if "horse" is class id 0 in your model
 DEVICE       = "cpu"                            # options: "cpu", 0 (CUDA), "mps" (Apple Silicon)
+PIPELINE     = "auto"                           # "auto" | "live" (drop oldest) | "lossless" (every frame)
+QUEUE_SIZE   = 2                                # frames buffered between stages
+INFER_EVERY  = 1                                # run the detector on every Nth frame; others reuse boxes
+USE_CACHE    = True                             # cache tracks of video files between runs
+CACHE_DIR    = "cache"                          # one sub-directory per (video, weights, settings)
+ROI_LOCK     = True                             # with a target: infer on a crop around it
+ROI_IMGSZ    = 320                              # detector input size for the crop
+ROI_PAD      = 1.0                              # crop = target box grown by this many box sizes per side
+ROI_MIN_SIZE = 256                              # smallest crop side (px)
+ROI_REFRESH  = 15                               # full-frame pass at least every N inferred frames
+ROI_MIN_CONF = 0.3                              # weaker crop detection -> full-frame pass
+MOTION_GATE  = DEVICE == "cpu"                  # skip the detector on static frames (Kalman boxes instead)
+MOTION_MAX_SKIP = 5                             # force a real detection at least every K frames
+TRACK_TTL_S  = 5.0                              # forget track history unseen for this long
 # ===========================================================
 
 # --- Global state for mouse callback ---
@@ -35,22 +75,15 @@ def on_mouse(event, x, y, flags, userdata):
     if event == cv2.EVENT_LBUTTONDOWN:
         clicked_point = (x, y)
 
-def pick_id_by_click(boxes_xyxy, ids, click_xy):
-    """Return the track id of the box that contains click_xy, or None."""
-    if click_xy is None or boxes_xyxy is None or ids is None:
-        return None
-    cx, cy = click_xy
-    for (x1, y1, x2, y2), tid in zip(boxes_xyxy, ids):
-        if x1 <= cx <= x2 and y1 <= cy <= y2:
-            return int(tid)
-    return None
-
-def draw_boxes(img, boxes_xyxy, ids, clss, confs, highlight_id=None):
-    """Minimal drawing: highlight target; dim others."""
+def draw_boxes(img, boxes_xyxy, ids, clss, confs, highlight_id=None, copy=True):
+    """Minimal drawing: highlight target; dim others.
+
+    copy=False draws straight into `img` (the render stage owns its frame).
+    """
     if boxes_xyxy is None:
         return img
 
-    img_out = img.copy()
+    img_out = img.copy() if copy else img
     for (x1, y1, x2, y2), tid, c, p in zip(boxes_xyxy, ids, clss, confs):
         tid = int(tid) if tid is not None else -1
         label = f"ID {tid}"
@@ -65,14 +98,201 @@ def draw_boxes(img, boxes_xyxy, ids, clss, confs, highlight_id=None):
         )
     return img_out
 
-def run_live():
-    global clicked_point, target_id
+def extract_tracks(res):
+    """(boxes_xyxy, ids, clss, confs) from one Ultralytics result; any may be None."""
+    boxes_xyxy, ids, clss, confs = None, None, None, None
+    if res.boxes is not None:
+        b = res.boxes
+        # b.id may be None until tracker warms up; guard carefully
+        ids   = b.id.cpu().numpy().astype(int) if (b.id is not None) else None
+        xyxy  = b.xyxy.cpu().numpy().astype(np.float32) if (b.xyxy is not None) else None
+        clss  = b.cls.cpu().numpy().astype(int) if (b.cls is not None) else None
+        confs = b.conf.cpu().numpy().astype(float) if (b.conf is not None) else None
+        boxes_xyxy = xyxy
+    return boxes_xyxy, ids, clss, confs
 
-    # Load model
-    w = Path(WEIGHTS)
-    if not w.exists():
-        print(f"[ERROR] Weights not found: {w.resolve()}")
+def is_live_source(source):
+    source = str(source)
+    return source.isdigit() or source.split("://", 1)[0] in ("rtsp", "rtmp", "http", "https", "udp", "tcp")
+
+# ============================================================
+# Stages
+# ============================================================
+def read_frames(source):
+    """Decode stage: yields packets {index, frame, t_capture}."""
+    if str(source).startswith("rtsp://"):
+        # Newest-frame reader with background reconnects.
+        from rtsp_reader import RTSPReader
+        reader = RTSPReader(source).start()
+        try:
+            index = 0
+            while True:
+                ok, frame = reader.read(timeout=1.0)
+                if ok:
+                    yield {"index": index, "frame": frame, "t_capture": time.monotonic()}
+                    index += 1
+        finally:
+            reader.stop()
+        return
+
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not cap.isOpened():
+        print(f"[ERROR] Could not open source: {source}")
         return
+    try:
+        index = 0
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield {"index": index, "frame": frame, "t_capture": time.monotonic()}
+            index += 1
+    finally:
+        cap.release()
+
+class TrackStage:
+    """Inference stage: YOLO + ByteTrack on every INFER_EVERY-th frame.
+
+    With a DetectionCache, cached frames are served from disk and the model
+    is only loaded (via load_model) once a frame is missing. With a target
+    selected (ROI_LOCK), most frames only run on a crop around the target,
+    except while a cache is being recorded.
+    With MOTION_GATE, static frames get Kalman-predicted boxes instead.
+    """
+
+    def __init__(self, load_model, classes, every=INFER_EVERY, cache=None):
+        self.load_model = load_model
+        self.model = None
+        self.roi_model = None
+        self.classes = classes
+        self.every = max(1, every)
+        self.cache = cache
+        self.n = 0
+        self.last = (None, None, None, None)
+        self.predictor = TargetPredictor()
+        self.since_full = 0
+        self.full_frames = 0
+        self.roi_frames = 0
+        replay = cache is not None and cache.complete()     # every frame is a hit
+        self.gate = MotionGate(max_skip=MOTION_MAX_SKIP) if MOTION_GATE and not replay else None
+        self.propagator = TrackPropagator()
+        self.gated_frames = 0
+
+    def __call__(self, pkt):
+        pkt["inferred"] = self.n % self.every == 0
+        pkt["roi"] = None
+        pkt["gated"] = False
+        if pkt["inferred"]:
+            self.last = self.infer(pkt)
+        self.n += 1
+        pkt["tracks"] = self.last
+        return pkt
+
+    def infer(self, pkt):
+        tid = target_id if ROI_LOCK else None
+        if tid != self.predictor.track_id:
+            self.predictor.reset(tid)
+
+        cached = self.cache.get(pkt["index"]) if self.cache is not None else None
+        if cached is not None:
+            tracks = self.follow(pkt["index"], cached)
+        elif self.gate is not None and not self.gate.should_infer(pkt["frame"]):
+            pkt["gated"] = True
+            self.gated_frames += 1
+            return self.propagator.predict(pkt["index"])
+        else:
+            tracks = self.detect(pkt, tid)
+        self.propagator.update(pkt["index"], tracks)
+        return tracks
+
+    def detect(self, pkt, tid):
+        # While a cache is being recorded every frame is a full-frame pass:
+        # crop results are target-only and ByteTrack would miss those frames.
+        recording = self.cache is not None and self.cache.recording
+        if (tid is not None and not recording and self.predictor.history
+                and self.since_full < ROI_REFRESH):
+            tracks = self.track_roi(pkt, tid)
+            if tracks is not None:
+                self.since_full += 1
+                self.roi_frames += 1
+                return tracks
+
+        tracks = self.track(pkt["frame"])
+        self.since_full = 0
+        self.full_frames += 1
+        if self.cache is not None:
+            self.cache.put(pkt["index"], *tracks)
+        return self.follow(pkt["index"], tracks)
+
+    def follow(self, index, tracks):
+        """Feed the target's full-frame box to the predictor; returns tracks.
+
+        ByteTrack only sees the full-frame passes, so after a crop run it may
+        re-issue the target under a new ID; the box matching the prediction
+        is then relabelled with the target ID.
+        """
+        boxes_xyxy, ids, clss, confs = tracks
+        tid = self.predictor.track_id
+        if tid is None or ids is None:
+            return tracks
+        hits = [k for k, t in enumerate(ids) if int(t) == tid]
+        if not hits and self.predictor.history:
+            k = match_target(boxes_xyxy, confs, self.predictor.predict(index))
+            if k is not None:
+                ids = np.array(ids, copy=True)
+                ids[k] = tid
+                hits = [k]
+        if hits:
+            self.predictor.update(index, boxes_xyxy[hits[0]])
+        else:
+            self.predictor.reset(tid)     # lost: full frames until it is back
+        return boxes_xyxy, ids, clss, confs
+
+    def track(self, frame):
+        if self.model is None:
+            self.model = self.load_model()
+        res = self.model.track(
+            frame,
+            conf=CONF,
+            imgsz=IMGSZ,
+            tracker=TRACKER_YAML,
+            persist=True,      # keep ByteTrack state between calls
+            classes=self.classes,
+            device=DEVICE,
+            verbose=False,
+        )[0]
+        return extract_tracks(res)
+
+    def track_roi(self, pkt, tid):
+        """Target-only tracks from a crop, or None to ask for a full-frame pass."""
+        frame, index = pkt["frame"], pkt["index"]
+        predicted = self.predictor.predict(index)
+        x0, y0, x1, y1 = roi_around(predicted, frame.shape, ROI_PAD, ROI_MIN_SIZE)
+        if self.roi_model is None:
+            # Separate instance: model.track() registers tracker callbacks that
+            # would feed crop coordinates into the full-frame ByteTrack state.
+            self.roi_model = self.load_model()
+        res = self.roi_model.predict(
+            frame[y0:y1, x0:x1],
+            conf=min(CONF, ROI_MIN_CONF),
+            imgsz=ROI_IMGSZ,
+            classes=self.classes,
+            device=DEVICE,
+            verbose=False,
+        )[0]
+        boxes_xyxy, _, clss, confs = extract_tracks(res)
+        if boxes_xyxy is None or len(boxes_xyxy) == 0:
+            return None
+        boxes_xyxy = boxes_xyxy + np.array([x0, y0, x0, y0], dtype=np.float32)
+        k = match_target(boxes_xyxy, confs, predicted)
+        if k is None or confs[k] < ROI_MIN_CONF:
+            return None
+        self.predictor.update(index, boxes_xyxy[k])
+        pkt["roi"] = (x0, y0, x1, y1)
+        return boxes_xyxy[k:k + 1], np.array([tid]), clss[k:k + 1], confs[k:k + 1]
+
+def load_model():
+    w = Path(WEIGHTS)
     print(f"[INFO] Loading model: {w.resolve()}")
     model = YOLO(str(w))
 
@@ -81,6 +301,44 @@ def run_live():
         model.fuse()
     except Exception:
         pass
+    return model
+
+def open_cache(source, classes):
+    """DetectionCache for a video file, or None (live sources, USE_CACHE off,
+    MOTION_GATE without a complete cache)."""
+    if not USE_CACHE or is_live_source(source) or not Path(str(source)).is_file():
+        return None
+    cap = cv2.VideoCapture(str(source))
+    n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if n_frames <= 0:
+        return None
+    params = {"conf": CONF, "imgsz": IMGSZ, "tracker": TRACKER_YAML, "classes": classes,
+              "device": str(DEVICE), "infer_every": INFER_EVERY,
+              "roi_lock": ROI_LOCK, "roi_imgsz": ROI_IMGSZ, "roi_pad": ROI_PAD,
+              "roi_min_size": ROI_MIN_SIZE, "roi_refresh": ROI_REFRESH}
+    cache = DetectionCache.open(str(source), WEIGHTS, params, n_frames, CACHE_DIR, stride=INFER_EVERY)
+    if cache.discarded:
+        print(f"[WARN] Track cache {cache.directory} was partial ({cache.discarded} frames), re-tracking from frame 0")
+    if MOTION_GATE and not cache.complete():
+        # Gated frames get Kalman boxes, not tracker output, so a gated run
+        # cannot record a continuous pass. A complete cache is fine: it is
+        # replayed and neither the detector nor the gate runs.
+        cache.close()
+        print("[INFO] Track cache not recorded: MOTION_GATE is on (set it False once to record)")
+        return None
+    state = "complete" if cache.complete() else "recording"
+    print(f"[INFO] Track cache {cache.directory}: {state}, {cache.cached_frames()}/{len(cache)} frames cached")
+    return cache
+
+def run_live():
+    global clicked_point, target_id
+
+    # Model is loaded lazily: a fully cached video never needs it
+    w = Path(WEIGHTS)
+    if not w.exists():
+        print(f"[ERROR] Weights not found: {w.resolve()}")
+        return
 
     classes = [0] if ONLY_HORSE else None
 
@@ -89,77 +347,82 @@ def run_live():
     cv2.namedWindow(win_name, cv2.WINDOW_NORMAL)
     cv2.setMouseCallback(win_name, on_mouse)
 
-    # Stream results from Ultralytics tracker
-    print(f"[INFO] Starting stream: source={SOURCE}, device={DEVICE}, imgsz={IMGSZ}")
-    fps_t0 = time.time()
-    fps_n = 0
-    current_fps = 0.0
+    # Pipeline: decode -> [queue] -> inference -> [queue] -> render (this thread,
+    # since imshow/waitKey must stay on the main thread).
+    live = is_live_source(SOURCE) if PIPELINE == "auto" else PIPELINE == "live"
+    # Cached tracks are only valid when the tracker saw every decoded frame.
+    cache = None if live else open_cache(SOURCE, classes)
+    decoded_q = StageQueue(QUEUE_SIZE, drop_oldest=live)
+    tracked_q = StageQueue(QUEUE_SIZE, drop_oldest=live)
+    decode = SourceStage("decode", read_frames(SOURCE), decoded_q)
+    tracker = TrackStage(load_model, classes, cache=cache)
+    infer = Stage("infer", tracker, decoded_q, tracked_q)
+    render_stats = StageStats("render")
+    latencies = deque(maxlen=60)
+    store = TrackStore(ttl_s=TRACK_TTL_S)
+
+    end_of_stream = False
+    print(f"[INFO] Starting stream: source={SOURCE}, device={DEVICE}, imgsz={IMGSZ}, "
+          f"mode={'live (drop oldest)' if live else 'lossless'}")
+    decode.start()
+    infer.start()
 
     try:
-        for res in model.track(
-            source=SOURCE,
-            conf=CONF,
-            imgsz=IMGSZ,
-            tracker=TRACKER_YAML,
-            persist=True,
-            stream=True,       # IMPORTANT: gives us per-frame results
-            show=False,        # we draw ourselves (needed for mouse picking)
-            save=False,
-            classes=classes,
-            device=DEVICE,
-            verbose=False,
-        ):
-            # Original frame
-            frame = res.orig_img
-            if frame is None:
-                continue
-
-            # Extract tracked boxes (+ IDs) if they exist
-            boxes_xyxy, ids, clss, confs = None, None, None, None
-            if res.boxes is not None:
-                b = res.boxes
-                # b.id may be None until tracker warms up; guard carefully
-                ids   = b.id.cpu().numpy().astype(int) if (b.id is not None) else None
-                xyxy  = b.xyxy.cpu().numpy().astype(np.float32) if (b.xyxy is not None) else None
-                clss  = b.cls.cpu().numpy().astype(int) if (b.cls is not None) else None
-                confs = b.conf.cpu().numpy().astype(float) if (b.conf is not None) else None
-                boxes_xyxy = xyxy
-
-            # Handle click -> pick target ID
-            if clicked_point is not None and boxes_xyxy is not None and ids is not None:
-                chosen = pick_id_by_click(boxes_xyxy, ids, clicked_point)
-                if chosen is not None:
-                    target_id = chosen
-                    print(f"[INFO] Target set to ID {target_id}")
-                clicked_point = None  # consume click
-
-            # Draw
-            canvas = draw_boxes(frame, boxes_xyxy, ids if ids is not None else [],
-                                clss if clss is not None else [], confs if confs is not None else [],
-                                highlight_id=target_id)
-
-            # HUD: FPS + target status
-            fps_n += 1
-            if fps_n >= 15:
-                now = time.time()
-                dt = now - fps_t0
-                current_fps = fps_n / dt if dt > 0 else 0.0
-                fps_t0 = now
-                fps_n = 0
-
-            hud = f"FPS: {current_fps:.1f}"
-            if target_id is None:
-                hud += " | Target: (none) - click a box"
+        while True:
+            pkt = tracked_q.get(timeout=0.05)
+            if pkt is END:
+                end_of_stream = decode.error is None and infer.error is None
+                break
+            if pkt is None:
+                key = cv2.waitKey(1) & 0xFF
             else:
-                # Check if target visible
-                visible = False
-                if ids is not None:
-                    visible = any(int(t) == int(target_id) for t in ids)
-                hud += f" | Target: ID {target_id} ({'visible' if visible else 'lost'})"
-            cv2.putText(canvas, hud, (12, 28), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (50, 200, 255), 2, cv2.LINE_AA)
-
-            cv2.imshow(win_name, canvas)
-            key = cv2.waitKey(1) & 0xFF
+                started = time.monotonic()
+                frame = pkt["frame"]
+                boxes_xyxy, ids, clss, confs = pkt["tracks"]
+                store.update(pkt["t_capture"], boxes_xyxy, ids, confs)
+
+                # Handle click -> pick target ID (smallest box under the cursor)
+                if clicked_point is not None:
+                    hits = store.ids_at(*clicked_point)
+                    chosen = int(hits[0]) if len(hits) else None
+                    if chosen is not None:
+                        target_id = chosen
+                        print(f"[INFO] Target set to ID {target_id}")
+                    if chosen is not None or pkt["roi"] is None:
+                        clicked_point = None  # consume click (crop frames only carry the target)
+
+                # Draw (the packet's frame is ours, so no copy)
+                canvas = draw_boxes(frame, boxes_xyxy, ids if ids is not None else [],
+                                    clss if clss is not None else [], confs if confs is not None else [],
+                                    highlight_id=target_id, copy=False)
+                if pkt["roi"] is not None:
+                    x0, y0, x1, y1 = pkt["roi"]
+                    cv2.rectangle(canvas, (x0, y0), (x1, y1), (50, 200, 255), 1)
+
+                # HUD: shown FPS + target status, then per-stage counters
+                hud = f"FPS: {render_stats.snapshot()['fps']:.1f}"
+                if target_id is None:
+                    hud += " | Target: (none) - click a box"
+                else:
+                    visible = store.visible(target_id)
+                    hud += f" | Target: ID {target_id} ({'visible' if visible else 'lost'})"
+                    velocity = store.velocity(target_id) if visible else None
+                    if velocity is not None:
+                        hud += f" {np.hypot(*velocity):.0f}px/s"
+                    hud += f" | {'ROI' if pkt['roi'] is not None else 'full'}"
+                if pkt["gated"]:
+                    hud += " | gated"
+                latency_ms = np.median(latencies) * 1000.0 if latencies else 0.0
+                stages = " | ".join(st.summary() for st in (decode.stats, infer.stats, render_stats))
+                cv2.putText(canvas, hud, (12, 28), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (50, 200, 255), 2, cv2.LINE_AA)
+                cv2.putText(canvas, f"{stages} | e2e {latency_ms:.0f}ms", (12, 56),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.55, (50, 200, 255), 1, cv2.LINE_AA)
+
+                cv2.imshow(win_name, canvas)
+                key = cv2.waitKey(1) & 0xFF
+                render_stats.record(started)
+                latencies.append(time.monotonic() - pkt["t_capture"])
+
             if key == ord('q'):   # quit
                 break
             if key == ord('c'):   # clear target
@@ -168,8 +431,22 @@ def run_live():
     except KeyboardInterrupt:
         pass
     finally:
+        decoded_q.close()
+        tracked_q.close()
         cv2.destroyAllWindows()
-        print("[OK] Stopped.")
+        if cache is not None:
+            # Queues are closed, so the stage stops after its current frame;
+            # that may be a first (slow) model load, and it may still put().
+            infer.join()
+            if end_of_stream:
+                cache.finish(tracker.n)     # lossless: every decoded frame went through
+            s = cache.stats()
+            print(f"[STATS] cache hits={s['hits']} misses={s['misses']} cached={s['cached_frames']}/{s['frames']}"
+                  f"{'' if s['complete'] else ' (partial, re-tracked next run)'}")
+            cache.close()
+        skip = f" gated={tracker.gated_frames} ({tracker.gate.skip_ratio():.0%})" if tracker.gate else ""
+        print(f"[STATS] inference full={tracker.full_frames} roi={tracker.roi_frames}{skip}")
+        print(f"[OK] Stopped. {decode.stats.summary()} | {infer.stats.summary()} | {render_stats.summary()}")
 
 if __name__ == "__main__":
     run_live()
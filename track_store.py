@@ -0,0 +1,143 @@
+# track_store.py
+# ------------------------------------------------------------
+# Fixed-size track history for the render/control side.
+#
+# Every track gets a slot with a ring buffer of (t, x1, y1, x2, y2, conf)
+# rows. All storage is preallocated NumPy arrays, so memory stays at
+# max_tracks * history rows no matter how long a session runs:
+# - tracks unseen for ttl_s seconds are evicted (evict(), also on update),
+# - when all slots are busy, the least recently seen track is replaced.
+#
+# Queries work on the arrays directly (no per-box Python loop):
+#   store.update(t, boxes_xyxy, ids, confs)
+#   store.ids_at(x, y)        # ids whose latest box contains the point
+#   store.nearest(x, y)       # id with the closest box centre
+#   store.velocity(tid)       # (vx, vy) px/s of the box centre
+#   store.visible(tid)        # seen in the latest update?
+# ------------------------------------------------------------
+
+import numpy as np
+
+T, X1, Y1, X2, Y2, CONF = range(6)
+
+
+class TrackStore:
+    def __init__(self, max_tracks=128, history=64, ttl_s=5.0):
+        self.max_tracks = max_tracks
+        self.history = history
+        self.ttl_s = ttl_s
+
+        self.ids = np.full(max_tracks, -1, dtype=np.int64)      # -1 = free slot
+        self.last_seen = np.full(max_tracks, -np.inf)
+        self.head = np.zeros(max_tracks, dtype=np.int64)        # next row to write
+        self.count = np.zeros(max_tracks, dtype=np.int64)       # valid rows
+        self.rows = np.zeros((max_tracks, history, 6))
+        self.slot_of = {}                                       # track id -> slot
+        self.now = -np.inf                                      # t of the latest update
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    # ============================================================
+    # Updates
+    # ============================================================
+    def update(self, t, boxes_xyxy, ids, confs=None):
+        """Append one frame's tracks (rows without an id are ignored)."""
+        self.now = t
+        self.evict(t)
+        if boxes_xyxy is None or ids is None or len(ids) == 0:
+            return
+        ids = np.asarray(ids, dtype=np.int64)
+        boxes_xyxy = np.asarray(boxes_xyxy, dtype=np.float64).reshape(-1, 4)
+        confs = np.ones(len(ids)) if confs is None else np.asarray(confs, dtype=np.float64)
+
+        slots = np.array([self._slot(int(tid)) for tid in ids], dtype=np.int64)
+        rows = self.head[slots]
+        self.rows[slots, rows, T] = t
+        self.rows[slots, rows, X1:Y2 + 1] = boxes_xyxy
+        self.rows[slots, rows, CONF] = confs
+        self.head[slots] = (rows + 1) % self.history
+        self.count[slots] = np.minimum(self.count[slots] + 1, self.history)
+        self.last_seen[slots] = t
+
+    def _slot(self, tid):
+        slot = self.slot_of.get(tid)
+        if slot is not None:
+            return slot
+        free = np.flatnonzero(self.ids < 0)
+        if len(free):
+            slot = int(free[0])
+        else:
+            slot = int(np.argmin(self.last_seen))            # full: replace the stalest
+            del self.slot_of[int(self.ids[slot])]
+        self.ids[slot] = tid
+        self.head[slot] = 0
+        self.count[slot] = 0
+        self.last_seen[slot] = -np.inf
+        self.slot_of[tid] = slot
+        return slot
+
+    def evict(self, now):
+        """Free the slots of tracks unseen for ttl_s."""
+        stale = np.flatnonzero((self.ids >= 0) & (self.last_seen < now - self.ttl_s))
+        for slot in stale:
+            del self.slot_of[int(self.ids[slot])]
+        self.ids[stale] = -1
+        self.count[stale] = 0
+        return len(stale)
+
+    # ============================================================
+    # Queries
+    # ============================================================
+    def latest(self, max_age=0.0):
+        """(ids, boxes (N, 4), confs) of tracks seen within max_age of the last update."""
+        slots = np.flatnonzero((self.ids >= 0) & (self.last_seen >= self.now - max_age))
+        last = self.rows[slots, (self.head[slots] - 1) % self.history]
+        return self.ids[slots], last[:, X1:Y2 + 1], last[:, CONF]
+
+    def ids_at(self, x, y, max_age=0.0):
+        """Ids whose latest box contains (x, y), smallest box first."""
+        ids, boxes, _ = self.latest(max_age)
+        inside = (boxes[:, 0] <= x) & (x <= boxes[:, 2]) & (boxes[:, 1] <= y) & (y <= boxes[:, 3])
+        areas = (boxes[inside, 2] - boxes[inside, 0]) * (boxes[inside, 3] - boxes[inside, 1])
+        return ids[inside][np.argsort(areas)]
+
+    def nearest(self, x, y, max_age=0.0, max_dist=None):
+        """Id whose latest box centre is closest to (x, y), or None."""
+        ids, boxes, _ = self.latest(max_age)
+        if len(ids) == 0:
+            return None
+        cx = (boxes[:, 0] + boxes[:, 2]) / 2.0
+        cy = (boxes[:, 1] + boxes[:, 3]) / 2.0
+        d2 = (cx - x) ** 2 + (cy - y) ** 2
+        k = int(np.argmin(d2))
+        if max_dist is not None and d2[k] > max_dist ** 2:
+            return None
+        return int(ids[k])
+
+    def visible(self, tid, max_age=0.0):
+        slot = self.slot_of.get(int(tid))
+        return slot is not None and self.last_seen[slot] >= self.now - max_age
+
+    def track(self, tid):
+        """History rows of one track, oldest first (copy), or None."""
+        slot = self.slot_of.get(int(tid))
+        if slot is None:
+            return None
+        n = self.count[slot]
+        order = (self.head[slot] - n + np.arange(n)) % self.history
+        return self.rows[slot, order].copy()
+
+    def velocity(self, tid, window_s=0.5):
+        """(vx, vy) of the box centre in px/s, least squares over window_s; None if unknown."""
+        rows = self.track(tid)
+        if rows is None:
+            return None
+        rows = rows[rows[:, T] >= rows[-1, T] - window_s] if len(rows) else rows
+        if len(rows) < 2 or rows[-1, T] <= rows[0, T]:
+            return None
+        t = rows[:, T] - rows[:, T].mean()
+        cx = (rows[:, X1] + rows[:, X2]) / 2.0
+        cy = (rows[:, Y1] + rows[:, Y2]) / 2.0
+        denom = (t * t).sum()
+        return float((t * cx).sum() / denom), float((t * cy).sum() / denom)
@@ -1,31 +1,100 @@
-import threading, time, requests, tkinter as tk
-from tkinter import ttk, messagebox
+import threading, time, queue, requests, tkinter as tk
+from collections import deque
+from tkinter import ttk
+from requests.adapters import HTTPAdapter
 import cv2
+from rtsp_reader import RTSPReader
 
 PI_IP = "192.168.1.168"                 # <-- עדכני ל-IP של ה-Pi
 PTZ_PORT = 5005
 RTSP_URL = "rtsp://localhost:8554/horse"
 STEP_MOTOR, STEP_FOCUS, STEP_ZOOM = 5, 5, 100
+STATUS_INTERVAL_S = 0.5                 # /status poll period (0 = off)
+MAX_QUEUED = 16                         # pending commands before the oldest move/step is dropped
+TIMEOUT_S = 2
 
 BASE = f"http://{PI_IP}:{PTZ_PORT}"
-def post(path, params=None):
-    try:
-        r = requests.post(f"{BASE}{path}", params=params, timeout=2); r.raise_for_status(); return r.json()
-    except Exception as e: messagebox.showerror("HTTP Error", str(e)); return None
-def get_(path):
-    try:
-        r = requests.get(f"{BASE}{path}", timeout=2); r.raise_for_status(); return r.json()
-    except Exception as e: messagebox.showerror("HTTP Error", str(e)); return None
+
+# Relative commands whose queued (not yet sent) repeats add up into one.
+MERGEABLE = {"/step": ("dx", "dy"), "/focus": ("step",), "/zoom": ("step",)}
+
+class PTZClient:
+    """Background HTTP client: keep-alive sessions, merged steps, results via a queue.
+
+    Nothing here blocks the caller. Results and errors come back as
+    (callback, result, error) on `results`; the Tk side drains it with pump().
+    """
+    def __init__(self, base=BASE, status_interval=STATUS_INTERVAL_S, max_queued=MAX_QUEUED):
+        self.base, self.status_interval = base, status_interval
+        self.results = queue.SimpleQueue()
+        self._cmds, self._cond, self.max_queued = deque(), threading.Condition(), max_queued
+        self.sent = self.merged = self.dropped = self.errors = 0
+        self.last_rtt_ms = None
+        self.running = True
+        # One session per thread (requests.Session is not thread-safe); each
+        # keeps its connection to the Pi open between calls.
+        threading.Thread(target=self._command_loop, daemon=True).start()
+        if status_interval:
+            threading.Thread(target=self._status_loop, daemon=True).start()
+    @staticmethod
+    def _session():
+        s = requests.Session(); s.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1)); return s
+    @staticmethod
+    def _chain(first, second):
+        if first is None or second is None: return first or second
+        return lambda result: (first(result), second(result))
+    def post(self, path, params=None, callback=None):
+        params = dict(params or {})
+        with self._cond:
+            tail = self._cmds[-1] if self._cmds else None
+            if path in MERGEABLE and tail and tail[0] == path:
+                for k in MERGEABLE[path]:
+                    if k in params: tail[1][k] = tail[1].get(k, 0) + params.pop(k)
+                tail[1].update(params); tail[2] = self._chain(tail[2], callback); self.merged += 1; return
+            if len(self._cmds) >= self.max_queued:
+                # Only steps are expendable; /center, /autofocus... always go out.
+                old = next((c for c in self._cmds if c[0] in MERGEABLE), None)
+                if old is not None: self._cmds.remove(old); self.dropped += 1
+                elif path in MERGEABLE: self.dropped += 1; return
+            self._cmds.append([path, params, callback]); self._cond.notify()
+    def close(self):
+        with self._cond: self.running = False; self._cond.notify_all()
+    def _command_loop(self):
+        session = self._session()
+        while True:
+            with self._cond:
+                while self.running and not self._cmds: self._cond.wait()
+                if not self.running: return
+                path, params, callback = self._cmds.popleft()
+            t0 = time.monotonic()
+            try:
+                r = session.post(f"{self.base}{path}", params=params, timeout=TIMEOUT_S); r.raise_for_status()
+                result, error = r.json(), None
+            except Exception as e:
+                result, error = None, f"{path}: {e}"; self.errors += 1
+            self.sent += 1; self.last_rtt_ms = (time.monotonic() - t0) * 1000
+            self.results.put((callback, result, error))
+    def _status_loop(self):
+        session = self._session()
+        while self.running:
+            t0 = time.monotonic()
+            try:
+                r = session.get(f"{self.base}/status", timeout=TIMEOUT_S); r.raise_for_status()
+                self.results.put(("status", r.json(), None))
+            except Exception as e:
+                self.results.put(("status", None, f"/status: {e}"))
+            time.sleep(max(0.0, self.status_interval - (time.monotonic() - t0)))
 
 class PTZGui(tk.Tk):
     def __init__(self):
         super().__init__()
-        self.title("Arducam PTZ Controller + Live View"); self.geometry("420x300")
+        self.title("Arducam PTZ Controller + Live View"); self.geometry("420x340")
+        self.client = PTZClient(); post = self.client.post
         row=0
         ttk.Button(self,text="Center",command=lambda:post("/center")).grid(row=row,column=0,padx=5,pady=5)
         ttk.Button(self,text="Toggle Mode",command=lambda:post("/mode")).grid(row=row,column=1,padx=5,pady=5)
         ttk.Button(self,text="IR-CUT",command=lambda:post("/ircut")).grid(row=row,column=2,padx=5,pady=5)
-        ttk.Button(self,text="Autofocus",command=lambda:post("/autofocus")).grid(row=row,column=3,padx=5,pady=5); row+=1
+        ttk.Button(self,text="Autofocus",command=lambda:post("/autofocus",callback=self.on_autofocus)).grid(row=row,column=3,padx=5,pady=5); row+=1
         ttk.Label(self,text="Focus").grid(row=row,column=0,sticky="e")
         ttk.Button(self,text="-",width=3,command=lambda:post("/focus",{"step":-STEP_FOCUS})).grid(row=row,column=1)
         ttk.Button(self,text="+",width=3,command=lambda:post("/focus",{"step":+STEP_FOCUS})).grid(row=row,column=2); row+=1
@@ -41,18 +110,39 @@ class PTZGui(tk.Tk):
         self.bind("<Right>", lambda e: post("/step", {"dx": -STEP_MOTOR}))
         self.bind("<Up>",    lambda e: post("/step", {"dy": -STEP_MOTOR}))
         self.bind("<Down>",  lambda e: post("/step", {"dy": +STEP_MOTOR}))
-        self.bind("<Escape>", lambda e: self.destroy())
+        self.bind("<Escape>", lambda e: self.destroy()); row+=1
+        self.status_var, self.error_var = tk.StringVar(value="status: ..."), tk.StringVar()
+        ttk.Label(self,textvariable=self.status_var).grid(row=row,column=0,columnspan=4,sticky="w",padx=5); row+=1
+        ttk.Label(self,textvariable=self.error_var,foreground="red").grid(row=row,column=0,columnspan=4,sticky="w",padx=5)
         threading.Thread(target=self.video_loop, daemon=True).start()
-        print(get_("/status"))
-    def video_loop(self):
-        cap=cv2.VideoCapture(RTSP_URL, cv2.CAP_FFMPEG)
-        if not cap.isOpened(): print("Failed to open RTSP"); return
+        self.pump()
+    def pump(self):
+        """Deliver background results on the Tk thread."""
+        c = self.client
         while True:
-            ok,frame=cap.read()
-            if not ok: time.sleep(0.05); continue
-            cv2.imshow("Live View (RTSP)", frame)
-            if cv2.waitKey(1)&0xFF==27: break
-        cap.release(); cv2.destroyAllWindows()
+            try: callback, result, error = c.results.get_nowait()
+            except queue.Empty: break
+            if error: self.error_var.set(error); continue
+            if callback == "status":
+                self.error_var.set("")
+                pos = " ".join(f"{k}={v}" for k, v in result.items()) if isinstance(result, dict) else result
+                rtt = f"{c.last_rtt_ms:.0f} ms" if c.last_rtt_ms is not None else "-"
+                self.status_var.set(f"{pos}   (sent {c.sent}, merged {c.merged}, rtt {rtt})")
+            elif callback: callback(result)
+        self.after(30, self.pump)
+    def on_autofocus(self, result):
+        print("Autofocus:", result)
+    def destroy(self):
+        self.client.close(); super().destroy()
+    def video_loop(self):
+        reader=RTSPReader(RTSP_URL).start()   # newest frame only, reconnects by itself
+        try:
+            while True:
+                ok,frame=reader.read(timeout=0.1)
+                if ok: cv2.imshow("Live View (RTSP)", frame)
+                if cv2.waitKey(1)&0xFF==27: break
+        finally:
+            reader.stop(); cv2.destroyAllWindows()
 
 if __name__=="__main__":
     PTZGui().mainloop()